@@ -0,0 +1,605 @@
+"""
+RenderFarming Benchmark Suite
+
+Runs the code paths artists trigger (Spinach job preparation, Kale, Arugula, the Barn QuickExporter and the
+installer) against the simulated scene runtime in simulatedRuntime.py and records the time and the number of
+pymxs round trips each scenario takes, at several scene sizes.
+
+Usage:
+    python benchmark.py [--sizes small,medium,large] [--repeat 3] [--filter spinach] [--output results.json]
+    python benchmark.py --compare base.json head.json [--threshold 0.1]
+
+Results are written as JSON so that runs from two commits can be compared with --compare.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import timeit
+import zipfile
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import simulatedRuntime
+
+script_dir = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# The simulated runtime has to be in place before any RenderFarming module is imported
+sim = simulatedRuntime.install()
+sys.path.insert(0, os.path.join(script_dir, "src"))
+
+# Scene sizes the scenarios are scaled by
+SIZES = {
+    "small": {"objects": 100, "render_elements": 10, "cameras": 2, "files": 20},
+    "medium": {"objects": 1000, "render_elements": 40, "cameras": 8, "files": 100},
+    "large": {"objects": 5000, "render_elements": 100, "cameras": 20, "files": 400},
+}
+
+
+# ---------------------------------------------------
+#                  Scenario Classes
+# ---------------------------------------------------
+
+
+class Scenario(object):
+    """
+    A single benchmarked code path
+    Subclasses implement setup() which is not timed and run() which is timed
+    """
+    name = "untitled"
+
+    def __init__(self, context):
+        self._ctx = context
+
+    def available(self):
+        """
+        :return: None if the scenario can run, otherwise a string explaining why not
+        """
+        return None
+
+    def setup(self, size):
+        pass
+
+    def run(self):
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+
+class SpinachPrepareJob(Scenario):
+    name = "spinach.prepare_job"
+
+    def setup(self, size):
+        import renderFarmingSpinach as rFS
+        self._job = rFS.SpinachJob(self._ctx.cfg)
+
+    def run(self):
+        self._job.prepare_job()
+
+
+class SpinachPass(Scenario):
+    """
+    Prepares a prepass or beauty pass for a single render type, after an untimed prepare_job()
+    """
+    def __init__(self, context, render_type, prepass):
+        super(SpinachPass, self).__init__(context)
+        self._render_type = render_type
+        self._prepass = prepass
+        self.name = "spinach.{0}.type_{1}".format("prepass" if prepass else "beauty", render_type)
+
+    def setup(self, size):
+        import renderFarmingSpinach as rFS
+        self._job = rFS.SpinachJob(self._ctx.cfg)
+        self._job.set_frame_buffer_type(self._ctx.frame_buffer_type)
+        self._job.set_pad_gi(True)
+        self._job.prepare_job()
+
+        # Animation Interpolated needs a complete animation prepass on disk
+        if self._render_type is 5:
+            folder, prefix = self._job.get_animation_prepass_location()
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            for frame in self._job.find_missing_prepass_frames():
+                open(os.path.join(folder, "{0}{1:04d}.vrmap".format(prefix, frame)), 'w').close()
+
+    def run(self):
+        if self._prepass:
+            self._job.prepare_prepass(self._render_type)
+        else:
+            self._job.prepare_beauty_pass(self._render_type)
+
+
+class SpinachFrameScan(Scenario):
+    """
+    Scans a frames folder holding the whole active segment for the beauty and every render element
+    """
+    name = "spinach.scan_rendered_frames"
+
+    def setup(self, size):
+        import renderFarmingSpinach as rFS
+        self._job = rFS.SpinachJob(self._ctx.cfg)
+        self._job.set_frame_buffer_type(self._ctx.frame_buffer_type)
+        self._job.prepare_job()
+
+        for result in self._job.scan_rendered_frames().get_results():
+            sequence = result.get_sequence()
+            if not os.path.isdir(sequence.get_folder()):
+                os.makedirs(sequence.get_folder())
+            exr = build_synthetic_exr(sim.renderWidth, sim.renderHeight)
+            for frame in result.get_missing():
+                file_name = "{0}{1:04d}{2}".format(sequence.get_prefix(), frame, sequence.get_suffix())
+                with open(os.path.join(sequence.get_folder(), file_name), 'wb') as frame_file:
+                    frame_file.write(exr)
+
+    def run(self):
+        self._job.scan_rendered_frames()
+
+
+class KaleRun(Scenario):
+    name = "kale.run"
+
+    def run(self):
+        import renderFarmingKaleChecks as rFKC
+        rFKC.KaleChecks(self._ctx.cfg).run()
+
+
+class ArugulaCapture(Scenario):
+    name = "arugula.capture"
+
+    def available(self):
+        return self._ctx.qt_error
+
+    def setup(self, size):
+        import renderFarmingArugula as rFA
+        self._job = rFA.ArugulaJob(sim, self._ctx.temp, self._ctx.cfg.get_project_code())
+
+    def run(self):
+        self._job.capture()
+
+
+class ArugulaRestore(ArugulaCapture):
+    name = "arugula.restore"
+
+    def setup(self, size):
+        super(ArugulaRestore, self).setup(size)
+        self._job.capture()
+
+    def run(self):
+        self._job.restore()
+
+
+class ExporterScenario(Scenario):
+    """
+    Runs the Barn QuickExporter over the whole synthetic selection
+    """
+    def __init__(self, context, per_object):
+        super(ExporterScenario, self).__init__(context)
+        self._per_object = per_object
+        self.name = "exporter.{}".format("file_per_object" if per_object else "single_file")
+
+    def available(self):
+        return self._ctx.qt_error
+
+    def setup(self, size):
+        import renderFarmingBarn as rFB
+        self._exporter = rFB.QuickExporter()
+        self._exporter._set_dir(self._ctx.export_dir)
+        self._exporter._set_filename("benchmark.fbx")
+        sim.select_objects()
+
+    def run(self):
+        if self._per_object:
+            self._exporter._process_file_per_object()
+        else:
+            self._exporter._process_single_file()
+        self._exporter._runner.run_to_end()
+
+
+class BarnToolScenario(Scenario):
+    """
+    Runs one of the Barn selection tools over the whole synthetic selection
+    """
+    def __init__(self, context, tool, handler):
+        super(BarnToolScenario, self).__init__(context)
+        self._tool_name = tool
+        self._handler = handler
+        self.name = "barn.{}".format(handler.strip("_").replace("_handler", ""))
+
+    def available(self):
+        return self._ctx.qt_error
+
+    def setup(self, size):
+        import renderFarmingBarn as rFB
+        self._tool = getattr(rFB, self._tool_name)()
+        sim.select_objects()
+
+    def run(self):
+        getattr(self._tool, self._handler)()
+
+
+class InstallerScenario(Scenario):
+    """
+    Runs the installer over a synthetic manifest, either installing it or uninstalling a previous install
+    """
+    def __init__(self, context, install):
+        super(InstallerScenario, self).__init__(context)
+        self._install = install
+        self.name = "installer.{}".format("install" if install else "uninstall")
+        self._root = None
+
+    def available(self):
+        try:
+            import installer
+        except ImportError as e:
+            return "Installer unavailable: {}".format(e)
+        return self._ctx.qt_error
+
+    def setup(self, size):
+        import installer
+        from manifest import ZipHandler
+
+        self._root = tempfile.mkdtemp(prefix="rfBenchInstall")
+        zip_path = build_synthetic_install_zip(self._root, size["files"])
+        self._dirs = BenchmarkDirectoryLocator(self._root)
+        self._installer = installer.RenderFarmingInstaller(ZipHandler(zip_path), self._dirs)
+
+        if not self._install:
+            installer.RenderFarmingInstaller(ZipHandler(zip_path), self._dirs).run(install_type="install")
+
+    def run(self):
+        self._installer.run(install_type="install" if self._install else "uninstall")
+
+    def teardown(self):
+        if self._root is not None:
+            shutil.rmtree(self._root, ignore_errors=True)
+
+
+# ---------------------------------------------------
+#                  Support Classes
+# ---------------------------------------------------
+
+
+class BenchmarkContext(object):
+    """
+    Shared state for all scenarios: a configuration pointing into a temp folder, and Qt availability
+    """
+    def __init__(self, frame_buffer_type=0):
+        self.temp = tempfile.mkdtemp(prefix="rfBench")
+        self.export_dir = os.path.join(self.temp, "export")
+        os.makedirs(self.export_dir)
+        self.frame_buffer_type = frame_buffer_type
+
+        # The configuration is read from LOCALAPPDATA, so it is redirected to the temp folder
+        os.environ["LOCALAPPDATA"] = self.temp
+
+        import renderFarmingConfig as rFCfg
+        self.cfg = rFCfg.Configuration()
+        self.cfg.set_projects_path(self.temp)
+        self.cfg.set_frames_path(os.path.join(self.temp, "frames"))
+        self.cfg.set_irradiance_cache_path(os.path.join(self.temp, "gi"))
+        self.cfg.set_light_cache_path(os.path.join(self.temp, "gi"))
+        self.cfg.set_log_path(os.path.join(self.temp, "logs"))
+
+        self.qt_error = None
+        self._app = None
+        try:
+            import PySide2.QtWidgets as QtW
+            self._app = QtW.QApplication.instance() or QtW.QApplication(["benchmark"])
+        except ImportError as e:
+            self.qt_error = "PySide2 unavailable: {}".format(e)
+
+    def cleanup(self):
+        shutil.rmtree(self.temp, ignore_errors=True)
+
+
+class BenchmarkDirectoryLocator(object):
+    """
+    Provides the same getters as installer.DirectoryLocator, but rooted in a temp folder instead of the registry
+    """
+    def __init__(self, root):
+        self._hashed_temp = os.path.join(root, "temp")
+        self._bdf_dir = os.path.join(root, "scripts", "BDF")
+        self._install_dir = os.path.join(self._bdf_dir, "renderFarming")
+        self._config = os.path.join(self._bdf_dir, "config")
+        self._logs = os.path.join(self._bdf_dir, "logs")
+        self._macros = os.path.join(root, "usermacros")
+        self._startup = os.path.join(root, "startup")
+        self._light_icons = os.path.join(root, "Icons", "Light", "RenderFarming")
+        self._dark_icons = os.path.join(root, "Icons", "Dark", "RenderFarming")
+
+    def get_tokens(self):
+        return {
+            "$(main)": self._install_dir,
+            "$(renderFarmingQWidgets)": os.path.join(self._install_dir, "renderFarmingQWidgets"),
+            "$(macro)": self._macros,
+            "$(startup)": self._startup,
+            "$(dark_icons)": self._dark_icons,
+            "$(light_icons)": self._light_icons
+        }
+
+    def get_unprotected(self):
+        return [self._dark_icons, self._light_icons, self._config, self._logs, self._bdf_dir, self._install_dir,
+                os.path.join(self._install_dir, "renderFarmingQWidgets"), self._macros,
+                os.path.join(self._hashed_temp, "install")]
+
+    def get_hashed_temp(self):
+        return self._hashed_temp
+
+    def get_render_farming_install(self):
+        return self._install_dir
+
+    def get_bdf_folder(self):
+        return self._bdf_dir
+
+    def get_config_folder(self):
+        return self._config
+
+    def get_log_folder(self):
+        return self._logs
+
+
+def build_synthetic_exr(width, height, channels=("A", "B", "G", "R")):
+    """
+    Builds the bytes of an uncompressed scan line EXR with a valid header and offset table, but no real pixels
+    :param width: The image width
+    :param height: The image height
+    :param channels: The channel names, sorted like OpenEXR writes them
+    :return: A byte string
+    """
+    def attribute(name, attribute_type, value):
+        return name.encode("latin-1") + b"\0" + attribute_type.encode("latin-1") + b"\0" + \
+            struct.pack("<i", len(value)) + value
+
+    chlist = b"".join([c.encode("latin-1") + b"\0" + struct.pack("<iB3xii", 1, 0, 1, 1) for c in channels]) + b"\0"
+    window = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+
+    header = struct.pack("<ii", 20000630, 2)
+    header += attribute("channels", "chlist", chlist)
+    header += attribute("compression", "compression", b"\0")
+    header += attribute("dataWindow", "box2i", window)
+    header += attribute("displayWindow", "box2i", window)
+    header += attribute("lineOrder", "lineOrder", b"\0")
+    header += attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0))
+    header += b"\0"
+
+    # Each line chunk is its y coordinate, its size and a single byte standing in for the pixels
+    table_end = len(header) + height * 8
+    offsets = b"".join([struct.pack("<Q", table_end + y * 9) for y in range(height)])
+    chunks = b"".join([struct.pack("<ii", y, 1) + b"\0" for y in range(height)])
+    return header + offsets + chunks
+
+
+def build_synthetic_install_zip(root, file_count):
+    """
+    Creates an install.zip with an install.man in the same layout build.bat produces
+    :param root: The folder to build in
+    :param file_count: How many files the manifest lists
+    :return: The path to the zip file
+    """
+    from manifest import Manifest, InstallerItem
+
+    staging = os.path.join(root, "staging")
+    os.makedirs(staging)
+
+    tokens = ("$(main)", "$(renderFarmingQWidgets)", "$(macro)", "$(dark_icons)", "$(light_icons)")
+    record = list()
+    for i in range(file_count):
+        name = "synthetic_{0:04d}.py".format(i)
+        with open(os.path.join(staging, name), 'w') as f:
+            f.write("# synthetic file {0}\n".format(i) * 64)
+        record.append(InstallerItem(name, tokens[i % len(tokens)]))
+
+    man = Manifest(os.path.join(staging, "install.man"))
+    man.set_data(record)
+    man.set_header({"version": "bench"})
+    man.write()
+
+    zip_path = os.path.join(root, "install.zip")
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        for name in os.listdir(staging):
+            zf.write(os.path.join(staging, name), name)
+    return zip_path
+
+
+# ---------------------------------------------------
+#                  Running
+# ---------------------------------------------------
+
+
+def collect_scenarios(context):
+    scenarios = [SpinachPrepareJob(context)]
+    scenarios += [SpinachPass(context, rt, True) for rt in (0, 2, 4, 6)]
+    scenarios += [SpinachPass(context, rt, False) for rt in (1, 3, 5, 7, 8, 9)]
+    scenarios += [SpinachFrameScan(context)]
+    scenarios += [
+        KaleRun(context),
+        ArugulaCapture(context),
+        ArugulaRestore(context),
+        ExporterScenario(context, True),
+        ExporterScenario(context, False),
+        BarnToolScenario(context, "ClearMaterial", "_clear_materials_handler"),
+        BarnToolScenario(context, "VisibilityToggle", "_visibility_off_handler"),
+        BarnToolScenario(context, "WireColorEdits", "_fix_wire_colors_handler"),
+        BarnToolScenario(context, "WireColorEdits", "_random_wire_color_handler"),
+        BarnToolScenario(context, "LayerTools", "_fix_layer_colors_handler"),
+        BarnToolScenario(context, "LayerTools", "_isolate_handler"),
+        InstallerScenario(context, True),
+        InstallerScenario(context, False),
+    ]
+    return scenarios
+
+
+def run_scenario(scenario, size_name, size, repeat):
+    """
+    Runs a scenario on a fresh synthetic scene
+    :return: A result dictionary
+    """
+    timings = list()
+    calls = None
+    for i in range(repeat):
+        sim.build_scene(objects=size["objects"], render_elements=size["render_elements"], cameras=size["cameras"])
+        scenario.setup(size)
+        sim.counter().reset()
+        try:
+            start = timeit.default_timer()
+            scenario.run()
+            timings.append(timeit.default_timer() - start)
+        finally:
+            scenario.teardown()
+        # Call counts are deterministic, so the first repeat is representative
+        if calls is None:
+            calls = sim.counter().as_dict()
+
+    timings.sort()
+    result = {
+        "scenario": scenario.name,
+        "size": size_name,
+        "repeat": repeat,
+        "seconds_min": timings[0],
+        "seconds_median": timings[len(timings) // 2],
+        "pymxs_calls": calls,
+    }
+    result.update(size)
+    return result
+
+
+def run(sizes, repeat, name_filter):
+    context = BenchmarkContext()
+    results = list()
+    skipped = list()
+    try:
+        for scenario in collect_scenarios(context):
+            if name_filter and name_filter not in scenario.name:
+                continue
+            reason = scenario.available()
+            if reason is not None:
+                skipped.append({"scenario": scenario.name, "reason": reason})
+                print("SKIP {0:<32} {1}".format(scenario.name, reason))
+                continue
+            for size_name in sizes:
+                result = run_scenario(scenario, size_name, SIZES[size_name], repeat)
+                results.append(result)
+                print("{0:<32} {1:<7} {2:>10.4f}s {3:>10} calls".format(
+                    result["scenario"], size_name, result["seconds_min"], result["pymxs_calls"]["total"]
+                ))
+    finally:
+        context.cleanup()
+    return results, skipped
+
+
+def git_revision():
+    # noinspection PyBroadException
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir).strip().decode()
+    except Exception:
+        return "unknown"
+
+
+def write_results(path, results, skipped):
+    document = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    print("Results written to {}".format(path))
+
+
+# ---------------------------------------------------
+#                  Comparing
+# ---------------------------------------------------
+
+
+def compare(base_path, head_path, threshold):
+    """
+    Prints a comparison of two result files
+    :param base_path: The results of the reference commit
+    :param head_path: The results of the commit being evaluated
+    :param threshold: The fractional slow down allowed before a scenario is flagged
+    :return: The number of regressions found
+    """
+    with open(base_path, 'r') as f:
+        base = json.load(f)
+    with open(head_path, 'r') as f:
+        head = json.load(f)
+
+    base_index = dict(((r["scenario"], r["size"]), r) for r in base["results"])
+
+    print("{0} ({1}) -> {2} ({3})".format(base_path, base["meta"]["revision"], head_path, head["meta"]["revision"]))
+    print("{0:<32} {1:<7} {2:>10} {3:>10} {4:>7} {5:>10} {6:>10}".format(
+        "Scenario", "Size", "Base s", "Head s", "Ratio", "Base calls", "Head calls"
+    ))
+
+    regressions = 0
+    for r in head["results"]:
+        b = base_index.get((r["scenario"], r["size"]))
+        if b is None:
+            print("{0:<32} {1:<7} {2:>10} {3:>10.4f}".format(r["scenario"], r["size"], "new", r["seconds_min"]))
+            continue
+
+        ratio = r["seconds_min"] / b["seconds_min"] if b["seconds_min"] > 0 else 1.0
+        slower = ratio > 1.0 + threshold
+        chattier = r["pymxs_calls"]["total"] > b["pymxs_calls"]["total"]
+        flag = "  <-- REGRESSION" if slower or chattier else ""
+        if flag:
+            regressions += 1
+
+        print("{0:<32} {1:<7} {2:>10.4f} {3:>10.4f} {4:>7.2f} {5:>10} {6:>10}{7}".format(
+            r["scenario"], r["size"], b["seconds_min"], r["seconds_min"], ratio,
+            b["pymxs_calls"]["total"], r["pymxs_calls"]["total"], flag
+        ))
+
+    print("{} regression(s)".format(regressions))
+    return regressions
+
+
+# ---------------------------------------------------
+#                  Main
+# ---------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RenderFarming benchmark suite")
+    parser.add_argument("--sizes", default="small,medium,large",
+                        help="Comma separated scene sizes: {}".format(", ".join(sorted(SIZES))))
+    parser.add_argument("--repeat", type=int, default=3, help="Repeats per scenario, the fastest is reported")
+    parser.add_argument("--filter", default="", help="Only run scenarios whose name contains this string")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--log-level", default="WARNING", help="Level for the renderFarming logger")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slow down when comparing")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) > 0 else 0)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    for s in sizes:
+        if s not in SIZES:
+            parser.error("Unknown size: {}".format(s))
+
+    rf_logger = logging.getLogger("renderFarming")
+    rf_logger.setLevel(args.log_level)
+    rf_logger.addHandler(logging.NullHandler())
+
+    results, skipped = run(sizes, max(1, args.repeat), args.filter)
+
+    output = args.output or os.path.join(os.getcwd(), "benchmark_{}.json".format(git_revision()))
+    write_results(output, results, skipped)
+
+
+if __name__ == "__main__":
+    main()
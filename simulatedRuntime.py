@@ -0,0 +1,953 @@
+"""
+A stand-in for the 3ds Max scripting runtime
+
+Provides fake "pymxs" and "MaxPlus" modules backed by a synthetic scene so that the RenderFarming modules can be
+imported and exercised outside of 3ds Max.  Every round trip into the runtime (property reads, property writes and
+function calls) is counted so that benchmarks can report how chatty a code path is with pymxs.
+
+Usage:
+    import simulatedRuntime
+    sim = simulatedRuntime.install()
+    sim.build_scene(objects=1000, render_elements=40, cameras=8)
+
+    import renderFarmingSpinach  # Now imports against the simulated runtime
+"""
+
+import re
+import ntpath
+import sys
+import types
+import random
+import colorsys
+import contextlib
+
+
+# ---------------------------------------------------
+#                  Call Counting
+# ---------------------------------------------------
+
+
+class CallCounter(object):
+    """
+    Counts round trips into the simulated runtime
+    """
+    def __init__(self):
+        self.gets = 0
+        self.sets = 0
+        self.calls = 0
+
+    def reset(self):
+        self.gets = 0
+        self.sets = 0
+        self.calls = 0
+
+    def total(self):
+        return self.gets + self.sets + self.calls
+
+    def as_dict(self):
+        return {"get": self.gets, "set": self.sets, "call": self.calls, "total": self.total()}
+
+    def __str__(self):
+        return "get: {0}, set: {1}, call: {2}".format(self.gets, self.sets, self.calls)
+
+
+# ---------------------------------------------------
+#                  MaxScript Values
+# ---------------------------------------------------
+
+
+class MXSValue(object):
+    """
+    Base class for any value living in the simulated runtime.  Properties are stored in a dictionary and every
+    access through attribute syntax is counted.
+    """
+    def __init__(self, counter, props=None):
+        self.__dict__["_counter"] = counter
+        self.__dict__["_props"] = dict(props) if props is not None else dict()
+
+    def __getattr__(self, item):
+        props = self.__dict__["_props"]
+        if item.startswith("__") or item not in props:
+            raise AttributeError(item)
+        self.__dict__["_counter"].gets += 1
+        return props[item]
+
+    def __setattr__(self, key, value):
+        self.__dict__["_counter"].sets += 1
+        self.__dict__["_props"][key] = value
+
+    def prop_names(self):
+        return list(self.__dict__["_props"].keys())
+
+    def get_prop(self, name):
+        return self.__dict__["_props"][name]
+
+    def set_prop(self, name, value):
+        self.__dict__["_props"][name] = value
+
+    def has_prop(self, name):
+        return name in self.__dict__["_props"]
+
+
+class MXSFunction(object):
+    """
+    A callable runtime value, calls are counted
+    """
+    def __init__(self, counter, name, function):
+        self._counter = counter
+        self._name = name
+        self._function = function
+
+    def __call__(self, *args, **kwargs):
+        self._counter.calls += 1
+        return self._function(*args, **kwargs)
+
+    def __str__(self):
+        return "{0}()".format(self._name)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class MXSClass(object):
+    """
+    A MaxScript class, calling it creates an instance
+    """
+    def __init__(self, counter, name, defaults=None, superclass="MAXWrapper"):
+        self._counter = counter
+        self._name = name
+        self._defaults = defaults if defaults is not None else dict()
+        self._superclass = superclass
+        self._on_create = None
+
+    def __call__(self, **kwargs):
+        self._counter.calls += 1
+        instance = self.create(**kwargs)
+        if self._on_create is not None:
+            self._on_create(instance)
+        return instance
+
+    def set_on_create(self, on_create):
+        """
+        :param on_create: Called with each instance made by calling the class, for classes which create scene nodes
+        """
+        self._on_create = on_create
+
+    def create(self, **kwargs):
+        props = dict(self._defaults)
+        props.update(kwargs)
+        return MXSObject(self._counter, self, props)
+
+    def get_name(self):
+        return self._name
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class MXSObject(MXSValue):
+    """
+    An instance of an MXSClass: renderers, render elements, filters, helpers...
+    """
+    def __init__(self, counter, mxs_class, props=None):
+        super(MXSObject, self).__init__(counter, props)
+        self.__dict__["_class"] = mxs_class
+
+    def mxs_class(self):
+        return self.__dict__["_class"]
+
+    def __str__(self):
+        return "{0}:{0}".format(self.__dict__["_class"].get_name())
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class MXSColor(MXSValue):
+    """
+    A MaxScript color with the derived hue, saturation and value properties (0-255 ranges)
+    """
+    def __init__(self, counter, r, g, b):
+        super(MXSColor, self).__init__(counter, {"r": float(r), "g": float(g), "b": float(b)})
+
+    def __getattr__(self, item):
+        if item in ("h", "s", "v"):
+            self.__dict__["_counter"].gets += 1
+            props = self.__dict__["_props"]
+            hsv = colorsys.rgb_to_hsv(props["r"] / 255.0, props["g"] / 255.0, props["b"] / 255.0)
+            return hsv[("h", "s", "v").index(item)] * 255.0
+        return super(MXSColor, self).__getattr__(item)
+
+    def rgb(self):
+        props = self.__dict__["_props"]
+        return props["r"], props["g"], props["b"]
+
+    def __str__(self):
+        return "(color {0} {1} {2})".format(*self.rgb())
+
+
+class MXSMatrix(MXSValue):
+    """
+    A stand-in for a Matrix3, only tracks a position and a rotation list
+    """
+    def __init__(self, counter, position=(0.0, 0.0, 0.0), rotation=(0.0, 0.0, 0.0)):
+        super(MXSMatrix, self).__init__(counter, {"position": list(position), "rotation": list(rotation)})
+
+    def copy(self):
+        return MXSMatrix(self.__dict__["_counter"], self.get_prop("position"), self.get_prop("rotation"))
+
+
+class MXSInterval(MXSValue):
+    def __init__(self, counter, start, end):
+        super(MXSInterval, self).__init__(counter, {"start": start, "end": end})
+
+
+class MXSNode(MXSObject):
+    """
+    A scene node
+    """
+    def __init__(self, counter, mxs_class, props=None):
+        super(MXSNode, self).__init__(counter, mxs_class, props)
+
+    def __str__(self):
+        return "${0}:{1}".format(self.__dict__["_class"].get_name(), self.__dict__["_props"].get("name", ""))
+
+
+class MXSLayer(MXSValue):
+    def __init__(self, counter, props=None, parent=None):
+        super(MXSLayer, self).__init__(counter, props)
+        self.__dict__["_parent"] = parent
+
+    def get_parent(self):
+        return self.__dict__["_parent"]
+
+
+class MXSStruct(MXSValue):
+    """
+    A struct or interface such as maxOps or renderSceneDialog whose members are functions and properties
+    """
+    def __init__(self, counter, members):
+        wrapped = dict()
+        for name, member in members.items():
+            if callable(member) and not isinstance(member, (MXSClass, MXSFunction, MXSValue)):
+                member = MXSFunction(counter, name, member)
+            wrapped[name] = member
+        super(MXSStruct, self).__init__(counter, wrapped)
+
+
+# ---------------------------------------------------
+#                  Render Element Manager
+# ---------------------------------------------------
+
+
+class RenderElementManager(object):
+    """
+    Mimics the index based interface returned by maxOps.GetCurRenderElementMgr()
+    """
+    def __init__(self, counter):
+        self._counter = counter
+        self.elements = list()
+        self.filenames = list()
+
+        self.NumRenderElements = MXSFunction(counter, "NumRenderElements", lambda: len(self.elements))
+        self.GetRenderElement = MXSFunction(counter, "GetRenderElement", lambda i: self.elements[i])
+        self.SetRenderElementFilename = MXSFunction(counter, "SetRenderElementFilename", self._set_filename)
+        self.GetRenderElementFilename = MXSFunction(counter, "GetRenderElementFilename",
+                                                    lambda i: self.filenames[i])
+        self.AddRenderElement = MXSFunction(counter, "AddRenderElement", self._add)
+        self.RemoveAllRenderElements = MXSFunction(counter, "RemoveAllRenderElements", self._clear)
+
+    def _set_filename(self, index, file_name):
+        self.filenames[index] = file_name
+        return True
+
+    def _add(self, element):
+        self.elements.append(element)
+        self.filenames.append("")
+        return True
+
+    def _clear(self):
+        self.elements = list()
+        self.filenames = list()
+        return True
+
+
+# ---------------------------------------------------
+#                  Runtime
+# ---------------------------------------------------
+
+
+# Render element classes used when building synthetic scenes, roughly the mix found in our production files
+RENDER_ELEMENT_CLASSES = (
+    "VRayDiffuseFilter", "VRayReflection", "VRayRefraction", "VRaySpecular", "VRayGlobalIllumination",
+    "VRayLighting", "VRaySelfIllumination", "VRayZDepth", "VRayNormals", "VRayVelocity", "VRayExtraTex",
+    "VRayCryptomatte", "VRayObjectID", "MultiMatteElement", "VRayRawLighting", "VRayDenoiser",
+)
+
+# Object classes used when building synthetic scenes
+NODE_CLASSES = ("Editable_Poly", "Editable_Mesh", "Box", "Sphere", "PolyMeshObject", "Line", "VRayLight")
+
+# The V-Ray properties that RenderFarming reads and writes with sensible defaults
+VRAY_PROPERTIES = {
+    "adv_irradmap_autoSave": False, "adv_irradmap_autoSaveFileName": "", "adv_irradmap_dontDelete": False,
+    "adv_irradmap_loadFileName": "", "adv_irradmap_mode": 0, "adv_irradmap_switchToSavedMap": False,
+    "camera_cyl_height": 90.0, "camera_fov": 45.0, "camera_overrideFOV": False, "camera_type": 0,
+    "colorMapping_adaptationOnly": 2, "colorMapping_clampLevel": 1.0, "colorMapping_clampOutput": False,
+    "colorMapping_gamma": 2.2, "colorMapping_subpixel": False, "colorMapping_type": 6,
+    "environment_gi_on": False, "environment_refract_on": False, "environment_rr_on": False,
+    "environment_secondaryMatte_on": False, "filter_kernel": None, "filter_on": True,
+    "gi_on": True, "gi_irradmap_interpFrames": 2, "gi_irradmap_multipleViews": True, "gi_primary_type": 2,
+    "gi_secondary_type": 3, "gi_irradmap_preset": 2, "gi_irradmap_minRate": -3, "gi_irradmap_maxRate": -1,
+    "gi_irradmap_subdivs": 50, "gi_irradmap_interpSamples": 20, "gi_irradmap_colorThreshold": 0.3,
+    "gi_irradmap_normalThreshold": 0.1, "gi_irradmap_distThreshold": 0.1,
+    "imageSampler_renderMask_layers": None, "imageSampler_renderMask_objectIDs": "",
+    "imageSampler_renderMask_texmap": None, "imageSampler_renderMask_type": 0, "imageSampler_type_new": 1,
+    "lightcache_autoSave": False, "lightcache_autoSaveFileName": "", "lightcache_dontDelete": False,
+    "lightcache_loadFileName": "", "lightcache_mode": 0, "lightcache_multipleViews": True,
+    "lightcache_switchToSavedMap": False, "lightcache_subdivs": 1000, "lightcache_sampleSize": 0.02,
+    "lightcache_retrace_on": True, "lightcache_retrace_threshold": 2.0,
+    "options_defaultLights": 0, "options_dontRenderImage": False, "options_glossyEffects": True,
+    "options_hiddenLights": False, "options_lights": True, "options_maps": True, "options_overrideMtl_on": False,
+    "options_reflectionRefraction": True, "options_shadows": True,
+    "output_on": False, "output_progressiveAutoSave": 180.0, "output_rawFileName": "",
+    "output_resumableRendering": False, "output_saveRawFile": False, "output_splitFileName": "",
+    "output_splitgbuffer": False,
+}
+
+
+class SimulatedRuntime(MXSValue):
+    """
+    The simulated pymxs.runtime
+    Globals are stored as properties, so every rt.<something> access is a counted round trip.
+    """
+    def __init__(self, vray_property_count=700, seed=0):
+        super(SimulatedRuntime, self).__init__(CallCounter())
+        self.__dict__["_random"] = random.Random(seed)
+        self.__dict__["_classes"] = dict()
+        self.__dict__["_nodes"] = list()
+        self.__dict__["_layers"] = list()
+        self.__dict__["_selection"] = list()
+        self.__dict__["_maxscript_functions"] = dict()
+        self.__dict__["_rem"] = RenderElementManager(self.counter())
+        self.__dict__["_vray_property_count"] = vray_property_count
+
+        self._define_globals()
+        self._register_renderfarming_functions()
+        self.build_scene()
+
+    # ---------------------------------------------------
+    #                  Internal Helpers
+    # ---------------------------------------------------
+
+    def counter(self):
+        return self.__dict__["_counter"]
+
+    def _define(self, name, value):
+        if callable(value) and not isinstance(value, (MXSClass, MXSFunction, MXSValue)):
+            value = MXSFunction(self.counter(), name, value)
+        self.set_prop(name, value)
+
+    def _mxs_class(self, name, defaults=None, superclass="MAXWrapper"):
+        classes = self.__dict__["_classes"]
+        if name not in classes:
+            classes[name] = MXSClass(self.counter(), name, defaults, superclass)
+            self.set_prop(name, classes[name])
+        return classes[name]
+
+    def _vray_defaults(self):
+        defaults = dict(VRAY_PROPERTIES)
+        # Pads the property list out to roughly the size of the real V-Ray renderer
+        for i in range(max(0, self.__dict__["_vray_property_count"] - len(defaults))):
+            defaults["system_misc_{0:03d}".format(i)] = i
+        return defaults
+
+    def _define_globals(self):
+        counter = self.counter()
+
+        # Renderers
+
+        vray_class = self._mxs_class("V_Ray_Adv_3_60_03", self._vray_defaults(), "RendererClass")
+        scanline_class = self._mxs_class("Default_Scanline_Renderer", dict(), "RendererClass")
+
+        self.__dict__["_vray"] = vray_class.create()
+        self._define("renderers", MXSStruct(counter, {"current": self.__dict__["_vray"]}))
+        self._define("RendererClass", MXSStruct(counter, {"classes": [scanline_class, vray_class]}))
+
+        # Classes referenced by RenderFarming
+
+        for name in ("VRayMitNetFilter", "VRayTriangleFilter", "VRayBoxFilter", "VRaySincFilter",
+                     "VRayLanczosFilter", "Mitchell_Netravali", "Blackman", "Blend", "Cook_Variable", "Soften",
+                     "Video", "Cubic", "Quadratic", "Plate_Match_MAX_R2", "Catmull_Rom", "Sharp_Quadratic", "Area"):
+            self._mxs_class(name, dict(), "filter")
+
+        for name in RENDER_ELEMENT_CLASSES:
+            self._mxs_class(name, {"elementname": name, "enabled": True, "vrayVFB": True}, "RenderElement")
+
+        for name in NODE_CLASSES:
+            self._mxs_class(name, dict(), "GeometryClass")
+
+        self._mxs_class("Physical", {"exposure_value": 14.0, "motion_blur_enabled": False, "use_dof": False},
+                        "camera")
+        self._mxs_class("VRayStereoscopic", {"enabled": True, "adjust_resolution": False, "output_layout": 0,
+                                             "eye_distance": 6.3}, "helper").set_on_create(self.add_node)
+        self._mxs_class("UndefinedClass")
+
+        for name in ("ObjExp", "DAEEXP", "FBXEXP"):
+            self._mxs_class(name, dict(), "ExporterPlugin")
+
+        # Constants
+
+        self._define("undefined", None)
+        self._define("maxFileName", "_test_sim_scene.max")
+        self._define("maxFilePath", "C:\\sim\\")
+        self._define("useEnvironmentMap", True)
+        self._define("numAtmospherics", 0)
+
+        # Render Settings
+
+        for prop, value in (("rendTimeType", 1), ("rendNThFrame", 1), ("rendStart", 0), ("rendEnd", 100),
+                            ("rendFileNumberBase", 0), ("rendPickupFrames", ""), ("renderWidth", 1920),
+                            ("renderHeight", 1080), ("renderPixelAspect", 1.0), ("rendAtmosphere", True),
+                            ("renderEffects", True), ("renderDisplacements", True), ("rendColorCheck", False),
+                            ("rendFieldRender", False), ("rendHidden", False), ("rendSimplifyAreaLights", False),
+                            ("rendForce2Side", False), ("rendSuperBlack", False), ("rendSaveFile", False),
+                            ("rendOutputFilename", ""), ("rendUseDevice", False), ("rendShowVFB", True),
+                            ("rendUseNet", False), ("skipRenderedFrames", False), ("usePreRendScript", False),
+                            ("preRendScript", "")):
+            self._define(prop, value)
+
+        self.__dict__["_render_type"] = 1
+        self._define("animationRange", MXSInterval(counter, 0, 100))
+        self._define("sliderTime", 0)
+
+        # Structs and Interfaces
+
+        self._define("maxOps", MXSStruct(counter, {"GetCurRenderElementMgr": lambda: self.__dict__["_rem"]}))
+        self._define("renderSceneDialog", MXSStruct(counter, {
+            "open": lambda: None, "close": lambda: None, "update": lambda: None, "isOpen": lambda: False
+        }))
+        self._define("macros", MXSStruct(counter, {"run": lambda category, name: True}))
+        self._define("renderpresets", MXSStruct(counter, {
+            "SaveAll": lambda flags, path: True, "LoadAll": lambda flags, path: True
+        }))
+        self._define("units", MXSStruct(counter, {"decodeValue": lambda value: 6.3, "SystemType": "centimeters"}))
+        self._define("viewport", MXSStruct(counter, {"setCamera": self._set_active_camera, "numViews": 1}))
+
+        # Functions
+
+        self._define("name", lambda value: value)
+        self._define("classOf", self._class_of)
+        self._define("classof", self._class_of)
+        self._define("getPropNames", lambda obj: obj.prop_names())
+        self._define("getProperty", lambda obj, prop: obj.get_prop(str(prop)))
+        self._define("setProperty", lambda obj, prop, value: obj.set_prop(str(prop), value))
+        self._define("isProperty", lambda obj, prop: obj.has_prop(str(prop)))
+        self._define("getRenderType", lambda: self.__dict__["_render_type"])
+        self._define("setRenderType", self._set_render_type)
+        self._define("getActiveCamera", self._get_active_camera)
+        self._define("getNodeByName", self._get_node_by_name)
+        self._define("loadMaxFile", self._load_max_file)
+        self._define("getSaveRequired", lambda: self.__dict__.get("_save_required", False))
+        self._define("getAtmospheric", lambda index: None)
+        self._define("isActive", lambda atmos: False)
+        self._define("vrayVFBGetRegionEnabled", lambda: False)
+        self._define("vfbControl", lambda control: [control == "srgb"])
+        self._define("getCurrentselection", lambda: list(self.__dict__["_selection"]))
+        self._define("getClassInstances", self._get_class_instances)
+        self._define("select", self._select)
+        self._define("clearSelection", lambda: self._select([]))
+        self._define("copy", self._copy_node)
+        self._define("delete", self._delete_nodes)
+        self._define("redrawViews", lambda: None)
+        self._define("completeRedraw", lambda: None)
+        self._define("exportFile", lambda file_name, *args, **kwargs: True)
+        self._define("FBXExporterSetParam", lambda name, value: True)
+        self._define("saveNodes", self._save_nodes)
+        self._define("setUserProp", lambda node, key, value: node.__dict__["_props"].setdefault(
+            "_user_props", dict()).__setitem__(key, value))
+        self._define("getUserProp", lambda node, key: node.__dict__["_props"].get("_user_props", dict()).get(key))
+        self._define("GetDir", lambda name: "C:\\sim\\export")
+        self._define("getDir", lambda name: "C:\\sim\\scripts")
+        self._define("ShellLaunch", lambda *args: True)
+        self._define("color", lambda r, g, b: MXSColor(counter, r, g, b))
+        self._define("Point3", lambda x, y, z: [x, y, z])
+        self._define("EulerAngles", lambda x, y, z: [x, y, z])
+        self._define("eulerToQuat", lambda euler: list(euler))
+        self._define("PreRotate", self._pre_rotate)
+        self._define("ResetXForm", lambda node: True)
+        self._define("interval", lambda start, end: MXSInterval(counter, start, end))
+        self._define("array", lambda *items: list(items))
+        self._define("execute", self._execute)
+
+    # ---------------------------------------------------
+    #                  Runtime Functions
+    # ---------------------------------------------------
+
+    def _class_of(self, value):
+        if isinstance(value, MXSObject):
+            return value.mxs_class()
+        if value is None:
+            return self.__dict__["_classes"]["UndefinedClass"]
+        return type(value).__name__
+
+    def _set_render_type(self, value):
+        self.__dict__["_render_type"] = value
+
+    def _get_active_camera(self):
+        active = self.__dict__["_active_camera"]
+        if active is not None:
+            return active
+        cameras = [n for n in self.__dict__["_nodes"] if n.mxs_class() is self.__dict__["_classes"]["Physical"]]
+        return cameras[0] if len(cameras) > 0 else None
+
+    def _set_active_camera(self, camera):
+        self.__dict__["_active_camera"] = camera
+        return True
+
+    def _load_max_file(self, file_name, quiet=False):
+        self.set_prop("maxFilePath", ntpath.dirname(file_name) + "\\")
+        self.set_prop("maxFileName", ntpath.basename(file_name))
+        return True
+
+    def _get_node_by_name(self, name):
+        for node in self.__dict__["_nodes"]:
+            if node.get_prop("name") == name:
+                return node
+        return None
+
+    def _get_class_instances(self, mxs_class):
+        return [n for n in self.__dict__["_nodes"] if n.mxs_class() is mxs_class]
+
+    def _select(self, *nodes):
+        if len(nodes) == 1 and isinstance(nodes[0], (list, tuple)):
+            nodes = nodes[0]
+        self.__dict__["_selection"] = list(nodes)
+
+    def _copy_node(self, node):
+        props = dict(node.__dict__["_props"])
+        props["transform"] = props["transform"].copy()
+        clone = MXSNode(self.counter(), node.mxs_class(), props)
+        self.__dict__["_nodes"].append(clone)
+        self.notify("NodeCreated")
+        return clone
+
+    # noinspection PyMethodMayBeStatic
+    def _save_nodes(self, nodes, file_name, quiet=False):
+        with open(file_name, "w") as scene_file:
+            scene_file.write("\n".join([str(n.get_prop("name")) for n in nodes]))
+        return True
+
+    def _delete_nodes(self, nodes):
+        if not isinstance(nodes, (list, tuple)):
+            nodes = [nodes]
+        doomed = set(id(n) for n in nodes)
+        self.__dict__["_nodes"] = [n for n in self.__dict__["_nodes"] if id(n) not in doomed]
+        self.set_prop("objects", self.__dict__["_nodes"])
+        self.notify("SceneNodeDeleted")
+
+    # noinspection PyMethodMayBeStatic
+    def _pre_rotate(self, matrix, quat):
+        rotation = matrix.get_prop("rotation")
+        matrix.set_prop("rotation", [a + b for a, b in zip(rotation, quat)])
+
+    def _execute(self, source):
+        """
+        Stand-in for rt.execute()
+        MaxScript can't be interpreted here, so any function definitions in the source are looked up in the
+        registered python implementations.  The last function defined is returned, like MaxScript would.
+        """
+        result = None
+        for name in re.findall(r"\bfn\s+(\w+)", source):
+            implementation = self.__dict__["_maxscript_functions"].get(name)
+            if implementation is None:
+                raise RuntimeError("No simulated implementation for MaxScript function: {}".format(name))
+            result = MXSFunction(self.counter(), name, implementation)
+            self.set_prop(name, result)
+        return result
+
+    # ---------------------------------------------------
+    #            RenderFarming MaxScript Functions
+    # ---------------------------------------------------
+
+    def _register_renderfarming_functions(self):
+        """
+        Python versions of the MaxScript functions RenderFarming defines through execute().  They work directly on
+        the simulated scene, so each call counts as the single round trip it is in Max.
+        """
+        self.register_maxscript_function("rfCollectRenderElements", self._mxs_collect_render_elements)
+        self.register_maxscript_function("rfSetRenderElementFilenames", self._mxs_set_render_element_filenames)
+        self.register_maxscript_function("rfGIFingerprintValues", self._mxs_gi_fingerprint_values)
+        self.register_maxscript_function("rfCameraNames", self._mxs_camera_names)
+        self.register_maxscript_function("rfSubmitNetRenderJob", self._mxs_submit_net_render_job)
+        self.register_maxscript_function("rfRenderQueueFrame", self._mxs_render_queue_frame)
+        self.register_maxscript_function("rfRenderQueueSequence", self._mxs_render_queue_sequence)
+        self.register_maxscript_function("rfPrepExportClones", self._mxs_prep_export_clones)
+        self.register_maxscript_function("rfExportContentHashes", self._mxs_export_content_hashes)
+        self.register_maxscript_function("rfExportInstanceKeys", self._mxs_export_instance_keys)
+        self.register_maxscript_function("rfBulkGetProperties", self._mxs_bulk_get_properties)
+        self.register_maxscript_function("rfBulkSetProperty", self._mxs_bulk_set_property)
+        self.register_maxscript_function("rfLayerTable", self._mxs_layer_table)
+        self.register_maxscript_function("rfSwapSettings", self._mxs_swap_settings)
+        self.register_maxscript_function("rfReadSettings", self._mxs_read_settings)
+
+    def _mxs_collect_render_elements(self):
+        rem = self.__dict__["_rem"]
+        return [[el, str(el.mxs_class()), el.get_prop("elementname"),
+                 el.get_prop("enabled") if el.has_prop("enabled") else True] for el in rem.elements]
+
+    def _mxs_set_render_element_filenames(self, file_names):
+        rem = self.__dict__["_rem"]
+        for i, file_name in enumerate(file_names):
+            rem.filenames[i] = file_name
+        return len(file_names)
+
+    def _mxs_gi_fingerprint_values(self, props, cam):
+        vray = self.__dict__["_vray"]
+        settings = [str(vray.get_prop(p)) if vray.has_prop(p) else "" for p in props]
+        # The simulated geometry has no counts or bounding boxes, so its keys are the transforms and materials
+        geometry = [(str(sorted(n.get_prop("transform").__dict__["_props"].items())), str(n.get_prop("material")))
+                    for n in self.__dict__["_nodes"] if n.has_prop("material")]
+        scene = [
+            str(hash(tuple(geometry))),
+            "",
+            cam.get_prop("name") if cam is not None else "",
+            str(sorted(cam.get_prop("transform").__dict__["_props"].items())) if cam is not None else "",
+            str(sorted(self.get_prop("animationRange").__dict__["_props"].items())),
+            str(self.get_prop("renderWidth")),
+            str(self.get_prop("renderHeight")),
+            str(len(self.__dict__["_nodes"])),
+        ]
+        return [settings, scene]
+
+    def _mxs_camera_names(self):
+        physical = self.__dict__["_classes"]["Physical"]
+        return [n.get_prop("name") for n in self.__dict__["_nodes"] if n.mxs_class() is physical]
+
+    def _mxs_submit_net_render_job(self, manager_name, job_name, suspended, dependencies):
+        submitted = self.__dict__.setdefault("_submitted_jobs", list())
+        # The job handle is its position in the list
+        if not set(range(len(submitted))).issuperset(dependencies):
+            return None
+        submitted.append((manager_name, job_name, suspended, list(dependencies)))
+        return len(submitted) - 1
+
+    def _mxs_render_queue_frame(self, cam, frame_number, output_file):
+        self.__dict__.setdefault("_rendered_frames", list()).append((cam.get_prop("name"), frame_number, output_file))
+        return True
+
+    def _mxs_render_queue_sequence(self, cam, first_frame, last_frame, nth, output_file):
+        rendered = self.__dict__.setdefault("_rendered_frames", list())
+        for frame_number in range(first_frame, last_frame + 1, nth):
+            rendered.append((cam.get_prop("name"), frame_number, output_file))
+        self.__dict__.setdefault("_rendered_sequences", list()).append((first_frame, last_frame, nth))
+        return True
+
+    def _mxs_prep_export_clones(self, originals, classes, rotate_for_unity, reset_x_forms, collapse_stack,
+                                pivot_to_origin, local_space):
+        clones = list()
+        for original in originals:
+            if original.mxs_class() not in classes:
+                continue
+            clone = self._copy_node(original)
+            clone.set_prop("name", original.get_prop("name"))
+            if rotate_for_unity or local_space:
+                transform = MXSMatrix(self.counter(), (0.0, 0.0, 0.0)) if local_space else \
+                    original.get_prop("transform").copy()
+                if rotate_for_unity:
+                    self._pre_rotate(transform, [90, 0, 0])
+                clone.set_prop("transform", transform)
+            if pivot_to_origin:
+                clone.set_prop("position", [0, 0, 0])
+            clones.append(clone)
+        return clones
+
+    # noinspection PyMethodMayBeStatic
+    def _mxs_export_content_hashes(self, originals, classes):
+        nodes = [o for o in originals if o.mxs_class() in classes]
+        contents = [[str(n.mxs_class()), str(sorted(n.get_prop("transform").__dict__["_props"].items())),
+                     str(n.get_prop("material"))] for n in nodes]
+        return [nodes, contents]
+
+    # noinspection PyMethodMayBeStatic
+    def _mxs_export_instance_keys(self, originals, classes):
+        nodes = [o for o in originals if o.mxs_class() in classes]
+        names = [n.get_prop("name") for n in nodes]
+        # Nodes made instances of each other share the base object in their properties
+        keys = ["{0}@{1}".format(id(n.__dict__["_props"].get("baseObject", n)),
+                                 [n.get_prop(p) for p in ("objectOffsetPos", "objectOffsetRot", "objectOffsetScale")
+                                  if n.has_prop(p)])
+                for n in nodes]
+        transforms = [list(n.get_prop("transform").get_prop("position")) + [0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0]
+                      for n in nodes]
+        return [nodes, names, keys, transforms]
+
+    # noinspection PyMethodMayBeStatic
+    def _mxs_property_key(self, value, prop):
+        # MaxScript property names aren't case sensitive
+        props = value.__dict__["_props"]
+        if prop in props:
+            return prop
+        for key in props:
+            if key.lower() == prop.lower():
+                return key
+        return prop
+
+    def _mxs_bulk_get_properties(self, nodes, paths):
+        columns = list()
+        for path in paths:
+            column = list()
+            for node in nodes:
+                value = node
+                for part in path.split("."):
+                    if value is None:
+                        break
+                    if isinstance(value, MXSColor) and part in ("h", "s", "v"):
+                        hsv = colorsys.rgb_to_hsv(*[c / 255.0 for c in value.rgb()])
+                        value = hsv[("h", "s", "v").index(part)] * 255.0
+                    else:
+                        value = value.__dict__["_props"].get(self._mxs_property_key(value, part))
+                column.append(value)
+            columns.append(column)
+        return columns
+
+    def _mxs_bulk_set_property(self, nodes, prop, values, broadcast, make_color, title, threshold):
+        for i, node in enumerate(nodes):
+            if broadcast:
+                value = values
+            elif make_color:
+                value = MXSColor(self.counter(), *values[3 * i:3 * i + 3])
+            else:
+                value = values[i]
+            node.__dict__["_props"][self._mxs_property_key(node, prop)] = value
+        return len(nodes)
+
+    def _mxs_swap_settings(self, targets, props, values):
+        old_values = self._mxs_read_settings(targets, props)
+        for target, prop, value in zip(targets, props, values):
+            target.__dict__["_props"][self._mxs_property_key(target, prop)] = value
+        return old_values
+
+    def _mxs_read_settings(self, targets, props):
+        return [t.__dict__["_props"].get(self._mxs_property_key(t, p)) for t, p in zip(targets, props)]
+
+    def _mxs_layer_table(self, nodes):
+        layers = self.__dict__["_layers"]
+        counts = dict()
+        for node in self.__dict__["_nodes"]:
+            layer = node.get_prop("layer") if node.has_prop("layer") else layers[0]
+            counts[id(layer)] = counts.get(id(layer), 0) + 1
+        colors = [layer.get_prop("wireColor").rgb() for layer in layers]
+        node_layers = [(n.get_prop("layer") if n.has_prop("layer") else layers[0]).get_prop("name") for n in nodes]
+        return [
+            list(layers),
+            [layer.get_prop("name") for layer in layers],
+            [layer.get_parent().get_prop("name") if layer.get_parent() is not None else "" for layer in layers],
+            [counts.get(id(layer), 0) for layer in layers],
+            [c[0] for c in colors],
+            [c[1] for c in colors],
+            [c[2] for c in colors],
+            [layer.get_prop("isHidden") for layer in layers],
+            [layer.get_prop("renderable") for layer in layers],
+            node_layers,
+        ]
+
+    # ---------------------------------------------------
+    #                  Public
+    # ---------------------------------------------------
+
+    def register_maxscript_function(self, name, implementation):
+        """
+        Registers a python implementation for a MaxScript function that code under test defines through execute()
+        :param name: The name of the MaxScript function
+        :param implementation: A python callable
+        :return: None
+        """
+        self.__dict__["_maxscript_functions"][name] = implementation
+
+    def build_scene(self, objects=100, render_elements=10, cameras=2, layers=10):
+        """
+        Replaces the scene contents with a synthetic scene of the requested size.
+        The renderer keeps its identity so modules holding on to it stay valid, but its settings are reset.
+        :param objects: The number of geometry nodes
+        :param render_elements: The number of render elements
+        :param cameras: The number of physical cameras
+        :param layers: The number of layers the nodes are spread across
+        :return: None
+        """
+        counter = self.counter()
+        rnd = self.__dict__["_random"]
+        classes = self.__dict__["_classes"]
+
+        vray = self.__dict__["_vray"]
+        vray.__dict__["_props"] = self._vray_defaults()
+
+        layer_list = list()
+        for i in range(max(1, layers)):
+            layer_list.append(MXSLayer(counter, {
+                "name": "layer_{0:03d}".format(i),
+                "wireColor": MXSColor(counter, rnd.randrange(0, 255), rnd.randrange(0, 255), rnd.randrange(0, 255)),
+                "isHidden": False,
+                "renderable": True,
+            }, layer_list[i // 4] if i >= 4 else None))
+
+        nodes = list()
+        for i in range(objects):
+            node_class = classes[NODE_CLASSES[i % len(NODE_CLASSES)]]
+            nodes.append(MXSNode(counter, node_class, {
+                "name": "object_{0:05d}".format(i),
+                "material": None,
+                "visibility": True,
+                "wirecolor": MXSColor(counter, rnd.randrange(0, 255), rnd.randrange(0, 255), rnd.randrange(0, 255)),
+                "colorByLayer": (i % 5 == 0),
+                "layer": layer_list[i % len(layer_list)],
+                "transform": MXSMatrix(counter, (rnd.random(), rnd.random(), rnd.random())),
+                "position": [0.0, 0.0, 0.0],
+            }))
+
+        for i in range(cameras):
+            nodes.append(MXSNode(counter, classes["Physical"], {
+                "name": "camera_{0:02d}".format(i),
+                "exposure_value": 14.0,
+                "motion_blur_enabled": False,
+                "use_dof": False,
+                "transform": MXSMatrix(counter, (float(i), 0.0, 0.0)),
+            }))
+
+        self.__dict__["_nodes"] = nodes
+        self.set_prop("objects", nodes)
+        self.__dict__["_layers"] = layer_list
+        self.__dict__["_selection"] = list()
+        self.__dict__["_active_camera"] = None
+
+        rem = self.__dict__["_rem"]
+        rem.elements = list()
+        rem.filenames = list()
+        for i in range(render_elements):
+            element_class = classes[RENDER_ELEMENT_CLASSES[i % len(RENDER_ELEMENT_CLASSES)]]
+            rem.elements.append(element_class.create(elementname="{0}_{1:02d}".format(element_class, i)))
+            rem.filenames.append("")
+
+        counter.reset()
+        self.notify("FilePostOpen")
+
+    def select_objects(self, count=None):
+        """
+        Selects geometry nodes in the scene
+        :param count: How many to select, all geometry if None
+        :return: None
+        """
+        physical = self.__dict__["_classes"]["Physical"]
+        geometry = [n for n in self.__dict__["_nodes"] if n.mxs_class() is not physical]
+        self.__dict__["_selection"] = geometry if count is None else geometry[:count]
+
+    def get_nodes(self):
+        return list(self.__dict__["_nodes"])
+
+    def add_node(self, node):
+        """
+        Adds a node to the scene, sending the node created notification
+        :param node: An MXSNode or an instance of a helper class
+        :return: None
+        """
+        self.__dict__["_nodes"].append(node)
+        self.set_prop("objects", self.__dict__["_nodes"])
+        self.notify("NodeCreated")
+
+    # noinspection PyMethodMayBeStatic
+    def notify(self, code):
+        """
+        Calls the handlers registered with the simulated MaxPlus NotificationManager for a notification
+        :param code: The name of the notification code, "NodeCreated" for example
+        :return: None
+        """
+        max_plus = sys.modules.get("MaxPlus")
+        if max_plus is None:
+            return
+        value = getattr(max_plus.NotificationCodes, code)
+        for handler_code, handler in list(max_plus.NotificationManager._handlers):
+            if handler_code == value:
+                handler(value)
+
+    def get_layers(self):
+        return list(self.__dict__["_layers"])
+
+    def get_renderer(self):
+        return self.__dict__["_vray"]
+
+    def get_render_element_manager(self):
+        return self.__dict__["_rem"]
+
+
+# ---------------------------------------------------
+#                  Fake Modules
+# ---------------------------------------------------
+
+
+def _make_pymxs(runtime):
+    module = types.ModuleType("pymxs")
+    module.runtime = runtime
+
+    @contextlib.contextmanager
+    def _context(*args):
+        runtime.counter().calls += 1
+        yield
+
+    module.undo = _context
+    module.redraw = _context
+    module.animate = _context
+    module.attime = _context
+    return module
+
+
+def _make_maxplus():
+    module = types.ModuleType("MaxPlus")
+
+    class NotificationCodes(object):
+        ViewportChange = 0
+        NodeCreated = 1
+        SceneNodeDeleted = 2
+        FilePostOpen = 3
+        SystemPostNew = 4
+        SystemPostReset = 5
+        SceneAddedNode = 6
+        FilePostMerge = 7
+        SceneUndo = 8
+        SceneRedo = 9
+
+    class NotificationManager(object):
+        _handlers = list()
+
+        @classmethod
+        def Register(cls, code, handler):
+            cls._handlers.append((code, handler))
+            return handler
+
+        @classmethod
+        def Unregister(cls, handler):
+            cls._handlers = [h for h in cls._handlers if h[1] is not handler]
+
+    module.NotificationCodes = NotificationCodes
+    module.NotificationManager = NotificationManager
+    module.GetQMaxMainWindow = lambda: None
+    return module
+
+
+def install(vray_property_count=700, seed=0):
+    """
+    Registers the simulated "pymxs" and "MaxPlus" modules so that subsequent imports of RenderFarming modules
+    bind to the simulated runtime.  Must be called before any RenderFarming module is imported.
+    :param vray_property_count: Roughly how many properties the simulated V-Ray renderer exposes
+    :param seed: Random seed used when building synthetic scenes
+    :return: The SimulatedRuntime instance
+    """
+    existing = sys.modules.get("pymxs")
+    if existing is not None and isinstance(getattr(existing, "runtime", None), SimulatedRuntime):
+        return existing.runtime
+
+    runtime = SimulatedRuntime(vray_property_count, seed)
+    sys.modules["pymxs"] = _make_pymxs(runtime)
+    sys.modules["MaxPlus"] = _make_maxplus()
+    return runtime
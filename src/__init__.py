@@ -21,6 +21,7 @@ Sub-Modules:
     - Kale: Scene Checker
     - Arugula: Render Settings Handler
     - Barn: Toolbar with helpful utilities
+    - Batch: Headless render preparation for 3ds Max batch mode
 
 External Dependencies:
     - 3ds Max 2018 (2019 may work?)
@@ -38,6 +39,9 @@ import os
 
 import renderFarmingUI as rFUI
 import renderFarmingBarn as rFB
+import renderFarmingConfig as rFCfg
+import renderFarmingShotList as rFSL
+import renderFarmingQueue as rFQ
 from _version import __version__
 
 rt = pymxs.runtime
@@ -72,3 +76,36 @@ def rf_barn_open():
 
     rf_barn_ui = rFB.RenderFarmingBarnUI()
     rf_barn_ui.show()
+
+
+def rf_shot_list(path=None):
+    """
+    Prepares and submits every shot in a shot list file
+    :param path: The path to the shot list json, a file dialog is opened if None
+    :return: A list of ShotResult objects, or None if the list couldn't be run
+    """
+    if path is None:
+        path = rt.getOpenFileName(caption="Open Shot List", types="Shot List (*.json)|*.json")
+        if path is None:
+            return None
+
+    cfg = rFCfg.Configuration()
+    try:
+        shot_list = rFSL.ShotList.from_file(str(path))
+    except rFSL.ShotListError as e:
+        rt.messageBox(str(e), title="Shot List")
+        return None
+
+    results = rFSL.ShotListRunner(cfg, shot_list).run()
+    rt.messageBox("\n".join([str(r) for r in results]), title="Shot List")
+    return results
+
+
+def rf_render_queue():
+    """
+    Renders the local render queue, picking up where it left off if Max was closed or crashed during a render
+    :return: A list of the RenderQueueItem objects that were run
+    """
+    cfg = rFCfg.Configuration()
+    queue = rFQ.RenderQueue(cfg.get_render_queue_file())
+    return rFQ.RenderQueueRunner(cfg, queue).run()
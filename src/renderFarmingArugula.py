@@ -44,6 +44,17 @@ class ArugulaJob(QObject):
         self._settings_dict = cd
         return
 
+    def restore(self):
+        """
+        Applies the settings stored by capture() back to the scene
+        :return: None
+        """
+        if len(self._settings_dict) < 1:
+            self._clg.warning("No settings have been captured, nothing to restore")
+            return
+        self._set_common(self._settings_dict['Common'])
+        self._set_renderer(self._settings_dict['Renderer'])
+
     def _capture_renderer(self):
         rd = dict()
         for prop in self._rt.getPropNames(self._vr):
@@ -1,10 +1,14 @@
 import MaxPlus
 import pymxs
-from random import randrange
 
 import os
 
-import renderFarmingTools as rFT
+import renderFarmingExport as rFE
+import renderFarmingBulk as rFBk
+import renderFarmingPalette as rFP
+import renderFarmingLayers as rFL
+import renderFarmingOperations as rFO
+import renderFarmingCameraRigs as rFCR
 
 import PySide2.QtWidgets as QtW
 import PySide2.QtCore as QtC
@@ -14,8 +18,6 @@ from _version import __version__
 
 rt = pymxs.runtime
 
-vr = rFT.verify_vray(rt)
-
 Signal = QtC.Signal
 Slot = QtC.Slot
 
@@ -57,9 +59,10 @@ class RenderFarmingBarnUI(QtW.QDialog):
         # A list of constructors for objects inheriting the Sheep class
 
         self._sheep = [
-            ToggleSphericalWidget(),
+            CameraRigWidget(),
             ClearMaterial(),
             WireColorEdits(),
+            LayerTools(),
             VisibilityToggle(),
             QuickExporter()
         ]
@@ -75,6 +78,7 @@ class RenderFarmingBarnUI(QtW.QDialog):
             widget.Message.connect(self._display_message_handler)
             widget.InitStatusBar.connect(self._display_status_bar_handler)
             widget.StAdd.connect(self._add_status_bar_handler)
+            self._display_message_mw.Cancel.connect(widget.cancel_operation)
 
         # ---------------------------------------------------
         #                 Final Setup
@@ -94,20 +98,39 @@ class RenderFarmingBarnUI(QtW.QDialog):
 
     @Slot(int)
     def _display_status_bar_handler(self, amount):
-        self._display_message_mw.set_message(amount)
+        self._display_message_mw.init_progress(amount)
 
     @Slot(int)
     def _add_status_bar_handler(self, add):
-        self._display_message_mw.set_message(add)
+        self._display_message_mw.add_progress(add)
+
+    # ---------------------------------------------------
+    #                    Overrides
+    # ---------------------------------------------------
+
+    def closeEvent(self, event):
+        rFCR.unregister_notifications()
+
+        event.accept()
 
 
 class MessageWidget(QtW.QFrame):
+    Cancel = Signal()
+
     def __init__(self):
         super(MessageWidget, self).__init__()
         self._message_layout = QtW.QHBoxLayout()
 
         self._display_message_lb = QtW.QLabel()
 
+        # Only shown while an operation runs
+        self._progress_pb = QtW.QProgressBar()
+        self._progress_pb.setVisible(False)
+
+        self._cancel_btn = QtW.QPushButton()
+        self._cancel_btn.setText("Cancel")
+        self._cancel_btn.setVisible(False)
+
         self._display_message_title_lb = QtW.QLabel()
         self._display_message_title_lb.setText("Status: ")
         self._display_message_title_lb.setSizePolicy(QtW.QSizePolicy.Maximum, QtW.QSizePolicy.Preferred)
@@ -117,11 +140,28 @@ class MessageWidget(QtW.QFrame):
 
         self._message_layout.addWidget(self._display_message_title_lb)
         self._message_layout.addWidget(self._display_message_lb)
+        self._message_layout.addWidget(self._progress_pb)
+        self._message_layout.addWidget(self._cancel_btn)
+
+        # noinspection PyUnresolvedReferences
+        self._cancel_btn.clicked.connect(self.Cancel.emit)
 
     def set_message(self, message):
         self._display_message_lb.setText(message.get_message())
         self._display_message_title_lb.setText("{}: ".format(message.get_level()))
 
+    def init_progress(self, length):
+        """
+        :param length: The number of steps, 0 hides the progress bar
+        """
+        self._progress_pb.setRange(0, max(length, 1))
+        self._progress_pb.setValue(0)
+        self._progress_pb.setVisible(length > 0)
+        self._cancel_btn.setVisible(length > 0)
+
+    def add_progress(self, amount):
+        self._progress_pb.setValue(self._progress_pb.value() + amount)
+
 
 class QHLine(QtW.QFrame):
     """
@@ -170,6 +210,9 @@ class RenderFarmingSheep(QtW.QWidget):
 
         self._frame.setFrameStyle(QtW.QFrame.Panel)
 
+        # Long operations run a slice at a time, reporting through the status bar signals
+        self._runner = rFO.OperationRunner(self, self.initialize_status_bar, self.stadd)
+
     def msg(self, message, level="info"):
         self.Message.emit(RFMsg(message, level))
 
@@ -179,149 +222,143 @@ class RenderFarmingSheep(QtW.QWidget):
     def initialize_status_bar(self, length):
         self.InitStatusBar.emit(length)
 
+    def run_operation(self, operation):
+        """
+        Starts an Operation, only one runs at a time for each Sheep
+        :param operation: A renderFarmingOperations.Operation
+        :return: False if another operation is still running
+        """
+        if self._runner.start(operation):
+            return True
+        self.msg("Wait for the current operation to finish or cancel it", "Warning")
+        return False
+
+    @Slot()
+    def cancel_operation(self):
+        self._runner.cancel()
+
+    def report_operation(self, operation, message):
+        """
+        Shows the message when the operation finished, or why it didn't
+        """
+        if operation.get_error() is not None:
+            self.msg("{0} failed: {1}".format(operation.get_name(), operation.get_error()), "Error")
+        elif operation.is_cancelled():
+            self.msg("{0} cancelled after {1}/{2}".format(
+                operation.get_name(), operation.get_done(), operation.get_total()
+            ), "Warning")
+        else:
+            self.msg(message)
+
     # Using Qt naming convention instead
     # noinspection PyPep8Naming
     def setTitle(self, text):
         self._sheep_tilte_lb.setText(text)
 
 
-class ToggleSphericalWidget(RenderFarmingSheep):
+class CameraRigWidget(RenderFarmingSheep):
     def __init__(self, parent=None):
-        super(ToggleSphericalWidget, self).__init__(parent)
+        super(CameraRigWidget, self).__init__(parent)
 
-        self.setTitle("Toggle Spherical")
+        self.setTitle("Camera Rig")
 
         # ---------------------------------------------------
         #                 Attributes
         # ---------------------------------------------------
 
-        self._spherical_on = False
-        self._stereo_on = False
-        self._VRayStereoscopic_node = None
+        # The settings the last preset replaced, None until a preset is applied
+        self._snapshot = None
 
         # ---------------------------------------------------
         #                 Widget Definitions
         # ---------------------------------------------------
 
-        self._toggle_btn = QtW.QPushButton()
-        self.MainLayout.addWidget(self._toggle_btn)
-        self._toggle_btn.setText("Toggle Spherical")
-        self._toggle_btn.setCheckable(True)
-        self._toggle_btn.setChecked(self._check_spherical())
+        self._rig_cmbx = QtW.QComboBox()
+        self.MainLayout.addWidget(self._rig_cmbx)
+        self._rig_cmbx.addItems([p.get_name() for p in rFCR.get_presets()])
+
+        self._apply_btn = QtW.QPushButton()
+        self.MainLayout.addWidget(self._apply_btn)
+        self._apply_btn.setText("Apply Rig")
 
-        self._stereo_btn = QtW.QPushButton()
-        self.MainLayout.addWidget(self._stereo_btn)
-        self._stereo_btn.setText("Toggle Stereo")
-        self._stereo_btn.setCheckable(True)
-        self._stereo_btn.setChecked(self._check_stereo())
+        self._restore_btn = QtW.QPushButton()
+        self.MainLayout.addWidget(self._restore_btn)
+        self._restore_btn.setText("Restore Previous Rig")
+        self._restore_btn.setEnabled(False)
+
+        self._current_lb = QtW.QLabel()
+        self.MainLayout.addWidget(self._current_lb)
 
         # ---------------------------------------------------
         #               Function Connections
         # ---------------------------------------------------
 
         # noinspection PyUnresolvedReferences
-        self._toggle_btn.toggled.connect(self._spherical_toggle_handler)
+        self._apply_btn.clicked.connect(self._apply_handler)
         # noinspection PyUnresolvedReferences
-        self._stereo_btn.toggled.connect(self._stereo_toggle_handler)
+        self._restore_btn.clicked.connect(self._restore_handler)
+
+        self._check_rig()
 
     # ---------------------------------------------------
     #                  Handler Functions
     # ---------------------------------------------------
 
-    def _spherical_toggle_handler(self):
-        # Just Triggers the right handler for each state
-        if self._spherical_on:
-            self._spherical_off_handler()
-        else:
-            self._spherical_on_handler()
-
-    def _stereo_toggle_handler(self):
-        # Creates a Helper object if one doesn't already exist
-        # Triggers the right handler for each state
-        if self._VRayStereoscopic_node is not None:
-            # sets the state to the opposite of the current
-            if self._stereo_on:
-                self._VRayStereoscopic_node.enabled = False
-            else:
-                self._VRayStereoscopic_node.enabled = True
+    def _apply_handler(self):
+        preset = rFCR.get_preset(self._rig_cmbx.currentText())
+        if preset is None:
+            self.msg("Unknown camera rig: {}".format(self._rig_cmbx.currentText()), "Error")
+            return
 
-            # Flipping the boolean
-            self._stereo_on = not self._stereo_on
-        else:
-            # Creates a New Handler
-            self._create_new_helper()
-            self._stereo_on = True
+        try:
+            # One undo record and redraw for every setting, a new stereo helper appears in the viewport
+            with pymxs.undo(True, "Camera Rig: {}".format(preset.get_name())):
+                self._snapshot = preset.apply()
+        except RuntimeError as e:
+            self.msg(e, "Error")
+            return
+        rt.redrawViews()
 
-    def _spherical_on_handler(self):
-        # Sets the VRay settings to render a spherical camera
-        vr.camera_type = 9
-        vr.camera_overrideFOV = True
-        vr.camera_fov = 360.0
-        vr.camera_cyl_height = 180.0
+        self._restore_btn.setEnabled(True)
+        self._set_current(preset)
+        self.msg("Camera rig set to {}".format(preset.get_name()))
 
-        self._spherical_on = True
+    def _restore_handler(self):
+        if self._snapshot is None:
+            self.msg("No camera rig to restore")
+            return
 
-    def _spherical_off_handler(self):
-        # Sets the Vray settings to disable spherical camera rendering
-        vr.camera_type = 0
-        vr.camera_overrideFOV = False
-        vr.camera_fov = 45.0
-        vr.camera_cyl_height = 90.0
+        # Restoring gives back the settings it replaced, so a second click swaps back again
+        try:
+            with pymxs.undo(True, "Restore Camera Rig"):
+                self._snapshot = self._snapshot.restore()
+        except RuntimeError as e:
+            # A stereo helper from the snapshot may have been deleted since
+            self._snapshot = None
+            self._restore_btn.setEnabled(False)
+            self.msg(e, "Error")
+            return
+        rt.redrawViews()
 
-        self._spherical_on = False
+        self._check_rig()
+        self.msg("Camera rig restored")
 
     # ---------------------------------------------------
     #                  Checking Functions
     # ---------------------------------------------------
 
-    def _check_spherical(self):
-        # if the camera type is set to 9, VRay is put into spherical mode
-        a = (vr.camera_type == 9)
-        self._spherical_on = a
-        return a
-
-    def _check_stereo(self):
-        # Looks for a _VRayStereoscopic helper node which is how stereo settings are enabled
-        if self._search_for_stereo_helper():
-            a = self._VRayStereoscopic_node.enabled
-            self._stereo_on = a
-            return a
-        else:
-            # If one doesn't exist, False is returned
-            return False
-
-    def _search_for_stereo_helper(self):
-        # Searches for instances of the VRayStereoscopic class
-        objects = rt.getClassInstances(rt.VRayStereoscopic)
-        if len(objects) == 1:
-            # This is the ideal state
-            self._VRayStereoscopic_node = objects[0]
-            return True
-        elif len(objects) > 1:
-            # If there are more than one nodes, it gives a warning asking for the user to delete them
-            self._VRayStereoscopic_node = objects[0]
+    def _check_rig(self):
+        # Multiple helpers are all set the same way, but it is probably a mistake
+        if len(rFCR.get_stereo_helpers()) > 1:
             self.msg("Multiple VRayStereoscopic helpers found.  Please clean them up.", "Warning")
-            return True
-        else:
-            # Nothing found
-            return False
-
-    def _create_new_helper(self):
-        # Creates a New Stereo Helper with the right settings for spherical renderings
-        new_helper = rt.VRayStereoscopic()
-        new_helper.adjust_resolution = True
-        new_helper.output_layout = 1
-
-        # The RT decoder is liable to fail, so it is wrapped in a Try statement
-        try:
-            new_helper.eye_distance = rt.units.decodeValue("63mm")
-        except RuntimeError:
-            self.msg("Unable to Decode Units.  Intraocular Distance may be incorrect.", "Error")
-
-        self._VRayStereoscopic_node = new_helper
+        self._set_current(rFCR.get_current_preset())
 
-        # Viewport needs to be redrawn after so that the new node appears
-        rt.redrawViews()
+    def _set_current(self, preset):
+        if preset is None:
+            self._current_lb.setText("Current: Custom")
+        else:
+            self._current_lb.setText("Current: {}".format(preset.get_name()))
+            self._rig_cmbx.setCurrentText(preset.get_name())
 
 
 class ClearMaterial(RenderFarmingSheep):
@@ -356,11 +393,7 @@ class ClearMaterial(RenderFarmingSheep):
             self.msg("No objects selected")
         else:
             # set materials to be Undefined
-            for obj in sel:
-                obj.material = rt.undefined
-
-            # Redraw the viewport
-            rt.redrawViews()
+            rFBk.set_property(sel, "material", rt.undefined, "Clear Materials")
             self.msg("Cleared Materials from {0} {1}".format(sel_len, pluralize("object", sel_len)))
 
 
@@ -392,41 +425,31 @@ class VisibilityToggle(RenderFarmingSheep):
 
     # noinspection PyMethodMayBeStatic
     def _visibility_on_handler(self):
-        with pymxs.undo(True, "Visibility On"):
-            # Collect selection
-            sel = rt.getCurrentselection()
-
-            sel_len = len(sel)
+        # Collect selection
+        sel = rt.getCurrentselection()
 
-            if sel_len < 1:
-                self.msg("No objects selected")
-            else:
-                # set visibility to be on
-                for obj in sel:
-                    obj.visibility = True
+        sel_len = len(sel)
 
-                # Redraw the viewport
-                rt.redrawViews()
-                self.msg("Visibility set to 1.0 on {0} {1}".format(sel_len, pluralize("object", sel_len)))
+        if sel_len < 1:
+            self.msg("No objects selected")
+        else:
+            # set visibility to be on
+            rFBk.set_property(sel, "visibility", True, "Visibility On")
+            self.msg("Visibility set to 1.0 on {0} {1}".format(sel_len, pluralize("object", sel_len)))
 
     # noinspection PyMethodMayBeStatic
     def _visibility_off_handler(self):
-        with pymxs.undo(True, "Visibility Off"):
-            # Collect selection
-            sel = rt.getCurrentselection()
-
-            sel_len = len(sel)
+        # Collect selection
+        sel = rt.getCurrentselection()
 
-            if sel_len < 1:
-                self.msg("No objects selected")
-            else:
-                # set visibility to be on
-                for obj in sel:
-                    obj.visibility = False
+        sel_len = len(sel)
 
-                # Redraw the viewport
-                rt.redrawViews()
-                self.msg("Visibility set to 0.0 on {0} {1}".format(sel_len, pluralize("object", sel_len)))
+        if sel_len < 1:
+            self.msg("No objects selected")
+        else:
+            # set visibility to be off
+            rFBk.set_property(sel, "visibility", False, "Visibility Off")
+            self.msg("Visibility set to 0.0 on {0} {1}".format(sel_len, pluralize("object", sel_len)))
 
 
 class WireColorEdits(RenderFarmingSheep):
@@ -457,36 +480,39 @@ class WireColorEdits(RenderFarmingSheep):
 
     def _fix_wire_colors_handler(self):
         sel = rt.getCurrentselection()
-        layers = list()
-        to_fix = list()
 
         sel_len = len(sel)
 
         if sel_len < 1:
             self.msg("No objects selected")
         else:
-            # First step is to analyze the objects
-            for obj in sel:
-                # If objects are using layer colors, then they will get fixed as well
-                if obj.colorByLayer is True:
-                    layers.append(obj.layer)
-                else:
-                    # Bad colors go into the to_fix list
-                    if not self._analyze_wire_color(obj.wirecolor):
-                        to_fix.append(obj)
-
-            # Then analyze the Layers
-            for lay in layers:
-                # Bad colors go into the to_fix list
-                if not self._analyze_wire_color(lay.wireColor):
-                    to_fix.append(lay)
+            # First step is to analyze the objects, everything is read in one go
+            hierarchy = rFL.LayerHierarchy(sel)
+            columns = rFBk.get_properties(sel, ["colorByLayer"] + color_paths("wirecolor"))
+            by_layer = [b is True for b in columns[0]]
+            colors = zip(*columns[1:4])
 
-            for obj in to_fix:
-                obj.wirecolor = self._random_color()
+            # Bad colors go into the to_fix list, objects using layer colors get their layer fixed instead
+            to_fix = [obj for i, obj in enumerate(sel) if not by_layer[i] and not rFP.passes_checks(colors[i])]
+
+            # Then analyze the Layers, each one once however many objects use its color
+            layers_to_fix = [lay for lay in hierarchy.get_node_layers(by_layer)
+                             if not rFP.passes_checks(lay.get_color())]
+
+            # The new colors stand apart from each other and from every color staying in the scene
+            existing = [c for c in scene_colors() if rFP.passes_checks(c)]
+            existing.extend([lay.get_color() for lay in hierarchy.get_layers() if rFP.passes_checks(lay.get_color())])
+            new_colors = rFP.distinct_colors(len(to_fix) + len(layers_to_fix), existing)
+
+            # A single undo record and redraw for both
+            with pymxs.undo(True, "Fix Wire Colors"):
+                rFBk.set_colors(to_fix, "wirecolor", new_colors[:len(to_fix)], redraw=False)
+                hierarchy.set_colors(layers_to_fix, new_colors[len(to_fix):], redraw=False)
 
             # Redraw the viewport
             rt.redrawViews()
-            self.msg("Wire Color fixed on {0}/{1} {2}".format(len(to_fix), sel_len, pluralize("object", sel_len)))
+            fixed = len(to_fix) + len(layers_to_fix)
+            self.msg("Wire Color fixed on {0}/{1} {2}".format(fixed, sel_len, pluralize("object", sel_len)))
 
     def _random_wire_color_handler(self):
         sel = rt.getCurrentselection()
@@ -496,39 +522,138 @@ class WireColorEdits(RenderFarmingSheep):
         if sel_len < 1:
             self.msg("No objects selected")
         else:
-            for obj in sel:
-                obj.wirecolor = self._random_color()
+            # The colors being replaced don't count
+            replaced = set(zip(*rFBk.get_properties(sel, color_paths("wirecolor"))))
+            existing = [c for c in scene_colors() if c not in replaced]
 
-            # Redraw the viewport
-            rt.redrawViews()
+            new_colors = rFP.distinct_colors(sel_len, existing)
+            rFBk.set_colors(sel, "wirecolor", new_colors, "Random Wire Color")
             self.msg("Wire Color randomized on {0} {1}".format(sel_len, pluralize("object", sel_len)))
 
-    def _analyze_wire_color(self, color):
-        # Checks saturation and value
-        if not self._check_saturation(color):
-            return False
-        elif not self._check_value(color):
-            return False
+
+class LayerTools(RenderFarmingSheep):
+    def __init__(self, parent=None):
+        super(LayerTools, self).__init__(parent)
+
+        self.setTitle("Layer Tools")
+
+        # The hidden state of every layer from before the isolation, None when nothing is isolated
+        self._isolation = None
+
+        # ---------------------------------------------------
+        #                 Widget Definitions
+        # ---------------------------------------------------
+
+        self._fix_layer_colors_btn = QtW.QPushButton()
+        self.MainLayout.addWidget(self._fix_layer_colors_btn)
+        self._fix_layer_colors_btn.setText("Fix Layer Colors")
+
+        self._toggle_renderable_btn = QtW.QPushButton()
+        self.MainLayout.addWidget(self._toggle_renderable_btn)
+        self._toggle_renderable_btn.setText("Toggle Layer Renderable")
+
+        self._isolate_btn = QtW.QPushButton()
+        self.MainLayout.addWidget(self._isolate_btn)
+        self._isolate_btn.setText("Isolate Layers")
+
+        # ---------------------------------------------------
+        #               Function Connections
+        # ---------------------------------------------------
+
+        # noinspection PyUnresolvedReferences
+        self._fix_layer_colors_btn.clicked.connect(self._fix_layer_colors_handler)
+        # noinspection PyUnresolvedReferences
+        self._toggle_renderable_btn.clicked.connect(self._toggle_renderable_handler)
+        # noinspection PyUnresolvedReferences
+        self._isolate_btn.clicked.connect(self._isolate_handler)
+
+    def _fix_layer_colors_handler(self):
+        sel = rt.getCurrentselection()
+
+        if len(sel) < 1:
+            self.msg("No objects selected")
         else:
-            return True
+            hierarchy = rFL.LayerHierarchy(sel)
+            layers = hierarchy.get_node_layers()
+            to_fix = [lay for lay in layers if not rFP.passes_checks(lay.get_color())]
 
-    # noinspection PyMethodMayBeStatic
-    def _check_saturation(self, color):
-        return True if color.s > 50 else False
+            # The new colors stand apart from every good layer and object color
+            existing = [lay.get_color() for lay in hierarchy.get_layers() if rFP.passes_checks(lay.get_color())]
+            existing.extend([c for c in scene_colors() if rFP.passes_checks(c)])
 
-    # noinspection PyMethodMayBeStatic
-    def _check_value(self, color):
-        return True if color.v > 20 else False
+            new_colors = rFP.distinct_colors(len(to_fix), existing)
+            hierarchy.set_colors(to_fix, new_colors, "Fix Layer Colors")
+            self.msg("Wire Color fixed on {0}/{1} {2}".format(len(to_fix), len(layers),
+                                                              pluralize("layer", len(layers))))
 
-    # noinspection PyMethodMayBeStatic
-    def _random_color(self):
-        return rt.color(randrange(3, 255), randrange(3, 255), randrange(3, 255))
+    def _toggle_renderable_handler(self):
+        sel = rt.getCurrentselection()
+
+        if len(sel) < 1:
+            self.msg("No objects selected")
+        else:
+            hierarchy = rFL.LayerHierarchy(sel)
+            layers = hierarchy.get_node_layers()
+
+            # Mixed layers are all switched off, so a second click switches them all back on
+            renderable = not any([lay.is_renderable() for lay in layers])
+            hierarchy.set_renderable(layers, renderable, "Toggle Layer Renderable")
+            self.msg("Rendering turned {0} on {1} {2}".format("on" if renderable else "off", len(layers),
+                                                             pluralize("layer", len(layers))))
+
+    def _isolate_handler(self):
+        if self._isolation is not None:
+            self._end_isolation()
+            return
+
+        sel = rt.getCurrentselection()
+
+        if len(sel) < 1:
+            self.msg("No objects selected")
+        else:
+            hierarchy = rFL.LayerHierarchy(sel)
+            layers = hierarchy.get_node_layers()
+
+            # A hidden parent hides its children, so the parents of the isolated layers stay visible too
+            keep = set()
+            for lay in layers:
+                keep.add(lay.get_name())
+                keep.update([parent.get_name() for parent in hierarchy.get_ancestors(lay)])
+
+            all_layers = hierarchy.get_layers()
+            self._isolation = dict([(lay.get_name(), lay.is_hidden()) for lay in all_layers])
+            hierarchy.set_hidden(all_layers, [lay.get_name() not in keep for lay in all_layers], "Isolate Layers")
+
+            self._isolate_btn.setText("End Isolation")
+            self.msg("Isolated {0} {1}".format(len(layers), pluralize("layer", len(layers))))
+
+    def _end_isolation(self):
+        hierarchy = rFL.LayerHierarchy()
+
+        # Layers made since the isolation started are left as they are
+        layers = [lay for lay in hierarchy.get_layers() if lay.get_name() in self._isolation]
+        hierarchy.set_hidden(layers, [self._isolation[lay.get_name()] for lay in layers], "End Layer Isolation")
+
+        self._isolation = None
+        self._isolate_btn.setText("Isolate Layers")
+        self.msg("Restored visibility on {0} {1}".format(len(layers), pluralize("layer", len(layers))))
 
 
 def pluralize(text, count):
     return text + 's' if (count > 1) else text
 
 
+def color_paths(prop):
+    return ["{0}.{1}".format(prop, channel) for channel in ("r", "g", "b")]
+
+
+def scene_colors():
+    """
+    :return: The wire color of every object in the scene as r, g, b tuples
+    """
+    return [c for c in zip(*rFBk.get_properties(rt.objects, color_paths("wirecolor"))) if None not in c]
+
+
 class QuickExporter(RenderFarmingSheep):
     def __init__(self):
         super(QuickExporter, self).__init__()
@@ -537,22 +662,14 @@ class QuickExporter(RenderFarmingSheep):
 
         self._exp_directory = str()
         self._exp_filename = str()
-        self._exp_format = str()
-
-        self._mesh_classes_list = [
-            "editable_poly",
-            "polymeshobject",
-            "editable_mesh",
-            "sphere",
-            "ProBoolean",
-            "box"
-        ]
 
-        self._export_formats_list = {
-            "OBJ": rt.ObjExp,
-            "DAE": rt.DAEEXP,
-            "FBX": rt.FBXEXP
-        }
+        self._export_pool = None
+        self._export_cache = None
+        self._export_hashes = dict()
+        self._export_skipped = 0
+        self._export_placed = 0
+        self._export_timer = QtC.QTimer(self)
+        self._export_timer.setInterval(500)
 
         self._export_context = True
         self._export_context_list = {
@@ -584,7 +701,7 @@ class QuickExporter(RenderFarmingSheep):
         self._export_context_cmbx = QtW.QComboBox()
 
         self._export_btn.setText("Export")
-        self._export_format_cmbx.addItems(self._export_formats_list.keys())
+        self._export_format_cmbx.addItems([f.get_name() for f in rFE.get_formats()])
         self._export_format_cmbx.setCurrentText("FBX")
 
         self._export_context_cmbx.addItems(self._export_context_list.keys())
@@ -611,6 +728,25 @@ class QuickExporter(RenderFarmingSheep):
         self._reset_x_form.setChecked(True)
         self._options_layout.addWidget(self._reset_x_form)
 
+        self._workers_sb = QtW.QSpinBox()
+        self._workers_sb.setRange(1, 16)
+        self._workers_sb.setValue(4)
+        self._workers_sb.setPrefix("Workers: ")
+        self._workers_sb.setToolTip("The number of background 3ds Max batch processes exporting at once")
+        self._options_layout.addWidget(self._workers_sb)
+
+        self._skip_unchanged_chbx = QtW.QCheckBox("Skip Unchanged")
+        self._skip_unchanged_chbx.setChecked(True)
+        self._skip_unchanged_chbx.setToolTip("Objects exported before with the same geometry, transform, modifiers, "
+                                             "material and options are left alone")
+        self._options_layout.addWidget(self._skip_unchanged_chbx)
+
+        self._share_instances_chbx = QtW.QCheckBox("Share Instances")
+        self._share_instances_chbx.setChecked(False)
+        self._share_instances_chbx.setToolTip("Instances are exported once, with their transforms written to {} for "
+                                              "the importer".format(rFE.placements_file_name))
+        self._options_layout.addWidget(self._share_instances_chbx)
+
         self._options_gb.setLayout(self._options_layout)
 
         # Layouts -------------------------------------------
@@ -629,6 +765,7 @@ class QuickExporter(RenderFarmingSheep):
         self._exp_dir_browse_btn.clicked.connect(self._exp_dir_browse_btn_handler)
         self._export_btn.clicked.connect(self._export_handler)
         self._export_context_cmbx.activated.connect(self._export_type_cmbx_handler)
+        self._export_timer.timeout.connect(self._export_timer_handler)
 
         self._set_dir(rt.GetDir(rt.name("export")))
 
@@ -638,6 +775,9 @@ class QuickExporter(RenderFarmingSheep):
         self._rotate_for_unity_chbx.setChecked(False)
         self._rotate_for_unity_chbx.setVisible(False)
         self._export_format_cmbx.setVisible(False)
+        self._workers_sb.setVisible(False)
+        self._skip_unchanged_chbx.setVisible(False)
+        self._share_instances_chbx.setVisible(False)
         self._export_context = False
 
     def _one_per_file_context(self):
@@ -646,6 +786,9 @@ class QuickExporter(RenderFarmingSheep):
         self._rotate_for_unity_chbx.setChecked(True)
         self._rotate_for_unity_chbx.setVisible(True)
         self._export_format_cmbx.setVisible(True)
+        self._workers_sb.setVisible(True)
+        self._skip_unchanged_chbx.setVisible(True)
+        self._share_instances_chbx.setVisible(True)
         self._export_context = True
 
     def _set_dir(self, directory):
@@ -675,7 +818,7 @@ class QuickExporter(RenderFarmingSheep):
                 self,
                 "Export Selected",
                 self._exp_directory,
-                "*.fbx;;*.dae;;*.obj"
+                ";;".join(["*." + f.get_extension() for f in rFE.get_formats()])
             )
             if file_names_list[0]:
                 directory, file_name = os.path.split(file_names_list[0])
@@ -683,6 +826,15 @@ class QuickExporter(RenderFarmingSheep):
                 self._set_filename(file_name)
 
     def _export_handler(self):
+        if self._export_pool is not None:
+            self._export_pool.cancel()
+            self._export_timer_handler()
+            return
+
+        if self._runner.is_running():
+            self.cancel_operation()
+            return
+
         if self._export_context:
             if os.path.isdir(self._exp_directory):
                     self._process_file_per_object()
@@ -700,48 +852,210 @@ class QuickExporter(RenderFarmingSheep):
         else:
             self._single_mesh_context()
 
+    def _export_timer_handler(self):
+        """
+        Starts export workers as others finish and shows the progress, until every worker is done
+        """
+        finished = self._export_pool.poll()
+        exported, failed = self._export_pool.get_progress()
+        total = self._export_pool.get_total()
+
+        if not finished:
+            self.msg("Exporting {0}/{1} {2}".format(len(exported), total, pluralize("object", total)))
+            return
+
+        self._export_timer.stop()
+        self._export_btn.setText("Export")
+        self._update_export_cache(exported, failed)
+
+        if self._export_pool.is_cancelled():
+            self.msg("Cancelled after exporting {0}/{1} {2}".format(len(exported), total, pluralize("object", total)),
+                     "Warning")
+        elif len(failed) > 0:
+            self.msg("Exported {0}/{1} {2}{3}, failed: {4}".format(
+                len(exported), total, pluralize("object", total), self._summary_text(),
+                ", ".join([os.path.basename(f) for f in failed])
+            ), "Error")
+        else:
+            self.msg("Exported {0}/{1} {2}{3}".format(
+                len(exported), total, pluralize("object", total), self._summary_text()
+            ))
+        self._export_pool = None
+
+    def _update_export_cache(self, exported, failed):
+        """
+        Records the content hashes of the files that were exported, a failed file is exported again next time
+        """
+        if self._export_cache is None:
+            return
+        for file_name in exported:
+            content_hash = self._export_hashes.get(file_name)
+            if content_hash is not None:
+                self._export_cache.set_hash(file_name, content_hash)
+        for file_name in failed:
+            self._export_cache.remove(file_name)
+        self._export_cache.save()
+        self._export_cache = None
+        self._export_hashes = dict()
+
+    def _summary_text(self):
+        text = str()
+        if self._export_placed > 0:
+            text += ", placed {0} {1}".format(self._export_placed, pluralize("instance", self._export_placed))
+        if self._export_skipped > 0:
+            text += ", skipped {0} unchanged".format(self._export_skipped)
+        return text
+
+    def _changed_objects(self, objects, classes, options, export_format):
+        """
+        Leaves out the objects whose files are current in the export cache, and keeps the hashes of the rest
+        """
+        changed = list()
+        for obj, content_hash in rFE.content_hashes(objects, classes, options):
+            file_name = self._export_file_name(obj, export_format)
+            if self._export_cache.is_current(file_name, content_hash):
+                self._export_skipped += 1
+            else:
+                changed.append(obj)
+                self._export_hashes[file_name] = content_hash
+        return changed
+
+    def _write_placements(self, groups, export_format):
+        """
+        Lists where each instance goes under the file shared by its group, and drops objects no longer instanced
+        """
+        manifest = rFE.PlacementManifest(self._exp_directory)
+        for group in groups:
+            file_name = export_format.file_name(self._exp_directory, group.get_placements()[0].get_name())
+            if group.is_instanced():
+                manifest.set_placements(file_name, group.get_placements())
+                self._export_placed += len(group) - 1
+            else:
+                manifest.remove(file_name)
+        manifest.save()
+
+    def _remove_placements(self, file_names):
+        """
+        Files exported on their own no longer have placements, the manifest is left alone if there isn't one
+        """
+        manifest = rFE.PlacementManifest(self._exp_directory)
+        if not os.path.isfile(manifest.get_file_path()):
+            return
+        for file_name in file_names:
+            manifest.remove(file_name)
+        manifest.save()
+
     def _process_file_per_object(self):
         sel = rt.getCurrentselection()
         sel_len = len(sel)
-        count = 0
+        export_format = rFE.get_format(self._export_format_cmbx.currentText())
+        options = {
+            "pivot_to_origin": self._pivot_to_origin_chbx.isChecked(),
+            "rotate_for_unity": self._rotate_for_unity_chbx.isChecked(),
+            "collapse_stack": self._collapse_stack_chbx.isChecked(),
+            "reset_x_forms": self._reset_x_form.isChecked()
+        }
+
+        clones = list()
+        outputs = list()
+
+        self._export_cache = None
+        self._export_hashes = dict()
+        self._export_skipped = 0
+        self._export_placed = 0
 
         if sel_len < 1:
             self.msg("No objects selected")
-        else:
-            # disables viewport redraw
-            with pymxs.redraw(False):
-                for obj in sel:
-                    # clone object
-                    obj_clone = rt.copy(obj)
-                    try:
-                        if (str(rt.classof(obj))).lower() in self._mesh_classes_list:
-                            self._prep_for_export(
-                                obj,
-                                obj_clone,
-                                pivot_to_origin=self._pivot_to_origin_chbx.isChecked(),
-                                rotate_for_unity=self._rotate_for_unity_chbx.isChecked(),
-                                collapse_stack=self._collapse_stack_chbx.isChecked(),
-                                reset_x_forms=self._reset_x_form.isChecked()
-                            )
-                            count += 1
-                            self._export_file_per_object(obj_clone, self._export_format_cmbx.currentText())
-                    except RuntimeError as e:
-                        self.msg(e, "Error")
-                        return
-                    except AttributeError as e:
-                        self.msg(e, "Error")
+            return
+
+        if export_format is None:
+            self.msg("Unknown export format: {}".format(self._export_format_cmbx.currentText()), "Error")
+            return
+
+        # looked up once, objects are checked against the class values
+        classes = export_format.resolve_classes()
+
+        # disables viewport redraw
+        with pymxs.redraw(False):
+            try:
+                singles = sel
+                shared = list()
+                if self._share_instances_chbx.isChecked():
+                    # each group of instances is exported once and placed from the manifest
+                    groups = rFE.instance_groups(sel, classes)
+                    singles = [g.get_representative() for g in groups if not g.is_instanced()]
+                    shared = [g.get_representative() for g in groups if g.is_instanced()]
+                    self._write_placements(groups, export_format)
+
+                if self._skip_unchanged_chbx.isChecked():
+                    # only objects which changed since they were last exported here are prepped and exported
+                    self._export_cache = rFE.ExportCache(self._exp_directory)
+                    hash_options = dict(options, format=export_format.to_dict())
+                    singles = self._changed_objects(singles, classes, hash_options, export_format)
+                    shared = self._changed_objects(shared, classes, dict(hash_options, local_space=True),
+                                                   export_format)
+
+                    if len(singles) + len(shared) < 1:
+                        self.msg("Exported 0/{0} {1}{2}".format(
+                            sel_len, pluralize("object", sel_len), self._summary_text()
+                        ))
+                        self._export_cache = None
                         return
-                    finally:
-                        rt.redrawViews()
-                        rt.delete(obj_clone)
 
-            self.msg("Exported {0}/{1} {2}".format(count, sel_len, pluralize("object", sel_len)))
+                # prep every clone first, so they can be handed to the workers together
+                clones = rFE.prep_clones(singles, classes, **options)
+                clones.extend(rFE.prep_clones(shared, classes, local_space=True, **options))
+                outputs = [self._export_file_name(c, export_format) for c in clones]
+
+                if not self._share_instances_chbx.isChecked():
+                    self._remove_placements(outputs)
+
+                self._export_pool = rFE.create_pool(clones, outputs, export_format, self._workers_sb.value())
+
+                # without 3dsmaxbatch the clones are exported here, one per tick, and deleted once they are done
+                if self._export_pool is None:
+                    export_format.apply_options()
+                    exporting = clones
+                    clones = list()
+                    self._export_btn.setText("Cancel")
+                    self.run_operation(rFO.Operation(
+                        "Export", exporting,
+                        lambda objs: [self._export_file_per_object(o, export_format) for o in objs],
+                        on_finish=lambda op: self._export_operation_finished(op, exporting, outputs, sel_len)
+                    ))
+            except RuntimeError as e:
+                self._export_cache = None
+                self.msg(e, "Error")
+                return
+            except AttributeError as e:
+                self._export_cache = None
+                self.msg(e, "Error")
+                return
+            finally:
+                rt.delete(clones)
+                rt.redrawViews()
+
+        if self._export_pool is not None:
+            self._export_btn.setText("Cancel")
+            self._export_timer_handler()
+            self._export_timer.start()
+
+    def _export_operation_finished(self, operation, clones, outputs, sel_len):
+        rt.delete(clones)
+        self._export_btn.setText("Export")
+        self._update_export_cache(outputs[:operation.get_done()], list())
+        self.report_operation(operation, "Exported {0}/{1} {2}{3}".format(
+            operation.get_done(), sel_len, pluralize("object", sel_len), self._summary_text()
+        ))
 
     def _process_single_file(self):
         sel = rt.getCurrentselection()
         sel_len = len(sel)
         count = 0
 
+        # the format follows the file name, FBX when the extension isn't one of the formats
+        export_format = rFE.get_format_for_file(self._exp_filename) or rFE.get_format("FBX")
+
         clones = list()
 
         if sel_len < 1:
@@ -751,22 +1065,18 @@ class QuickExporter(RenderFarmingSheep):
             with pymxs.redraw(False):
                 try:
                     # prep clones
-                    for obj in sel:
-                        # clone object
-                        obj_clone = rt.copy(obj)
-                        if (str(rt.classof(obj))).lower() in self._mesh_classes_list:
-                            self._prep_for_export(
-                                obj,
-                                obj_clone,
-                                pivot_to_origin=False,
-                                rotate_for_unity=False,
-                                collapse_stack=self._collapse_stack_chbx.isChecked(),
-                                reset_x_forms=self._reset_x_form.isChecked()
-                            )
-                            clones.append(obj_clone)
-                            count += 1
+                    clones = rFE.prep_clones(
+                        sel,
+                        export_format.resolve_classes(),
+                        pivot_to_origin=False,
+                        rotate_for_unity=False,
+                        collapse_stack=self._collapse_stack_chbx.isChecked(),
+                        reset_x_forms=self._reset_x_form.isChecked()
+                    )
+                    count = len(clones)
                     # export clones
-                    self._export_single(clones)
+                    export_format.apply_options()
+                    self._export_single(clones, export_format)
                 except RuntimeError as e:
                     self.msg(e, "Error")
                     return
@@ -779,22 +1089,20 @@ class QuickExporter(RenderFarmingSheep):
 
             self.msg("Exported {0}/{1} {2}".format(count, sel_len, pluralize("object", sel_len)))
 
-    def _export_file_per_object(self, obj, exp_format):
+    def _export_file_name(self, obj, export_format):
+        return export_format.file_name(self._exp_directory, obj.name)
+
+    def _export_file_per_object(self, obj, export_format):
         rt.select(obj)
-        file_name = os.path.join(
-            self._exp_directory, "{0}.{1}".format(
-                obj.name,
-                exp_format.lower()
-            )
-        )
+        file_name = self._export_file_name(obj, export_format)
         rt.exportFile(
             file_name,
             rt.name("noPrompt"),
-            using=self._export_formats_list.get(exp_format, rt.FBXEXP),
+            using=export_format.get_exporter(),
             selectedOnly=True
         )
 
-    def _export_single(self, objects):
+    def _export_single(self, objects, export_format):
         rt.select(*rt.array(objects))
         file_name = os.path.join(
             self._exp_directory, self._exp_filename
@@ -802,37 +1110,6 @@ class QuickExporter(RenderFarmingSheep):
         rt.exportFile(
             file_name,
             rt.name("noPrompt"),
-            using=self._export_formats_list.get(self._exp_format, rt.FBXEXP),
+            using=export_format.get_exporter(),
             selectedOnly=True
         )
-
-    # noinspection PyMethodMayBeStatic
-    def _prep_for_export(self, original, clone, **kwargs):
-        # Translated to python from "3dsmax 2016 small export script" by lops
-        # http://www.scriptspot.com/3ds-max/scripts/3dsmax-2016-small-export-script
-
-        rt.select(clone)
-
-        if kwargs.get("rotate_for_unity", False):
-            # rotate clone by 90 degrees
-            current_xform = original.transform
-            rt.PreRotate(current_xform, rt.eulerToQuat(rt.EulerAngles(90, 0, 0)))
-            clone.transform = current_xform
-
-        # Reset X-Froms
-        if kwargs.get("reset_x_forms", False):
-            rt.ResetXForm(clone)
-        if kwargs.get("collapse_stack", False):
-            rt.macros.run("Modifier Stack", "Convert_to_Poly")
-
-        # Record Info
-        obj_name = original.name
-        clone.name = obj_name
-
-        # Set pivot to origin
-        if kwargs.get("pivot_to_origin", False):
-            clone.position = rt.Point3(0, 0, 0)
-
-
-ui = RenderFarmingBarnUI()
-ui.show()
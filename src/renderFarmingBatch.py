@@ -0,0 +1,225 @@
+"""
+Runs RenderFarming without the dialog, for preparing scenes in 3ds Max batch mode
+
+Nothing here builds Qt widgets or touches MaxPlus, so it can run on a render node through 3dsmaxbatch:
+    set RF_BATCH_JOB=C:\\jobs\\sh010.json
+    set RF_BATCH_RESULTS=C:\\jobs\\sh010_results.json
+    3dsmaxbatch.exe "%LOCALAPPDATA%\\...\\scripts\\BDF\\renderFarming\\renderFarmingBatch.py"
+
+A job description is a shot list (see renderFarmingShotList.ShotList) with a few extra keys:
+    {
+        "scene": "C:\\\\projects\\\\sh010.max",
+        "kale": true,
+        "submit": true,
+        "defaults": {...},
+        "shots": [...]
+    }
+    scene: A max file to open first, optional if the scene is already open
+    kale: Runs the Kale scene checks before preparing anything
+    submit: Submits each prepared pass to Backburner, otherwise the passes are only prepared
+
+The results are written as json:
+    {
+        "success": true,
+        "scene": "C:\\\\projects\\\\sh010.max",
+        "errors": [],
+        "kale": [{"title": ..., "text": ..., "category": ..., "priority": ...}],
+        "passes": [{"shot": "sh010", "pass": "prepass", "success": true, "messages": [...]}]
+    }
+"""
+import os
+import sys
+import json
+import logging
+
+if __name__ == "__main__":
+    # Run as a script, the other modules are found next to this one like dev.py does
+    sys.path.append(os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__))))
+
+import pymxs
+
+import renderFarmingConfig as rFCfg
+import renderFarmingKaleChecks as rFKC
+import renderFarmingShotList as rFSL
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Batch")
+
+# The environment variables read when the module is run as a script
+job_variable = "RF_BATCH_JOB"
+results_variable = "RF_BATCH_RESULTS"
+
+
+class BatchResults(object):
+    """
+    Everything a batch run did, in a form that can be written as json
+    """
+    def __init__(self, job_path):
+        self._job_path = job_path
+        self._scene = str()
+        self._errors = list()
+        self._kale = list()
+        self._passes = list()
+
+    def set_scene(self, scene):
+        self._scene = scene
+
+    def add_error(self, error):
+        mlg.error(error)
+        self._errors.append(error)
+
+    def add_kale_item(self, kale_item):
+        self._kale.append({
+            "title": kale_item.get_title(),
+            "text": kale_item.get_text(),
+            "category": kale_item.get_category(),
+            "priority": kale_item.get_priority()
+        })
+
+    def add_shot_result(self, shot_result):
+        self._passes.append({
+            "shot": shot_result.get_shot().get_name(),
+            "pass": shot_result.get_pass_name(),
+            "status": shot_result.get_status(),
+            "success": shot_result.is_success(),
+            "messages": shot_result.get_messages()
+        })
+
+    def get_errors(self):
+        return self._errors
+
+    def get_passes(self):
+        return self._passes
+
+    def is_success(self):
+        return len(self._errors) == 0 and all([p["success"] for p in self._passes])
+
+    def to_json(self):
+        return json.dumps({
+            "success": self.is_success(),
+            "job": self._job_path,
+            "scene": self._scene,
+            "errors": self._errors,
+            "kale": self._kale,
+            "passes": self._passes
+        }, indent=4, sort_keys=True)
+
+    def write(self, file_path):
+        """
+        :param file_path: Where to write the results, an existing file is replaced
+        :return: True for success, False for failure
+        """
+        try:
+            with open(file_path, 'w') as results_file:
+                results_file.write(self.to_json())
+            return True
+        except IOError as e:
+            mlg.error("IO Error, Failed to write batch results {0}: {1}".format(file_path, e))
+            return False
+
+
+def _start_logging(cfg):
+    """
+    Sends the renderFarming log to the configured log file, the same way the dialog does
+    :param cfg: A Configuration object
+    :return: None
+    """
+    lg = logging.getLogger("renderFarming")
+    lg.setLevel(cfg.get_log_level())
+
+    log_file = cfg.get_log_file()
+    if not any([getattr(h, "baseFilename", None) == os.path.abspath(log_file) for h in lg.handlers]):
+        fh = logging.FileHandler(log_file)
+        fh.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        lg.addHandler(fh)
+
+
+def _load_job(job_path, results):
+    try:
+        with open(job_path, 'r') as job_file:
+            return json.load(job_file)
+    except IOError as e:
+        results.add_error("Unable to read the job {0}: {1}".format(job_path, e))
+    except ValueError as e:
+        results.add_error("The job {0} is not valid json: {1}".format(job_path, e))
+    return None
+
+
+def _open_scene(scene, results):
+    if not os.path.isfile(scene):
+        results.add_error("Scene {} does not exist".format(scene))
+        return False
+    if not rt.loadMaxFile(scene, quiet=True):
+        results.add_error("Unable to open scene {}".format(scene))
+        return False
+    return True
+
+
+def run(job_path, results_path=None, cfg=None):
+    """
+    Runs a batch job
+    :param job_path: The path to the job description json
+    :param results_path: Where to write the results json, nothing is written if None
+    :param cfg: A Configuration object, the user's configuration is used if None
+    :return: A BatchResults object
+    """
+    results = BatchResults(job_path)
+
+    if cfg is None:
+        cfg = rFCfg.Configuration()
+        cfg.set_max_system_directories(rt)
+    _start_logging(cfg)
+
+    mlg.info("Render Farming Batch: Starting {}".format(job_path))
+
+    job = _load_job(job_path, results)
+
+    if job is not None:
+        scene = job.get("scene")
+        if scene and not _open_scene(scene, results):
+            job = None
+
+    if job is not None:
+        results.set_scene(str(rt.maxFilePath) + str(rt.maxFileName))
+
+        try:
+            shot_list = rFSL.ShotList(job, job_path)
+        except rFSL.ShotListError as e:
+            for error in e.errors:
+                results.add_error(error)
+            shot_list = None
+
+        if shot_list is not None:
+            if job.get("kale", True):
+                for item in rFKC.KaleChecks(cfg).run():
+                    results.add_kale_item(item)
+
+            runner = rFSL.ShotListRunner(cfg, shot_list, bool(job.get("submit", True)))
+            for shot_result in runner.run():
+                results.add_shot_result(shot_result)
+
+    if results_path is not None:
+        results.write(results_path)
+
+    mlg.info("Render Farming Batch: Finished {0}, success: {1}".format(job_path, results.is_success()))
+    return results
+
+
+def main():
+    """
+    The script entry point, the job and results paths come from the environment since 3dsmaxbatch doesn't pass
+    arguments through to python
+    :return: The BatchResults object, or None if no job was given
+    """
+    job_path = os.environ.get(job_variable)
+    if job_path is None:
+        mlg.error("No batch job, set {} to the path of a job description".format(job_variable))
+        return None
+
+    results_path = os.environ.get(results_variable, os.path.splitext(job_path)[0] + "_results.json")
+    return run(job_path, results_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Reads and writes a property across many nodes in a single MaxScript call
+
+The Barn tools used to set one property per object from python, a round trip to the runtime for every object.  Here
+the nodes and values are handed over as arrays and the loop runs in MaxScript, inside one undo record and without
+redrawing the viewports until the end.  Large selections show the 3ds Max progress bar while the loop runs.
+"""
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Bulk")
+
+# Selections at least this large show the 3ds Max progress bar
+progress_threshold = 5000
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Property paths can reach into a value, "layer.wireColor.s" reads the saturation of each node's layer color.
+_get_source = """
+fn rfBulkGetProperties nodes paths = (
+    local parts = for p in paths collect (for part in (filterString p ".") collect (part as name))
+    for path in parts collect (
+        for n in nodes collect (
+            local v = n
+            for part in path while v != undefined do v = getProperty v part
+            v
+        )
+    )
+)
+"""
+
+# With broadcast the same value goes to every node, otherwise values holds one per node.  make_color reads values as
+# r, g, b triplets and builds the colors here, so colors cross over as plain numbers.
+_set_source = """
+fn rfBulkSetProperty nodes prop values broadcast make_color title threshold = (
+    local count = nodes.count
+    local show_progress = count >= threshold
+    local step = amax 1 (count / 100)
+    if show_progress do progressStart title
+    try (
+        for i = 1 to count do (
+            local v = case of (
+                broadcast: values
+                make_color: color values[3 * i - 2] values[3 * i - 1] values[3 * i]
+                default: values[i]
+            )
+            setProperty nodes[i] prop v
+            if show_progress and (mod i step) == 0 do progressUpdate (100.0 * i / count)
+        )
+    ) catch (
+        if show_progress do progressEnd()
+        throw()
+    )
+    if show_progress do progressEnd()
+    count
+)
+"""
+
+# ---------------------------------------------------
+#                   Functions
+# ---------------------------------------------------
+
+
+def get_properties(nodes, paths):
+    """
+    Reads properties from every node in one call
+    :param nodes: A list or MaxScript array of nodes, or of any value with properties such as layers
+    :param paths: A list of property names, or dotted paths such as "wirecolor.s"
+    :return: A list for each path holding the value of each node, undefined along a path reads as None
+    """
+    if len(nodes) < 1:
+        return [list() for p in paths]
+    get_props = rFT.define_mxs_function(rt, "rfBulkGetProperties", _get_source)
+    return [list(column) for column in get_props(rt.array(*nodes), rt.array(*paths))]
+
+
+def _set(nodes, prop, values, broadcast, make_color, undo_label, redraw):
+    if len(nodes) < 1:
+        return 0
+    set_prop = rFT.define_mxs_function(rt, "rfBulkSetProperty", _set_source)
+    title = undo_label if undo_label is not None else "Setting {}".format(prop)
+    mlg.debug("{0}: {1} on {2} nodes".format(title, prop, len(nodes)))
+
+    with pymxs.redraw(False):
+        if undo_label is None:
+            count = set_prop(rt.array(*nodes), rt.name(prop), values, broadcast, make_color, title,
+                             progress_threshold)
+        else:
+            with pymxs.undo(True, undo_label):
+                count = set_prop(rt.array(*nodes), rt.name(prop), values, broadcast, make_color, title,
+                                 progress_threshold)
+    if redraw:
+        rt.redrawViews()
+    return count
+
+
+def set_property(nodes, prop, value, undo_label=None, redraw=True):
+    """
+    Sets a property to the same value on every node in one call
+    :param nodes: A list or MaxScript array of nodes
+    :param prop: The property name
+    :param value: The value for every node
+    :param undo_label: The name of the undo record, None leaves undo to the caller
+    :param redraw: Redraw the viewports once afterwards
+    :return: The number of nodes set
+    """
+    return _set(nodes, prop, value, True, False, undo_label, redraw)
+
+
+def set_properties(nodes, prop, values, undo_label=None, redraw=True):
+    """
+    Sets a property to a different value on each node in one call
+    :param nodes: A list or MaxScript array of nodes
+    :param prop: The property name
+    :param values: A list with a value for each node, in the same order
+    :return: The number of nodes set
+    """
+    return _set(nodes, prop, list(values), False, False, undo_label, redraw)
+
+
+def set_colors(nodes, prop, colors, undo_label=None, redraw=True):
+    """
+    Sets a color property on each node in one call, the colors are built in MaxScript
+    :param nodes: A list or MaxScript array of nodes
+    :param prop: The property name, such as "wirecolor"
+    :param colors: A list of r, g, b tuples, one for each node
+    :return: The number of nodes set
+    """
+    flat = [channel for c in colors for channel in c]
+    return _set(nodes, prop, flat, False, True, undo_label, redraw)
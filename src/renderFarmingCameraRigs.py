@@ -0,0 +1,368 @@
+"""
+Camera rig presets, for switching V-Ray between standard, spherical and stereo VR renders
+
+A preset holds the V-Ray camera settings of a rig, and the VRayStereoscopic helper settings for stereo rigs.  Applying
+one writes every setting in a single MaxScript call, which hands back the values it replaced as a RigSnapshot so the
+previous rig can be restored the same way.  The stereo helpers are found with a class scan that is cached until nodes
+are created or deleted, rather than searching the scene every time the rig is checked.
+"""
+import logging
+
+import pymxs
+import MaxPlus
+
+import renderFarmingTools as rFT
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.CameraRigs")
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Settings cross over as parallel arrays of targets, property names and values, the old values come back in order.
+_swap_settings_source = """
+fn rfSwapSettings targets props values = (
+    for i = 1 to targets.count collect (
+        local prop = props[i] as name
+        local old = getProperty targets[i] prop
+        setProperty targets[i] prop values[i]
+        old
+    )
+)
+"""
+
+_read_settings_source = """
+fn rfReadSettings targets props = (
+    for i = 1 to targets.count collect (getProperty targets[i] (props[i] as name))
+)
+"""
+
+# ---------------------------------------------------
+#                 Stereo Helpers
+# ---------------------------------------------------
+
+
+class StereoHelperCache(object):
+    """
+    The VRayStereoscopic helpers in the scene, looked up once and kept until a node is created, merged, added or
+    deleted, an edit is undone or redone or the scene changes
+    """
+    _codes = ("NodeCreated", "SceneAddedNode", "SceneNodeDeleted", "SceneUndo", "SceneRedo", "FilePostOpen",
+              "FilePostMerge", "SystemPostNew", "SystemPostReset")
+
+    def __init__(self):
+        self._clg = logging.getLogger("renderFarming.CameraRigs.StereoHelperCache")
+
+        self._helpers = None
+        self._handlers = list()
+
+    def _register(self):
+        for code in self._codes:
+            self._handlers.append(MaxPlus.NotificationManager.Register(getattr(MaxPlus.NotificationCodes, code),
+                                                                       self._scene_change_handler))
+
+    def unregister(self):
+        for handler in self._handlers:
+            try:
+                MaxPlus.NotificationManager.Unregister(handler)
+            except ValueError as e:
+                self._clg.debug("Notification handler missing: {}".format(e))
+        self._handlers = list()
+
+    # noinspection PyUnusedLocal
+    def _scene_change_handler(self, code):
+        self._helpers = None
+
+    def invalidate(self):
+        self._helpers = None
+
+    def get_helpers(self):
+        """
+        :return: A list of the VRayStereoscopic helpers, scanning the scene only if it has changed since last time
+        """
+        if not self._handlers:
+            self._register()
+        if self._helpers is None:
+            stereo_class = getattr(rt, "VRayStereoscopic", None)
+            self._helpers = list(rt.getClassInstances(stereo_class)) if stereo_class is not None else list()
+            self._clg.debug("Found {} VRayStereoscopic helpers".format(len(self._helpers)))
+        return list(self._helpers)
+
+
+_helper_cache = StereoHelperCache()
+
+
+def get_stereo_helpers():
+    """
+    :return: A list of the VRayStereoscopic helpers in the scene
+    """
+    return _helper_cache.get_helpers()
+
+
+def unregister_notifications():
+    """
+    Stops following scene changes when the Barn closes, the helpers are looked up again the next time they are needed
+    :return: None
+    """
+    _helper_cache.unregister()
+    _helper_cache.invalidate()
+
+
+def create_stereo_helper():
+    """
+    Creates a VRayStereoscopic helper, the node created notification drops the cached lookup
+    :return: The new helper
+    """
+    helper = rt.VRayStereoscopic()
+    _helper_cache.invalidate()
+    return helper
+
+
+# ---------------------------------------------------
+#                   Presets
+# ---------------------------------------------------
+
+
+class RigSnapshot(object):
+    """
+    The values a set of settings had, to put them back later
+    Stereo helpers created by the preset didn't exist before it, so restoring deletes them rather than resetting them
+    """
+    def __init__(self, targets, props, values, created=(), preset=None):
+        """
+        :param targets: A list of the renderer or helpers each setting is on
+        :param props: A list of property names
+        :param values: A list of the values, in the same order
+        :param created: A list of the stereo helpers the preset created, their settings are left out of targets
+        :param preset: The CameraRigPreset which made the changes, applied again to redo them after helpers have been
+        deleted
+        """
+        self._targets = list(targets)
+        self._props = list(props)
+        self._values = list(values)
+        self._created = list(created)
+        self._preset = preset
+
+    def __len__(self):
+        return len(self._props)
+
+    def get_settings(self):
+        """
+        :return: A list of target, property, value tuples
+        """
+        return zip(self._targets, self._props, self._values)
+
+    def get_created(self):
+        return list(self._created)
+
+    def restore(self):
+        """
+        Writes the values back in a single call and deletes the stereo helpers the preset created
+        :return: A RigSnapshot of the values that were replaced
+        """
+        if self._preset is not None and len(self._targets) < 1:
+            # Only made by restoring a snapshot which deleted helpers, they are created again by the preset
+            return self._preset.apply()
+
+        snapshot = _swap(self._targets, self._props, self._values)
+        if len(self._created) < 1:
+            return snapshot
+
+        rt.delete(rt.array(*self._created))
+        _helper_cache.invalidate()
+        mlg.debug("Deleted {} stereo helpers made by the rig".format(len(self._created)))
+        return RigSnapshot(list(), list(), list(), preset=self._preset)
+
+
+def _swap(targets, props, values):
+    if len(targets) < 1:
+        return RigSnapshot(list(), list(), list())
+    swap = rFT.define_mxs_function(rt, "rfSwapSettings", _swap_settings_source)
+    old_values = swap(rt.array(*targets), rt.array(*props), rt.array(*values))
+    return RigSnapshot(targets, props, list(old_values))
+
+
+class CameraRigPreset(object):
+    """
+    The renderer and stereo helper settings of a camera rig
+    """
+    def __init__(self, name, camera_settings, helper_settings, needs_helper=False):
+        """
+        :param name: The name shown in the Barn
+        :param camera_settings: A dictionary of V-Ray renderer properties and their values
+        :param helper_settings: A dictionary of VRayStereoscopic properties, a value may be a function which is called
+        when the preset is applied, for values which depend on the scene units
+        :param needs_helper: Creates a VRayStereoscopic helper if there isn't one
+        """
+        self._name = name
+        self._camera_settings = dict(camera_settings)
+        self._helper_settings = dict(helper_settings)
+        self._needs_helper = needs_helper
+
+    def get_name(self):
+        return self._name
+
+    def get_camera_settings(self):
+        return dict(self._camera_settings)
+
+    def get_helper_settings(self):
+        return dict(self._helper_settings)
+
+    def needs_helper(self):
+        return self._needs_helper
+
+    def _settings(self, renderer, helpers):
+        """
+        :return: Parallel lists of targets, properties and values for every setting of the preset
+        """
+        targets = list()
+        props = list()
+        values = list()
+        for prop in sorted(self._camera_settings):
+            targets.append(renderer)
+            props.append(prop)
+            values.append(self._camera_settings[prop])
+        for prop in sorted(self._helper_settings):
+            value = self._helper_settings[prop]
+            if callable(value):
+                try:
+                    value = value()
+                except RuntimeError as e:
+                    mlg.error("Unable to work out {0} for {1}: {2}".format(prop, self._name, e))
+                    continue
+            for helper in helpers:
+                targets.append(helper)
+                props.append(prop)
+                values.append(value)
+        return targets, props, values
+
+    def apply(self):
+        """
+        Writes every setting of the preset in a single call
+        :return: A RigSnapshot of the values that were replaced, restoring it puts the previous rig back
+        """
+        renderer = rFT.verify_vray(rt)
+        if renderer is None:
+            raise RuntimeError("V-Ray is not available, unable to set up the {} rig".format(self._name))
+
+        helpers = get_stereo_helpers()
+        created = list()
+        if self._needs_helper and len(helpers) < 1:
+            created = [create_stereo_helper()]
+
+        mlg.debug("Applying the {0} rig to {1} stereo helpers".format(self._name, len(helpers) + len(created)))
+        if len(created) < 1:
+            return _swap(*self._settings(renderer, helpers))
+
+        # A new helper has nothing to go back to, the snapshot keeps the renderer settings and deletes it instead
+        replaced = _swap(*self._settings(renderer, created)).get_settings()[:len(self._camera_settings)]
+        return RigSnapshot([t for t, p, v in replaced], [p for t, p, v in replaced], [v for t, p, v in replaced],
+                           created, self)
+
+    def is_current(self):
+        """
+        :return: True if the scene is set up with this rig
+        """
+        renderer = rt.renderers.current
+        if "V_Ray_Adv" not in str(renderer):
+            return False
+
+        helpers = get_stereo_helpers()
+        if self._needs_helper and len(helpers) < 1:
+            return False
+
+        targets, props, values = self._settings(renderer, helpers)
+        if len(targets) < 1:
+            return True
+        read = rFT.define_mxs_function(rt, "rfReadSettings", _read_settings_source)
+        current = list(read(rt.array(*targets), rt.array(*props)))
+        return all([_same(a, b) for a, b in zip(current, values)])
+
+
+def _same(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        try:
+            return abs(float(a) - float(b)) < 0.0001
+        except (TypeError, ValueError):
+            return False
+    return a == b
+
+
+_presets = list()
+
+
+def register_preset(preset):
+    """
+    Adds a preset, replacing any with the same name
+    :param preset: A CameraRigPreset
+    :return: None
+    """
+    global _presets
+    _presets = [p for p in _presets if p.get_name() != preset.get_name()]
+    _presets.append(preset)
+
+
+def get_presets():
+    return list(_presets)
+
+
+def get_preset(name):
+    """
+    :param name: The name of a preset
+    :return: The CameraRigPreset, or None if there isn't one by that name
+    """
+    for preset in _presets:
+        if preset.get_name() == name:
+            return preset
+    return None
+
+
+def get_current_preset():
+    """
+    :return: The first preset the scene is set up with, or None for a rig which doesn't match any of them
+    """
+    for preset in _presets:
+        if preset.is_current():
+            return preset
+    return None
+
+
+# The V-Ray camera types
+_standard_camera = 0
+_spherical_panorama_camera = 9
+_cube_camera = 10
+
+_stereo_off = {"enabled": False}
+
+register_preset(CameraRigPreset("Standard", {
+    "camera_type": _standard_camera,
+    "camera_overrideFOV": False,
+    "camera_fov": 45.0,
+    "camera_cyl_height": 90.0
+}, _stereo_off))
+
+register_preset(CameraRigPreset("Spherical 360", {
+    "camera_type": _spherical_panorama_camera,
+    "camera_overrideFOV": True,
+    "camera_fov": 360.0,
+    "camera_cyl_height": 180.0
+}, _stereo_off))
+
+register_preset(CameraRigPreset("Cube 6x1", {
+    "camera_type": _cube_camera,
+    "camera_overrideFOV": False
+}, _stereo_off))
+
+register_preset(CameraRigPreset("Stereo VR", {
+    "camera_type": _spherical_panorama_camera,
+    "camera_overrideFOV": True,
+    "camera_fov": 360.0,
+    "camera_cyl_height": 180.0
+}, {
+    "enabled": True,
+    "adjust_resolution": True,
+    "output_layout": 1,
+    "eye_distance": lambda: rt.units.decodeValue("63mm")
+}, needs_helper=True))
@@ -1,5 +1,7 @@
 import PySide2.QtGui as QtG
 
+import renderFarmingTools as rFT
+
 kale_low = QtG.QColor(30, 78, 125)
 kale_medium = QtG.QColor(76, 54, 136)
 kale_high = QtG.QColor(117, 56, 123)
@@ -14,6 +16,6 @@ log_critical = QtG.QColor(186, 12, 12)
 log_renderFarming = QtG.QColor(17, 186, 104)
 log_module = QtG.QColor(255, 167, 227)
 
-label_orange = QtG.QColor().setNamedColor("#FFA500")
-label_green = QtG.QColor().setNamedColor("#ff3232")
-label_red = QtG.QColor().setNamedColor("#4ca64c")
+label_orange = QtG.QColor(rFT.label_colors["Orange"])
+label_green = QtG.QColor(rFT.label_colors["Green"])
+label_red = QtG.QColor(rFT.label_colors["Red"])
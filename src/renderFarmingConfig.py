@@ -216,6 +216,18 @@ class Configuration:
     def get_irradiance_cache_path(self, raw=False):
         return self._get_path_option("paths", "light_cache_directory", raw)
 
+    def get_render_element_routing_path(self, raw=False):
+        """
+        Gets the path to the render element routing table, which is optional
+        :param raw: Skips the token expansion
+        :return: The path or an empty string if there is no routing table
+        """
+        if not self._Config.has_option("paths", "render_element_routing"):
+            return str()
+        if self._Config.get("paths", "render_element_routing") == "":
+            return str()
+        return self._get_path_option("paths", "render_element_routing", raw)
+
     def get_log_level(self):
         return self._Config.get("logging", "level")
 
@@ -236,6 +248,13 @@ class Configuration:
     def get_net_render_manager(self):
         return self._Config.get("netrender", "manager")
 
+    def get_render_queue_file(self):
+        """
+        The local render queue is kept with the config, so it is per user and survives a crash
+        :return: The path to the render queue json
+        """
+        return os.path.join(self._directory, "renderFarmingQueue.json")
+
     def get_user_scripts_path(self):
         return self._get_path_option("paths", "user_scripts", True)
 
@@ -270,6 +289,40 @@ class Configuration:
             self._Config.set("interface", option, data)
             return data
 
+    def get_gi_cache_setting(self, option):
+        """
+        Gets entries from the gi_cache section, falling back to defaults for configs made before it existed
+        :param option: String: the name of the option
+            -reuse: Boolean: skip prepasses when a matching GI cache exists
+            -evict_on_prepass: Boolean: remove stale caches whenever a prepass is prepared
+            -max_age_days: Float: caches older than this are removed, 0 disables
+            -quota_gb: Float: the oldest caches are removed above this total size, 0 disables
+            -evict_project: String: every cache recorded for this project code is removed, blank disables
+            -imap_viewer: String: V-Ray's imapviewer, used to merge the chunks of a split prepass
+        :return: the data contained in the specified option
+        """
+        defaults = {
+            "reuse": True,
+            "evict_on_prepass": False,
+            "max_age_days": 30.0,
+            "quota_gb": 0.0,
+            "evict_project": "",
+            "imap_viewer": "imapviewer.exe"
+        }
+        if not self._Config.has_section("gi_cache"):
+            self._Config.add_section("gi_cache")
+        try:
+            if isinstance(defaults.get(option), bool):
+                return self._Config.getboolean("gi_cache", option)
+            elif isinstance(defaults.get(option), float):
+                return self._Config.getfloat("gi_cache", option)
+            else:
+                return self._Config.get("gi_cache", option)
+        except ConfigParser.NoOptionError:
+            data = defaults.get(option, "")
+            self._Config.set("gi_cache", option, str(int(data)) if isinstance(data, bool) else str(data))
+            return data
+
     def __str__(self):
         cfg_str = ""
         cfg_array = list()
@@ -344,12 +397,20 @@ class Configuration:
     def set_irradiance_cache_path(self, path):
         self._set_config_by_section("paths", "irradiance_cache_directory", path)
 
+    def set_render_element_routing_path(self, path):
+        self._set_config_by_section("paths", "render_element_routing", path)
+
     def _set_user_scripts_path(self, path):
         self._set_config_by_section("paths", "user_scripts", path)
 
     def set_interface_setting(self, option, value):
         return self._set_config_by_section("interface", option, value)
 
+    def set_gi_cache_setting(self, option, value):
+        if not self._Config.has_section("gi_cache"):
+            self._Config.add_section("gi_cache")
+        return self._set_config_by_section("gi_cache", option, value)
+
 
 # config = Configuration()
 #
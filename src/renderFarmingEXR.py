@@ -0,0 +1,330 @@
+import os
+import mmap
+import struct
+import logging
+
+mlg = logging.getLogger("renderFarming.EXR")
+
+# The first four bytes of every OpenEXR file
+magic_number = 20000630
+
+# Version field flags
+_tiled_flag = 0x200
+_long_names_flag = 0x400
+_non_image_flag = 0x800
+_multipart_flag = 0x1000
+
+compression_names = {
+    0: "NONE",
+    1: "RLE",
+    2: "ZIPS",
+    3: "ZIP",
+    4: "PIZ",
+    5: "PXR24",
+    6: "B44",
+    7: "B44A",
+    8: "DWAA",
+    9: "DWAB"
+}
+
+# The number of scan lines stored in each chunk for each compression type
+_lines_per_chunk = {
+    0: 1,
+    1: 1,
+    2: 1,
+    3: 16,
+    4: 32,
+    5: 16,
+    6: 32,
+    7: 32,
+    8: 32,
+    9: 256
+}
+
+pixel_type_names = {
+    0: "UINT",
+    1: "HALF",
+    2: "FLOAT"
+}
+
+_int = struct.Struct("<i")
+_box = struct.Struct("<iiii")
+_channel = struct.Struct("<iB3xii")
+_offset = struct.Struct("<Q")
+
+
+class EXRChannel(object):
+    def __init__(self, name, pixel_type, x_sampling, y_sampling):
+        self._name = name
+        self._pixel_type = pixel_type
+        self._x_sampling = x_sampling
+        self._y_sampling = y_sampling
+
+    def get_name(self):
+        return self._name
+
+    def get_layer(self):
+        """
+        :return: The part of the name before the last dot, ex: "VRayZDepth" for "VRayZDepth.Z", empty for "R"
+        """
+        return self._name.rpartition(".")[0]
+
+    def get_pixel_type(self):
+        return pixel_type_names.get(self._pixel_type, "UNKNOWN")
+
+    def get_sampling(self):
+        return self._x_sampling, self._y_sampling
+
+    def __str__(self):
+        return "{0} ({1})".format(self._name, self.get_pixel_type())
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class EXRHeader(object):
+    """
+    Reads the header of an OpenEXR file without decoding any pixels
+    The file is memory mapped, so only the pages holding the header and the chunk offset table are read from disk
+    Only the first part of a multi-part file is read
+    """
+    def __init__(self, file_path):
+        self._file_path = file_path
+
+        self._version = 0
+        self._flags = 0
+        self._file_size = 0
+        self._attributes = dict()
+        self._channels = list()
+        self._compression = 0
+        self._data_window = (0, 0, -1, -1)
+        self._display_window = (0, 0, -1, -1)
+        self._complete = False
+
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self._file_path, 'rb') as exr_file:
+                self._file_size = os.fstat(exr_file.fileno()).st_size
+                if self._file_size < 8:
+                    raise EXRHeaderError(self._file_path, "The file is too small to be an EXR")
+                mapped = mmap.mmap(exr_file.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    self._parse(mapped)
+                finally:
+                    mapped.close()
+        except (IOError, OSError, ValueError, struct.error) as e:
+            raise EXRHeaderError(self._file_path, e)
+
+    def _string(self, mapped, position):
+        """
+        Reads a null terminated string
+        :return: A tuple of the string and the position after its terminator
+        """
+        end = mapped.find(b"\0", position)
+        if end < 0:
+            raise EXRHeaderError(self._file_path, "The header is truncated")
+        return mapped[position:end].decode("latin-1"), end + 1
+
+    def _parse(self, mapped):
+        if _int.unpack_from(mapped, 0)[0] != magic_number:
+            raise EXRHeaderError(self._file_path, "The file is not an EXR")
+
+        version_field = _int.unpack_from(mapped, 4)[0]
+        self._version = version_field & 0xff
+        self._flags = version_field & 0xffffff00
+
+        position = 8
+        while True:
+            name, position = self._string(mapped, position)
+            # An empty name ends the header
+            if name == "":
+                break
+            attribute_type, position = self._string(mapped, position)
+            if position + 4 > self._file_size:
+                raise EXRHeaderError(self._file_path, "The header is truncated")
+            size = _int.unpack_from(mapped, position)[0]
+            position += 4
+            if size < 0 or position + size > self._file_size:
+                raise EXRHeaderError(self._file_path, "The header is truncated")
+
+            self._attributes[name] = attribute_type
+            self._parse_attribute(mapped, name, attribute_type, position, position + size)
+            position += size
+
+        if self._flags & _multipart_flag:
+            # The remaining part headers would have to be skipped to find the offset tables
+            self._complete = True
+        else:
+            self._complete = self._check_offsets(mapped, position)
+
+    def _parse_attribute(self, mapped, name, attribute_type, start, end):
+        if attribute_type == "chlist":
+            position = start
+            while position < end:
+                channel_name, position = self._string(mapped, position)
+                if channel_name == "":
+                    break
+                pixel_type, p_linear, x_sampling, y_sampling = _channel.unpack_from(mapped, position)
+                position += _channel.size
+                self._channels.append(EXRChannel(channel_name, pixel_type, x_sampling, y_sampling))
+
+        elif attribute_type == "compression":
+            self._compression = ord(mapped[start:start + 1])
+
+        elif attribute_type == "box2i" and name == "dataWindow":
+            self._data_window = _box.unpack_from(mapped, start)
+
+        elif attribute_type == "box2i" and name == "displayWindow":
+            self._display_window = _box.unpack_from(mapped, start)
+
+    def _check_offsets(self, mapped, position):
+        """
+        Checks the last entry of the scan line offset table.  Offsets are written as chunks are finished, so an
+        interrupted render leaves the end of the table empty or pointing past the end of the file.
+        :param position: The position of the first byte after the header
+        :return: True if the file looks complete
+        """
+        if self.is_tiled():
+            # Tiled files have a table per level and aren't checked
+            return True
+
+        lines = self.get_height()
+        per_chunk = _lines_per_chunk.get(self._compression, 1)
+        chunks = (lines + per_chunk - 1) // per_chunk
+        last = position + (chunks - 1) * _offset.size
+
+        if chunks < 1 or last + _offset.size > self._file_size:
+            return False
+
+        offset = _offset.unpack_from(mapped, last)[0]
+        return position < offset < self._file_size
+
+    # ---------------------------------------------------
+    #                       Getters
+    # ---------------------------------------------------
+
+    def get_file_path(self):
+        return self._file_path
+
+    def get_file_size(self):
+        return self._file_size
+
+    def get_version(self):
+        return self._version
+
+    def is_tiled(self):
+        return bool(self._flags & _tiled_flag)
+
+    def is_multipart(self):
+        return bool(self._flags & _multipart_flag)
+
+    def is_deep(self):
+        return bool(self._flags & _non_image_flag)
+
+    def is_complete(self):
+        return self._complete
+
+    def get_attributes(self):
+        """
+        :return: A dictionary of every attribute name in the header to its type
+        """
+        return self._attributes
+
+    def get_channels(self):
+        return self._channels
+
+    def get_channel_names(self):
+        return [c.get_name() for c in self._channels]
+
+    def get_layers(self):
+        return set([c.get_layer() for c in self._channels])
+
+    def get_compression(self):
+        return compression_names.get(self._compression, "UNKNOWN")
+
+    def get_data_window(self):
+        return self._data_window
+
+    def get_display_window(self):
+        return self._display_window
+
+    def get_width(self):
+        return self._data_window[2] - self._data_window[0] + 1
+
+    def get_height(self):
+        return self._data_window[3] - self._data_window[1] + 1
+
+    def __str__(self):
+        return "{0}: {1}x{2} {3} [{4}]".format(self._file_path, self.get_width(), self.get_height(),
+                                              self.get_compression(), ", ".join(self.get_channel_names()))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class EXRValidator(object):
+    """
+    Checks EXR files against the expected render settings
+    Used as a FrameSequence validator: calling it with a file path returns a list of problems
+    """
+    def __init__(self, width=None, height=None, channels=(), layers=()):
+        """
+        :param width: The expected image width, None skips the check
+        :param height: The expected image height, None skips the check
+        :param channels: Channel names which have to be present, ex: ("R", "G", "B")
+        :param layers: Channel layers which have to be present, ex: the render element names of a multichannel EXR
+        """
+        self._width = width
+        self._height = height
+        self._channels = set(channels)
+        self._layers = set(layers)
+
+    def __call__(self, file_path):
+        """
+        :param file_path: The EXR to check
+        :return: A list of strings describing each problem, empty if the file is valid
+        """
+        try:
+            header = EXRHeader(file_path)
+        except EXRHeaderError as e:
+            return [str(e)]
+
+        problems = list()
+
+        if not header.is_complete():
+            problems.append("The file is truncated")
+
+        if self._width is not None and self._height is not None:
+            if header.get_width() != self._width or header.get_height() != self._height:
+                problems.append("Resolution is {0}x{1} instead of {2}x{3}".format(
+                    header.get_width(), header.get_height(), self._width, self._height
+                ))
+
+        missing_channels = self._channels.difference(header.get_channel_names())
+        if len(missing_channels) > 0:
+            problems.append("Missing channels: {}".format(", ".join(sorted(missing_channels))))
+
+        missing_layers = self._layers.difference(header.get_layers())
+        if len(missing_layers) > 0:
+            problems.append("Missing layers: {}".format(", ".join(sorted(missing_layers))))
+
+        return problems
+
+# ---------------------------------------------------
+#                     Exceptions
+# ---------------------------------------------------
+
+
+class EXRHeaderError(Exception):
+    """
+    Exception raised for EXR files which can't be read.
+    :attribute message: explanation of the error
+    """
+
+    def __init__(self, file_path, reason):
+        self.message = "Unable to read EXR header {0}: {1}".format(file_path, reason)
+
+    def __str__(self):
+        return str(self.message)
@@ -0,0 +1,857 @@
+"""
+Exports one file per object with a pool of 3ds Max batch workers
+
+The objects are prepared in the open scene and saved into a few chunk scenes with saveNodes, then each chunk is
+opened by a 3dsmaxbatch worker which exports its objects.  Only the preparation runs on the UI thread, the format
+conversion runs in as many background processes as the pool allows.
+"""
+import os
+import json
+import math
+import hashlib
+import shutil
+import logging
+import tempfile
+import subprocess
+
+import pymxs
+
+import renderFarmingTools as rFT
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Export")
+
+# The classes the built in formats export, a class this version of 3ds Max doesn't have is skipped
+mesh_classes = ("Editable_Poly", "PolyMeshObject", "Editable_Mesh", "Sphere", "ProBoolean", "Box")
+
+# The user property which tells a worker where to export a node
+export_property = "rfExportFile"
+
+# Each worker gets a few chunks, so they all stay busy until the end and a cancel doesn't wait on a long chunk
+chunks_per_worker = 4
+
+# Kept in the export directory, the content hash of every file exported there
+cache_file_name = "rfExportCache.json"
+
+# Kept in the export directory, where each instanced object's shared file is placed in the scene
+placements_file_name = "rfPlacements.json"
+
+# Keeps the workers from opening a console window each
+_create_no_window = 0x08000000
+
+# Run by each worker after it opens its chunk.  Every exported node is written to the progress file as soon as it is
+# done, so the pool can report progress while the worker runs.
+_worker_script_template = """-- Written by renderFarming
+(
+    local progress_file = {progress_file}
+{options}
+    local exports = for n in objects where (getUserProp n "{export_property}") != undefined collect n
+    for n in exports do (
+        local file_name = getUserProp n "{export_property}"
+        select n
+        local result = try (exportFile file_name #noPrompt selectedOnly:true using:{export_class}) catch (false)
+        local f = openFile progress_file mode:"a"
+        format "%\\t%\\n" (if result then "ok" else "failed") file_name to:f
+        close f
+    )
+)
+"""
+
+# Clones and prepares every exportable object in one call.  Undo and the command panel are suspended and nothing is
+# selected, so the cost doesn't grow with the scene's undo stack or the modifier panel refreshing for each object.
+_prep_clones_source = """
+fn rfPrepExportClones originals classes rotate_for_unity reset_x_forms collapse_stack pivot_to_origin local_space = (
+    local clones = #()
+    with undo off (
+        with redraw off (
+            suspendEditing()
+            try (
+                for o in originals where (findItem classes (classOf o)) > 0 do (
+                    local c = copy o
+                    c.name = o.name
+                    if rotate_for_unity or local_space do (
+                        local t = if local_space then (matrix3 1) else o.transform
+                        if rotate_for_unity do preRotate t (eulerToQuat (eulerAngles 90 0 0))
+                        c.transform = t
+                    )
+                    if reset_x_forms do resetXForm c
+                    if collapse_stack do convertToPoly c
+                    if pivot_to_origin do c.position = [0, 0, 0]
+                    append clones c
+                )
+            ) catch (
+                resumeEditing()
+                delete clones
+                throw()
+            )
+            resumeEditing()
+        )
+    )
+    clones
+)
+"""
+
+# Collects what an exported file depends on for every exportable object in one call.  Each object is reduced to a
+# cheap key of its modifier stack, face and vertex counts, bounding box, object offset, transform and material rather
+# than walking its vertices and map channels, so the cost stays the same however dense the meshes are.  The cache is
+# kept between sessions, so the key is made of values saved with the scene rather than anim handles.
+_content_hash_source = """
+fn rfExportContentHashes originals classes = (
+    local nodes = #()
+    local contents = #()
+    for o in originals where (findItem classes (classOf o)) > 0 do (
+        local stack = for md in o.modifiers collect (
+            ((classOf md) as string) + ":" + md.name + ":" + (md.enabled as string)
+        )
+        append nodes o
+        append contents #(
+            (classOf o) as string,
+            (getPolygonCount o) as string,
+            (o.min as string) + (o.max as string),
+            (o.objectOffsetPos as string) + (o.objectOffsetRot as string) + (o.objectOffsetScale as string),
+            o.transform as string,
+            stack as string,
+            o.material as string
+        )
+    )
+    #(nodes, contents)
+)
+"""
+
+
+def content_hashes(originals, classes, options):
+    """
+    Hashes what an exported file depends on: the face and vertex counts and bounding box of the geometry, object
+    offset, transform, modifier stack, material and the export options
+    :param originals: The selected nodes, objects which aren't one of the classes are skipped
+    :param classes: The classes which can be exported, from ExportFormat.resolve_classes()
+    :param options: A dictionary of the export format and options, anything json can encode
+    :return: A list of tuples of each exportable node and its hash
+    """
+    if len(originals) < 1:
+        return list()
+    collect = rFT.define_mxs_function(rt, "rfExportContentHashes", _content_hash_source)
+    nodes, contents = collect(rt.array(*originals), rt.array(*classes))
+
+    hashes = list()
+    for node, content in zip(nodes, contents):
+        data = json.dumps({"content": [str(c) for c in content], "options": options}, sort_keys=True)
+        hashes.append((node, hashlib.sha1(data.encode("utf-8")).hexdigest()))
+    return hashes
+
+# Finds what each exportable object shares with others in one call.  Instances share their base object, and
+# instanced modifiers and materials, so the anim handles of those make a key that is equal for objects which export
+# the same geometry.  The object offset moves the geometry away from the pivot, so instances which differ in it export
+# different files and it goes into the key too.  The transforms are collected alongside for the placements.
+_instance_keys_source = """
+fn rfExportInstanceKeys originals classes = (
+    local nodes = #()
+    local names = #()
+    local keys = #()
+    local transforms = #()
+    for o in originals where (findItem classes (classOf o)) > 0 do (
+        local key = (getHandleByAnim o.baseObject) as string
+        for md in o.modifiers do key += ":" + ((getHandleByAnim md) as string)
+        if o.material != undefined do key += "|" + ((getHandleByAnim o.material) as string)
+        key += "@" + (o.objectOffsetPos as string) + (o.objectOffsetRot as string) + (o.objectOffsetScale as string)
+        local t = o.transform
+        local p = t.translationPart
+        local r = t.rotationPart
+        local s = t.scalePart
+        append nodes o
+        append names o.name
+        append keys key
+        append transforms #(p.x, p.y, p.z, r.x, r.y, r.z, r.w, s.x, s.y, s.z)
+    )
+    #(nodes, names, keys, transforms)
+)
+"""
+
+
+def instance_groups(originals, classes):
+    """
+    Groups objects which would export the same geometry, one of each group is exported and the rest are placed
+    :param originals: The selected nodes, objects which aren't one of the classes are skipped
+    :param classes: The classes which can be exported, from ExportFormat.resolve_classes()
+    :return: A list of InstanceGroups in selection order, objects without instances are in a group of their own
+    """
+    if len(originals) < 1:
+        return list()
+    collect = rFT.define_mxs_function(rt, "rfExportInstanceKeys", _instance_keys_source)
+    nodes, names, keys, transforms = collect(rt.array(*originals), rt.array(*classes))
+
+    groups = list()
+    groups_by_key = dict()
+    for node, name, key, transform in zip(nodes, names, keys, transforms):
+        group = groups_by_key.get(str(key))
+        if group is None:
+            group = InstanceGroup()
+            groups_by_key[str(key)] = group
+            groups.append(group)
+        group.add(node, Placement.from_values(str(name), transform))
+    return groups
+
+
+def prep_clones(originals, classes, **kwargs):
+    """
+    Clones the exportable objects and prepares the clones for export
+    Translated from "3dsmax 2016 small export script" by lops, then batched into a single MaxScript call
+    http://www.scriptspot.com/3ds-max/scripts/3dsmax-2016-small-export-script
+    :param originals: The selected nodes, objects which aren't one of the classes are skipped
+    :param classes: The classes which can be exported, from ExportFormat.resolve_classes()
+    :param kwargs: rotate_for_unity, reset_x_forms, collapse_stack, pivot_to_origin and local_space, all off by
+    default.  local_space exports the object without its transform, for files shared by instances.
+    :return: A list of the clones, named after their originals, deleting them is left to the caller
+    """
+    if len(originals) < 1:
+        return list()
+    prep = rFT.define_mxs_function(rt, "rfPrepExportClones", _prep_clones_source)
+    clones = prep(
+        rt.array(*originals),
+        rt.array(*classes),
+        kwargs.get("rotate_for_unity", False),
+        kwargs.get("reset_x_forms", False),
+        kwargs.get("collapse_stack", False),
+        kwargs.get("pivot_to_origin", False),
+        kwargs.get("local_space", False)
+    )
+    return list(clones)
+
+
+def batch_executable():
+    """
+    :return: The path to 3dsmaxbatch, or None if this version of 3ds Max doesn't have it
+    """
+    path = os.path.join(str(rt.getDir(rt.name("maxroot"))), "3dsmaxbatch.exe")
+    return path if os.path.isfile(path) else None
+
+
+def _mxs_string(text):
+    return "\"{}\"".format(text.replace("\\", "\\\\").replace("\"", "\\\""))
+
+
+def _mxs_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return _mxs_string(str(value))
+
+
+class ExportFormat(object):
+    """
+    Everything QuickExporter needs to know about an export format
+    The exporter and its option function are looked up by name, so a format can be registered before, or without,
+    its plugin being loaded
+    """
+    def __init__(self, name, exporter_class, extension, options=None, option_function=None, classes=mesh_classes,
+                 file_template="{name}.{extension}"):
+        """
+        :param name: The name shown in the format list
+        :param exporter_class: The name of the MaxScript exporter plugin class
+        :param extension: The file extension, without the dot
+        :param options: A dictionary of exporter parameters set before every export
+        :param option_function: The name of the MaxScript function which sets a parameter from its name and value
+        :param classes: The names of the geometry classes the format exports
+        :param file_template: Formats the name of each exported file from the object name and the extension
+        """
+        self._name = name
+        self._exporter_class = exporter_class
+        self._extension = extension
+        self._options = options if options is not None else dict()
+        self._option_function = option_function
+        self._classes = tuple(classes)
+        self._file_template = file_template
+
+    def get_name(self):
+        return self._name
+
+    def get_exporter_class(self):
+        return self._exporter_class
+
+    def get_extension(self):
+        return self._extension
+
+    def get_options(self):
+        return dict(self._options)
+
+    def set_option(self, name, value):
+        self._options[name] = value
+
+    def get_classes(self):
+        return self._classes
+
+    def get_file_template(self):
+        return self._file_template
+
+    def get_exporter(self):
+        """
+        :return: The exporter plugin class, or None if it isn't loaded
+        """
+        return getattr(rt, self._exporter_class, None)
+
+    def is_available(self):
+        return self.get_exporter() is not None
+
+    def resolve_classes(self):
+        """
+        Looks up the geometry classes once, so each object is checked against class values rather than names
+        :return: A list of the classes this version of 3ds Max has
+        """
+        resolved = list()
+        for class_name in self._classes:
+            mxs_class = getattr(rt, class_name, None)
+            if mxs_class is not None:
+                resolved.append(mxs_class)
+        return resolved
+
+    def file_name(self, directory, object_name):
+        """
+        :param directory: The export directory
+        :param object_name: The name of the exported object
+        :return: The path of the file the object is exported to
+        """
+        return os.path.join(directory, self._file_template.format(name=object_name, extension=self._extension))
+
+    def apply_options(self):
+        """
+        Sets the exporter options in this session, before exporting without a worker
+        :return: None
+        """
+        if self._option_function is None:
+            return
+        set_param = getattr(rt, self._option_function, None)
+        if set_param is None:
+            mlg.warning("{0} is not available, {1} is exported with its last options".format(
+                self._option_function, self._name))
+            return
+        for name, value in sorted(self._options.items()):
+            set_param(name, value)
+
+    def options_script(self):
+        """
+        :return: The MaxScript which sets the exporter options, for the worker scripts
+        """
+        if self._option_function is None:
+            return str()
+        return "\n".join(["    {0} {1} {2}".format(self._option_function, _mxs_string(name), _mxs_value(value))
+                          for name, value in sorted(self._options.items())])
+
+    def to_dict(self):
+        """
+        :return: What an exported file depends on, for the content hash
+        """
+        return {
+            "name": self._name,
+            "exporter": self._exporter_class,
+            "options": self._options,
+            "file_template": self._file_template
+        }
+
+    def __str__(self):
+        return "{0}: {1} (*.{2})".format(self._name, self._exporter_class, self._extension)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+# Export formats by name, in the order they are listed
+_formats = list()
+
+
+def register_format(export_format):
+    """
+    Adds an export format, or replaces the one with the same name
+    :param export_format: An ExportFormat
+    :return: None
+    """
+    _formats[:] = [f for f in _formats if f.get_name() != export_format.get_name()]
+    _formats.append(export_format)
+
+
+def get_formats(available_only=True):
+    """
+    :param available_only: Leave out formats whose exporter plugin isn't loaded
+    :return: A list of the registered ExportFormats
+    """
+    return [f for f in _formats if not available_only or f.is_available()]
+
+
+def get_format(name):
+    """
+    :param name: The name of a registered format
+    :return: The ExportFormat or None
+    """
+    for export_format in _formats:
+        if export_format.get_name() == name:
+            return export_format
+    return None
+
+
+def get_format_for_file(file_name):
+    """
+    :param file_name: The name or path of an exported file
+    :return: The first available format with the file's extension, or None
+    """
+    extension = os.path.splitext(file_name)[1].lstrip(".").lower()
+    for export_format in get_formats():
+        if export_format.get_extension().lower() == extension:
+            return export_format
+    return None
+
+
+register_format(ExportFormat("FBX", "FBXEXP", "fbx", option_function="FBXExporterSetParam", options={
+    "FileVersion": "FBX201800",
+    "SmoothingGroups": True,
+    "Triangulate": False,
+    "Animation": False,
+    "Cameras": False,
+    "Lights": False,
+    "EmbedTextures": False
+}))
+register_format(ExportFormat("OBJ", "ObjExp", "obj"))
+register_format(ExportFormat("DAE", "DAEEXP", "dae", option_function="FBXExporterSetParam", options={
+    "SmoothingGroups": True,
+    "Triangulate": False
+}))
+
+
+class Placement(object):
+    """
+    Where an instance sits in the scene, in 3ds Max world space and units
+    """
+    def __init__(self, name, position, rotation, scale):
+        """
+        :param name: The name of the instance
+        :param position: A list of x, y, z
+        :param rotation: A quaternion as a list of x, y, z, w, as 3ds Max stores it
+        :param scale: A list of x, y, z
+        """
+        self._name = name
+        self._position = list(position)
+        self._rotation = list(rotation)
+        self._scale = list(scale)
+
+    @classmethod
+    def from_values(cls, name, values):
+        """
+        :param name: The name of the instance
+        :param values: The ten floats from rfExportInstanceKeys, position, rotation then scale
+        :return: A Placement
+        """
+        values = [float(v) for v in values]
+        return cls(name, values[0:3], values[3:7], values[7:10])
+
+    def get_name(self):
+        return self._name
+
+    def get_position(self):
+        return self._position
+
+    def get_rotation(self):
+        return self._rotation
+
+    def get_scale(self):
+        return self._scale
+
+    def to_dict(self):
+        return {
+            "name": self._name,
+            "position": self._position,
+            "rotation": self._rotation,
+            "scale": self._scale
+        }
+
+    def __str__(self):
+        return "{0}: {1}".format(self._name, self._position)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class InstanceGroup(object):
+    """
+    Objects which export the same geometry, the first one is exported for all of them
+    """
+    def __init__(self):
+        self._nodes = list()
+        self._placements = list()
+
+    def add(self, node, placement):
+        self._nodes.append(node)
+        self._placements.append(placement)
+
+    def get_representative(self):
+        return self._nodes[0]
+
+    def get_nodes(self):
+        return list(self._nodes)
+
+    def get_placements(self):
+        return list(self._placements)
+
+    def is_instanced(self):
+        return len(self._nodes) > 1
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __str__(self):
+        return "{0}: {1} instances".format(self._placements[0].get_name(), len(self._nodes))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class PlacementManifest(object):
+    """
+    The placements of every instanced object exported to a directory, for the importer on the engine side
+    Kept in a json file inside the directory, with the placements listed under the name of the shared file
+    """
+    def __init__(self, directory):
+        self._clg = logging.getLogger("renderFarming.Export.PlacementManifest")
+
+        self._file_path = os.path.join(directory, placements_file_name)
+        self._files = dict()
+
+        self._read()
+
+    def _read(self):
+        if not os.path.isfile(self._file_path):
+            return
+        try:
+            with open(self._file_path, 'r') as manifest_file:
+                self._files = dict(json.load(manifest_file).get("files", dict()))
+        except (IOError, ValueError, AttributeError) as e:
+            self._clg.error("Unable to read the placement manifest {0}: {1}".format(self._file_path, e))
+
+    def save(self):
+        """
+        Writes the manifest to a temporary file and swaps it in, so the importer never reads a half written one
+        :return: True for success, False for failure
+        """
+        temp_path = self._file_path + ".tmp"
+        try:
+            with open(temp_path, 'w') as manifest_file:
+                json.dump({"units": str(rt.units.SystemType), "files": self._files}, manifest_file, indent=4,
+                          sort_keys=True)
+            if os.path.isfile(self._file_path):
+                os.remove(self._file_path)
+            os.rename(temp_path, self._file_path)
+            return True
+        except (IOError, OSError) as e:
+            self._clg.error("IO Error, Failed to write the placement manifest {0}: {1}".format(self._file_path, e))
+            return False
+
+    def get_file_path(self):
+        return self._file_path
+
+    def set_placements(self, file_name, placements):
+        """
+        :param file_name: The path to the shared file
+        :param placements: A list of Placements
+        :return: None
+        """
+        self._files[os.path.basename(file_name)] = [p.to_dict() for p in placements]
+
+    def remove(self, file_name):
+        self._files.pop(os.path.basename(file_name), None)
+
+    def __len__(self):
+        return len(self._files)
+
+    def __str__(self):
+        return "{0}: {1} files".format(self._file_path, len(self._files))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ExportCache(object):
+    """
+    The content hash of every file exported to a directory, kept in a json file inside it
+    Files are keyed by name, so the directory can be moved or shared without losing the cache
+    """
+    def __init__(self, directory):
+        self._clg = logging.getLogger("renderFarming.Export.ExportCache")
+
+        self._directory = directory
+        self._file_path = os.path.join(directory, cache_file_name)
+        self._hashes = dict()
+
+        self._read()
+
+    def _read(self):
+        if not os.path.isfile(self._file_path):
+            return
+        try:
+            with open(self._file_path, 'r') as cache_file:
+                self._hashes = dict(json.load(cache_file).get("files", dict()))
+            self._clg.debug("Read {0} export hashes from {1}".format(len(self._hashes), self._file_path))
+        except (IOError, ValueError, AttributeError) as e:
+            self._clg.error("Unable to read the export cache {0}: {1}".format(self._file_path, e))
+
+    def save(self):
+        """
+        Writes the cache to a temporary file and swaps it in, so an interrupted save doesn't lose every entry
+        :return: True for success, False for failure
+        """
+        temp_path = self._file_path + ".tmp"
+        try:
+            with open(temp_path, 'w') as cache_file:
+                json.dump({"files": self._hashes}, cache_file, indent=4, sort_keys=True)
+            if os.path.isfile(self._file_path):
+                os.remove(self._file_path)
+            os.rename(temp_path, self._file_path)
+            return True
+        except (IOError, OSError) as e:
+            self._clg.error("IO Error, Failed to write the export cache {0}: {1}".format(self._file_path, e))
+            return False
+
+    def get_file_path(self):
+        return self._file_path
+
+    def is_current(self, file_name, content_hash):
+        """
+        Checks if a file was exported from the same content and still exists
+        :param file_name: The path to the exported file
+        :param content_hash: The hash from content_hashes()
+        :return: True if the file doesn't need to be exported again
+        """
+        return self._hashes.get(os.path.basename(file_name)) == content_hash and os.path.isfile(file_name)
+
+    def set_hash(self, file_name, content_hash):
+        self._hashes[os.path.basename(file_name)] = content_hash
+
+    def remove(self, file_name):
+        self._hashes.pop(os.path.basename(file_name), None)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __str__(self):
+        return "{0}: {1} files".format(self._file_path, len(self._hashes))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ExportChunk(object):
+    """
+    A scene of prepared objects and the script which exports them
+    """
+    def __init__(self, scene_file, script_file, progress_file, outputs):
+        self._scene_file = scene_file
+        self._script_file = script_file
+        self._progress_file = progress_file
+        self._outputs = outputs
+
+    def get_scene_file(self):
+        return self._scene_file
+
+    def get_script_file(self):
+        return self._script_file
+
+    def get_progress_file(self):
+        return self._progress_file
+
+    def get_outputs(self):
+        """
+        :return: A list of the files the chunk exports
+        """
+        return self._outputs
+
+    def read_progress(self):
+        """
+        :return: A tuple of the lists of exported and failed files so far
+        """
+        exported = list()
+        failed = list()
+        try:
+            with open(self._progress_file, 'r') as progress:
+                for line in progress:
+                    status, sep, file_name = line.rstrip("\r\n").partition("\t")
+                    if sep:
+                        (exported if status == "ok" else failed).append(file_name)
+        except IOError:
+            pass
+        return exported, failed
+
+    def __str__(self):
+        return "{0}: {1} objects".format(self._scene_file, len(self._outputs))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def write_chunks(clones, outputs, directory, export_format, chunk_size):
+    """
+    Saves prepared objects into chunk scenes, along with the scripts the workers run on them
+    :param clones: The prepared nodes, deleting them afterwards is left to the caller
+    :param outputs: The file each node is exported to, in the same order
+    :param directory: An empty folder for the chunks
+    :param export_format: An ExportFormat
+    :param chunk_size: The number of objects in each chunk
+    :return: A list of ExportChunk objects
+    """
+    chunks = list()
+    for index, start in enumerate(range(0, len(clones), chunk_size)):
+        nodes = clones[start:start + chunk_size]
+        files = outputs[start:start + chunk_size]
+
+        for node, file_name in zip(nodes, files):
+            rt.setUserProp(node, export_property, file_name)
+
+        name = "chunk_{:04d}".format(index)
+        scene_file = os.path.join(directory, name + ".max")
+        script_file = os.path.join(directory, name + ".ms")
+        progress_file = os.path.join(directory, name + ".txt")
+
+        rt.saveNodes(nodes, scene_file, quiet=True)
+
+        with open(script_file, 'w') as script:
+            script.write(_worker_script_template.format(
+                progress_file=_mxs_string(progress_file),
+                options=export_format.options_script(),
+                export_property=export_property,
+                export_class=export_format.get_exporter_class()
+            ))
+
+        chunks.append(ExportChunk(scene_file, script_file, progress_file, files))
+    return chunks
+
+
+def create_pool(clones, outputs, export_format, max_workers):
+    """
+    Saves prepared objects as chunks in a temp directory and creates the pool which exports them
+    :param clones: The prepared nodes, deleting them afterwards is left to the caller
+    :param outputs: The file each node is exported to, in the same order
+    :param export_format: An ExportFormat
+    :param max_workers: The number of workers that can run at once
+    :return: An ExportPool, or None if 3dsmaxbatch isn't available
+    """
+    executable = batch_executable()
+    if executable is None:
+        mlg.info("3dsmaxbatch is not available, objects will be exported one at a time")
+        return None
+
+    directory = tempfile.mkdtemp(prefix="rfExport")
+    chunk_size = max(1, int(math.ceil(len(clones) / float(max(1, max_workers) * chunks_per_worker))))
+    try:
+        chunks = write_chunks(clones, outputs, directory, export_format, chunk_size)
+    except (IOError, RuntimeError) as e:
+        mlg.error("Unable to save the export chunks to {0}: {1}".format(directory, e))
+        shutil.rmtree(directory, ignore_errors=True)
+        return None
+
+    mlg.info("Exporting {0} objects in {1} chunks with {2} workers".format(len(clones), len(chunks), max_workers))
+    return ExportPool(executable, chunks, max_workers, directory)
+
+
+class ExportPool(object):
+    """
+    Runs a 3dsmaxbatch worker for each chunk, with no more than max_workers at a time
+    Nothing blocks, the owner calls poll() regularly, from a QTimer for example, to start workers as others finish
+    """
+    def __init__(self, executable, chunks, max_workers, temp_directory=None):
+        """
+        :param executable: The path to 3dsmaxbatch
+        :param chunks: A list of ExportChunk objects
+        :param max_workers: The number of workers that can run at once
+        :param temp_directory: Removed once every worker has finished or the export is cancelled
+        """
+        self._clg = logging.getLogger("renderFarming.Export.ExportPool")
+
+        self._executable = executable
+        self._pending = list(chunks)
+        self._chunks = list(chunks)
+        self._max_workers = max(1, max_workers)
+        self._temp_directory = temp_directory
+
+        self._running = list()
+        self._results = dict()
+        self._cancelled = False
+
+    def _start(self, chunk):
+        self._clg.debug("Starting worker for {}".format(chunk))
+        kwargs = {"creationflags": _create_no_window} if os.name == "nt" else dict()
+        try:
+            process = subprocess.Popen(
+                [self._executable, chunk.get_script_file(), "-sceneFile", chunk.get_scene_file()], **kwargs
+            )
+        except OSError as e:
+            self._clg.error("Unable to start {0}: {1}".format(self._executable, e))
+            self._results[id(chunk)] = (list(), list(chunk.get_outputs()))
+            return
+        self._running.append((chunk, process))
+
+    def _finish(self, chunk, code):
+        """
+        Records what a worker exported, since the progress files are removed with the temp directory
+        """
+        exported, failed = chunk.read_progress()
+        # A worker which quit part way leaves files without an entry in its progress file
+        if len(exported) + len(failed) < len(chunk.get_outputs()) and not self._cancelled:
+            self._clg.error("Worker for {0} stopped with code {1}".format(chunk, code))
+            failed = [f for f in chunk.get_outputs() if f not in exported]
+        self._results[id(chunk)] = (exported, failed)
+
+    def _cleanup(self):
+        if self._temp_directory is not None:
+            shutil.rmtree(self._temp_directory, ignore_errors=True)
+            self._temp_directory = None
+
+    def poll(self):
+        """
+        Collects finished workers and starts new ones
+        :return: True once every worker has finished
+        """
+        still_running = list()
+        for chunk, process in self._running:
+            code = process.poll()
+            if code is None:
+                still_running.append((chunk, process))
+            else:
+                self._finish(chunk, code)
+        self._running = still_running
+
+        while not self._cancelled and len(self._pending) > 0 and len(self._running) < self._max_workers:
+            self._start(self._pending.pop(0))
+
+        finished = len(self._running) == 0 and (self._cancelled or len(self._pending) == 0)
+        if finished:
+            self._cleanup()
+        return finished
+
+    def cancel(self):
+        """
+        Stops the running workers, objects they already exported are kept
+        :return: None
+        """
+        self._cancelled = True
+        self._pending = list()
+        for chunk, process in self._running:
+            if process.poll() is None:
+                process.kill()
+            self._finish(chunk, process.wait())
+        self._running = list()
+        self._cleanup()
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def get_total(self):
+        return sum([len(c.get_outputs()) for c in self._chunks])
+
+    def get_progress(self):
+        """
+        :return: A tuple of the lists of exported and failed files so far, a crashed worker fails its whole chunk
+        """
+        exported = list()
+        failed = list()
+        for chunk in self._chunks:
+            chunk_exported, chunk_failed = self._results.get(id(chunk)) or chunk.read_progress()
+            exported.extend(chunk_exported)
+            failed.extend(chunk_failed)
+        return exported, failed
@@ -0,0 +1,620 @@
+import os
+import re
+import bisect
+import logging
+
+mlg = logging.getLogger("renderFarming.Frames")
+
+
+_part_pattern = re.compile(r"^(-?\d+)(?:-(-?\d+)(?:x(\d+))?)?$")
+
+
+def compact_frames(frames):
+    """
+    Formats frame numbers the way 3ds Max's pickup frames field expects them
+    :param frames: An iterable of integer frame numbers, or a FrameSet
+    :return: A string like "1-5,9,12-14"
+    """
+    return FrameSet(frames).to_pickup()
+
+
+def expand_frames(text):
+    """
+    Reads frame numbers written the way 3ds Max's pickup frames field expects them
+    :param text: A string like "1-5,9,12-14", spaces are ignored
+    :return: A sorted list of integer frame numbers
+    :raises ValueError: If the string isn't a list of frames and ranges
+    """
+    return list(FrameSet.parse(text))
+
+
+class FrameSet(object):
+    """
+    A set of frame numbers stored as sorted, non overlapping ranges
+    Whole shots are a single range no matter how long they are, so padding, splitting and the set operations work
+    on the ranges rather than on every frame.  Sets made with a step, like every Nth frame, store a range per frame.
+    Frame sets print with steps, "1-99x2,150,200-210", and to_pickup() writes the plain form 3ds Max reads.
+    """
+    def __init__(self, frames=()):
+        """
+        :param frames: An iterable of integer frame numbers, or another FrameSet
+        """
+        if isinstance(frames, FrameSet):
+            self._ranges = list(frames.get_ranges())
+            return
+
+        self._ranges = list()
+        for frame in sorted(set(frames)):
+            if len(self._ranges) > 0 and frame == self._ranges[-1][1] + 1:
+                self._ranges[-1] = (self._ranges[-1][0], frame)
+            else:
+                self._ranges.append((frame, frame))
+
+    @classmethod
+    def _from_ranges(cls, ranges):
+        """
+        :param ranges: A list of (start, end) tuples in any order, overlapping and touching ranges are joined
+        :return: A new FrameSet
+        """
+        frame_set = cls()
+        for start, end in sorted(ranges):
+            if end < start:
+                continue
+            if len(frame_set._ranges) > 0 and start <= frame_set._ranges[-1][1] + 1:
+                last_start, last_end = frame_set._ranges[-1]
+                frame_set._ranges[-1] = (last_start, max(last_end, end))
+            else:
+                frame_set._ranges.append((start, end))
+        return frame_set
+
+    @classmethod
+    def _from_sorted(cls, ranges):
+        """
+        :param ranges: A list of sorted (start, end) tuples which neither overlap nor touch, used as is
+        :return: A new FrameSet
+        """
+        frame_set = cls()
+        frame_set._ranges = ranges
+        return frame_set
+
+    @classmethod
+    def from_range(cls, start, end, step=1):
+        """
+        :param start: The first frame, inclusive
+        :param end: The last frame, inclusive
+        :param step: Only every step'th frame from the start is included
+        :return: A new FrameSet, empty if end is before start
+        """
+        if step <= 1:
+            return cls._from_ranges([(start, end)])
+        return cls._from_sorted([(f, f) for f in xrange(start, end + 1, step)])
+
+    @classmethod
+    def parse(cls, text):
+        """
+        :param text: Frames and ranges separated by commas, ranges can have a step: "1-100x2,150,200-210".  Spaces
+                     are ignored and reversed ranges are read forwards.
+        :return: A new FrameSet
+        :raises ValueError: If the string isn't a list of frames and ranges
+        """
+        ranges = list()
+        for part in text.replace(" ", "").split(","):
+            if part == "":
+                continue
+            match = _part_pattern.match(part)
+            if match is None:
+                raise ValueError("\"{0}\" in \"{1}\" is not a frame or range".format(part, text))
+
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) is not None else start
+            step = int(match.group(3)) if match.group(3) is not None else 1
+            if step < 1:
+                raise ValueError("\"{0}\" in \"{1}\" has a step below 1".format(part, text))
+
+            start, end = min(start, end), max(start, end)
+            if step == 1:
+                ranges.append((start, end))
+            else:
+                ranges.extend([(f, f) for f in xrange(start, end + 1, step)])
+        return cls._from_ranges(ranges)
+
+    def get_ranges(self):
+        """
+        :return: A list of (start, end) tuples, both inclusive
+        """
+        return self._ranges
+
+    def first(self):
+        """
+        :return: The lowest frame, or None if the set is empty
+        """
+        return self._ranges[0][0] if len(self._ranges) > 0 else None
+
+    def last(self):
+        """
+        :return: The highest frame, or None if the set is empty
+        """
+        return self._ranges[-1][1] if len(self._ranges) > 0 else None
+
+    def union(self, other):
+        return FrameSet._from_ranges(self._ranges + FrameSet(other).get_ranges())
+
+    def intersection(self, other):
+        other_ranges = FrameSet(other).get_ranges()
+        ranges = list()
+        i = j = 0
+        while i < len(self._ranges) and j < len(other_ranges):
+            start = max(self._ranges[i][0], other_ranges[j][0])
+            end = min(self._ranges[i][1], other_ranges[j][1])
+            if start <= end:
+                ranges.append((start, end))
+            # Whichever range ends first can't overlap anything else
+            if self._ranges[i][1] < other_ranges[j][1]:
+                i += 1
+            else:
+                j += 1
+        # Pieces of ranges which don't touch can't touch each other
+        return FrameSet._from_sorted(ranges)
+
+    def difference(self, other):
+        other_ranges = FrameSet(other).get_ranges()
+        ranges = list()
+        j = 0
+        for start, end in self._ranges:
+            # Skips the ranges that end before this one starts
+            while j < len(other_ranges) and other_ranges[j][1] < start:
+                j += 1
+            k = j
+            while k < len(other_ranges) and other_ranges[k][0] <= end:
+                if other_ranges[k][0] > start:
+                    ranges.append((start, other_ranges[k][0] - 1))
+                start = max(start, other_ranges[k][1] + 1)
+                k += 1
+            if start <= end:
+                ranges.append((start, end))
+        return FrameSet._from_sorted(ranges)
+
+    def pad(self, before, after=None):
+        """
+        :param before: The number of frames added in front of every range
+        :param after: The number of frames added after every range, the same as before if None
+        :return: A new FrameSet
+        """
+        after = before if after is None else after
+        return FrameSet._from_ranges([(s - before, e + after) for s, e in self._ranges])
+
+    def sample(self, increment, pad=False):
+        """
+        Picks every increment'th frame counting from the first frame, the way Every Nth Frame does
+        :param increment: The distance between the picked frames
+        :param pad: Adds the next increment after the last frame if the last frame wasn't picked, so the whole set
+                    is covered
+        :return: A new FrameSet
+        """
+        if len(self._ranges) == 0:
+            return FrameSet()
+
+        origin = self.first()
+        frames = list()
+        for start, end in self._ranges:
+            # The first picked frame at or after the start of the range
+            first = start + (origin - start) % increment
+            frames.extend(xrange(first, end + 1, increment))
+
+        if pad and (len(frames) == 0 or frames[-1] != self.last()):
+            last = self.last()
+            frames.append(last + (origin - last) % increment)
+        return FrameSet(frames)
+
+    def chunks(self, count):
+        """
+        Splits the set into contiguous chunks with nearly equal numbers of frames, the first chunks take the remainder
+        :param count: The number of chunks, fewer are returned if the set is smaller
+        :return: A list of FrameSets in frame order
+        """
+        length = len(self)
+        count = max(1, min(count, length))
+        size, remainder = divmod(length, count)
+
+        chunks = list()
+        j = 0
+        # The part of the current range that hasn't been given to a chunk yet
+        start = self._ranges[0][0] if length > 0 else None
+        for i in xrange(count):
+            wanted = size + (1 if i < remainder else 0)
+            chunk = list()
+            while wanted > 0 and j < len(self._ranges):
+                end = self._ranges[j][1]
+                if end - start + 1 <= wanted:
+                    chunk.append((start, end))
+                    wanted -= end - start + 1
+                    j += 1
+                    start = self._ranges[j][0] if j < len(self._ranges) else None
+                else:
+                    chunk.append((start, start + wanted - 1))
+                    start += wanted
+                    wanted = 0
+            chunks.append(FrameSet._from_ranges(chunk))
+        return chunks
+
+    def to_pickup(self):
+        """
+        :return: The frames formatted for 3ds Max's pickup frames field, "1-5,9,12-14"
+        """
+        return ",".join([str(s) if s == e else "{0}-{1}".format(s, e) for s, e in self._ranges])
+
+    def __str__(self):
+        parts = list()
+        i = 0
+        while i < len(self._ranges):
+            start, end = self._ranges[i]
+            if start != end:
+                parts.append("{0}-{1}".format(start, end))
+                i += 1
+                continue
+
+            # Single frames an equal distance apart are written as a stepped range
+            j = i + 1
+            step = self._ranges[j][0] - start if j < len(self._ranges) else 0
+            while (j < len(self._ranges) and self._ranges[j][0] == self._ranges[j][1] and
+                   self._ranges[j][0] - self._ranges[j - 1][0] == step):
+                j += 1
+
+            if j - i >= 3:
+                parts.append("{0}-{1}x{2}".format(start, self._ranges[j - 1][0], step))
+                i = j
+            else:
+                parts.append(str(start))
+                i += 1
+        return ",".join(parts)
+
+    def __repr__(self):
+        return "FrameSet(\"{}\")".format(self.__str__())
+
+    def __len__(self):
+        return sum([e - s + 1 for s, e in self._ranges])
+
+    def __nonzero__(self):
+        return len(self._ranges) > 0
+
+    def __iter__(self):
+        for start, end in self._ranges:
+            for frame in xrange(start, end + 1):
+                yield frame
+
+    def __contains__(self, frame):
+        i = bisect.bisect_right(self._ranges, (frame, float("inf"))) - 1
+        return i >= 0 and self._ranges[i][0] <= frame <= self._ranges[i][1]
+
+    def __eq__(self, other):
+        return isinstance(other, FrameSet) and self._ranges == other.get_ranges()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+
+class PrepassFrameIndex(object):
+    """
+    An index of the per frame irradiance maps written by an animation prepass
+    The folder is listed once and the frame numbers are parsed from the file names, so checking a sequence for gaps
+    doesn't stat every frame over the network
+    V-Ray appends the frame number to the file name it is given, ex: shot01_frame_.vrmap -> shot01_frame_0001.vrmap
+    """
+    def __init__(self, folder, prefix, extension=".vrmap"):
+        self._clg = logging.getLogger("renderFarming.Frames.PrepassFrameIndex")
+
+        self._folder = folder
+        self._prefix = prefix
+        self._extension = extension
+        self._frames = dict()
+
+        self._pattern = re.compile(
+            r"^{0}(-?\d+){1}$".format(re.escape(prefix), re.escape(extension)), re.IGNORECASE
+        )
+
+        self._scan()
+
+    def _scan(self):
+        try:
+            file_names = os.listdir(self._folder)
+        except os.error as e:
+            self._clg.warning("Unable to list the animation prepass folder {0}: {1}".format(self._folder, e))
+            return
+
+        for file_name in file_names:
+            match = self._pattern.match(file_name)
+            if match is not None:
+                self._frames[int(match.group(1))] = file_name
+
+        self._clg.debug("Indexed {0} prepass frames in {1}".format(len(self._frames), self._folder))
+
+    def get_folder(self):
+        return self._folder
+
+    def get_prefix(self):
+        return self._prefix
+
+    def get_frames(self):
+        return sorted(self._frames.keys())
+
+    def get_file(self, frame):
+        """
+        :param frame: An integer frame number
+        :return: The full path to the frame's irradiance map, or None if it hasn't been rendered
+        """
+        file_name = self._frames.get(frame)
+        return os.path.join(self._folder, file_name) if file_name is not None else None
+
+    def has_frame(self, frame):
+        return frame in self._frames
+
+    def missing(self, start, end):
+        """
+        Finds the frames in a range that have no irradiance map
+        :param start: The first frame, inclusive
+        :param end: The last frame, inclusive
+        :return: A sorted list of frame numbers
+        """
+        return list(FrameSet.from_range(start, end) - FrameSet(self._frames.keys()))
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __str__(self):
+        return "{0}{1}: {2}".format(os.path.join(self._folder, self._prefix), self._extension,
+                                    compact_frames(self._frames.keys()))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class FrameSequence(object):
+    """
+    A numbered image sequence, described by the text on either side of the frame number
+    Dots between the prefix and the frame number are ignored since V-Ray adds one when splitting channels
+        ex: FrameSequence("beauty", "C:\\frames", "frame_", ".exr") matches frame_0001.exr
+    The validator is an optional callable taking a file path and returning a list of problems with the file
+    """
+    def __init__(self, name, folder, prefix, suffix, validator=None):
+        self._name = name
+        self._folder = folder
+        self._prefix = prefix.rstrip(".")
+        self._suffix = suffix
+        self._validator = validator
+
+    def get_name(self):
+        return self._name
+
+    def get_folder(self):
+        return self._folder
+
+    def get_prefix(self):
+        return self._prefix
+
+    def get_suffix(self):
+        return self._suffix
+
+    def get_validator(self):
+        return self._validator
+
+    def get_key(self):
+        return self._prefix.lower(), self._suffix.lower()
+
+    def __str__(self):
+        return "{0}: {1}####{2}".format(self._name, os.path.join(self._folder, self._prefix), self._suffix)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class SequenceScanResult(object):
+    """
+    The problems found in a single sequence
+    """
+    def __init__(self, sequence, found, missing, empty, truncated, invalid=None):
+        self._sequence = sequence
+        self._found = found
+        self._missing = missing
+        self._empty = empty
+        self._truncated = truncated
+        self._invalid = invalid if invalid is not None else dict()
+
+    def get_sequence(self):
+        return self._sequence
+
+    def get_found(self):
+        return self._found
+
+    def get_missing(self):
+        return self._missing
+
+    def get_empty(self):
+        return self._empty
+
+    def get_truncated(self):
+        return self._truncated
+
+    def get_invalid(self):
+        """
+        :return: A dictionary of frame number to the list of problems the validator found
+        """
+        return self._invalid
+
+    def get_broken(self):
+        return sorted(set(self._missing + self._empty + self._truncated + list(self._invalid.keys())))
+
+    def is_complete(self):
+        return len(self.get_broken()) == 0
+
+    def __str__(self):
+        return "{0} - Missing: {1} Empty: {2} Truncated: {3} Invalid: {4}".format(
+            self._sequence.get_name(),
+            compact_frames(self._missing),
+            compact_frames(self._empty),
+            compact_frames(self._truncated),
+            compact_frames(self._invalid.keys())
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class FrameScanner(object):
+    """
+    Checks rendered sequences for missing, empty and truncated frames
+    Each folder is listed once, and file names are matched to sequences with a dictionary lookup, so the beauty and
+    every render element are checked in a single pass over the folder
+    Only the expected frames are stat'ed for their size.  A frame smaller than truncated_ratio times the median
+    size of its sequence is treated as truncated.  Sequences with a validator have every non empty frame checked
+    by it as well.
+    """
+    _digits_pattern = re.compile(r"\d+$")
+
+    def __init__(self, sequences, frames, truncated_ratio=0.25):
+        """
+        :param sequences: A list of FrameSequence objects
+        :param frames: A FrameSet or list of the frame numbers that should have been rendered
+        :param truncated_ratio: The fraction of the median file size below which a frame is truncated, 0 disables
+        """
+        self._clg = logging.getLogger("renderFarming.Frames.FrameScanner")
+
+        self._sequences = sequences
+        self._frames = FrameSet(frames)
+        self._truncated_ratio = truncated_ratio
+        self._results = list()
+
+        self._scan()
+
+    def _list_folder(self, folder, sequences):
+        """
+        Lists a folder and sorts its files into sequences
+        :param folder: The folder to list
+        :param sequences: The sequences expected in this folder
+        :return: A dictionary of sequence key to a dictionary of frame number to file name
+        """
+        found = dict([(s.get_key(), dict()) for s in sequences])
+
+        try:
+            file_names = os.listdir(folder)
+        except os.error as e:
+            self._clg.warning("Unable to list the frames folder {0}: {1}".format(folder, e))
+            return found
+
+        for file_name in file_names:
+            base, ext = os.path.splitext(file_name)
+            ext = ext.lower()
+            match = self._digits_pattern.search(base)
+            if match is None:
+                continue
+
+            # Element names can end in digits too, so each split of the trailing digits is tried against the
+            # known sequences
+            digits = match.group(0)
+            for i in range(len(digits)):
+                stem = base[:match.start() + i]
+                frame = int(digits[i:])
+                if stem.endswith("-"):
+                    frames = found.get((stem[:-1].rstrip(".").lower(), ext))
+                    if frames is not None:
+                        frames[-frame] = file_name
+                        break
+                frames = found.get((stem.rstrip(".").lower(), ext))
+                if frames is not None:
+                    frames[frame] = file_name
+                    break
+
+        return found
+
+    def _check_sizes(self, folder, files):
+        """
+        :param folder: The sequence's folder
+        :param files: A dictionary of frame number to file name for the expected frames that exist
+        :return: A tuple of the empty frames and the truncated frames
+        """
+        sizes = dict()
+        for frame, file_name in files.items():
+            try:
+                sizes[frame] = os.path.getsize(os.path.join(folder, file_name))
+            except os.error:
+                sizes[frame] = 0
+
+        empty = sorted([f for f, size in sizes.items() if size == 0])
+
+        truncated = list()
+        non_empty = sorted([size for size in sizes.values() if size > 0])
+        # The median needs enough frames to mean anything
+        if self._truncated_ratio > 0 and len(non_empty) >= 3:
+            limit = non_empty[len(non_empty) // 2] * self._truncated_ratio
+            truncated = sorted([f for f, size in sizes.items() if 0 < size < limit])
+
+        return empty, truncated
+
+    # noinspection PyMethodMayBeStatic
+    def _validate(self, sequence, files, empty):
+        """
+        :param sequence: The FrameSequence, skipped if it has no validator
+        :param files: A dictionary of frame number to file name for the expected frames that exist
+        :param empty: The frames already known to be empty
+        :return: A dictionary of frame number to a list of problems
+        """
+        validator = sequence.get_validator()
+        invalid = dict()
+        if validator is None:
+            return invalid
+
+        for frame, file_name in files.items():
+            if frame in empty:
+                continue
+            problems = validator(os.path.join(sequence.get_folder(), file_name))
+            if len(problems) > 0:
+                invalid[frame] = problems
+        return invalid
+
+    def _scan(self):
+        by_folder = dict()
+        for sequence in self._sequences:
+            by_folder.setdefault(os.path.normcase(sequence.get_folder()), list()).append(sequence)
+
+        for folder, sequences in by_folder.items():
+            found = self._list_folder(sequences[0].get_folder(), sequences)
+
+            for sequence in sequences:
+                files = found[sequence.get_key()]
+                expected = dict([(f, files[f]) for f in self._frames if f in files])
+                missing = [f for f in self._frames if f not in files]
+                empty, truncated = self._check_sizes(sequence.get_folder(), expected)
+                invalid = self._validate(sequence, expected, empty)
+
+                result = SequenceScanResult(sequence, sorted(expected.keys()), missing, empty, truncated, invalid)
+                self._clg.debug(str(result))
+                self._results.append(result)
+
+    def get_results(self):
+        return self._results
+
+    def get_broken_frames(self):
+        """
+        :return: A sorted list of every frame that needs to be rendered again, in any sequence
+        """
+        broken = set()
+        for result in self._results:
+            broken.update(result.get_broken())
+        return sorted(broken)
+
+    def is_complete(self):
+        return all([result.is_complete() for result in self._results])
+
+    def __str__(self):
+        return compact_frames(self.get_broken_frames())
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,525 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.GICache")
+
+# The extension of the record written next to each cache file
+record_extension = ".rfgi"
+
+# The file types managed by the cache manager
+cache_extensions = (".vrmap", ".vrlmap")
+
+# Network shares can store modified times with as little as two seconds of precision
+mtime_tolerance = 2.0
+
+# The pre-render scripts written for merge jobs end with this, so Spinach can recognise and remove them
+merge_script_suffix = "_rfmerge.ms"
+
+# The pre-render scripts written for beauty jobs which check their prepass finished end with this
+check_script_suffix = "_rfcheck.ms"
+
+# V-Ray settings that change the contents of the irradiance map or light cache.  The GI engines, modes and file names
+# are left out since Spinach sets those itself from the render type, which the fingerprint hashes, and the fingerprint
+# is read before they are set so they would still hold whatever pass was prepared last.
+gi_properties = (
+    "gi_on", "gi_saturation", "gi_contrast", "gi_contrast_base",
+    "gi_rayDistanceOn", "gi_rayDistance", "environment_gi_on",
+    "gi_irradmap_preset", "gi_irradmap_minRate", "gi_irradmap_maxRate", "gi_irradmap_subdivs",
+    "gi_irradmap_interpSamples", "gi_irradmap_interpFrames", "gi_irradmap_colorThreshold",
+    "gi_irradmap_normalThreshold", "gi_irradmap_distThreshold", "gi_irradmap_detail_on",
+    "lightcache_subdivs", "lightcache_sampleSize", "lightcache_scale", "lightcache_filter_type",
+    "lightcache_retrace_on", "lightcache_retrace_threshold",
+)
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Reads the GI settings and the scene state in one call instead of a round trip per property.  Each renderable object
+# is reduced to a cheap key of its class and modifiers, face and vertex counts, bounding box, transform, material and
+# hidden state rather than walking its vertices, so moving, editing or hiding it changes the fingerprint while saving
+# the file again doesn't.  The records outlive the session, so the key is made of values saved with the scene rather
+# than anim handles.
+_fingerprint_source = """
+fn rfGIFingerprintValues props cam = (
+    local r = renderers.current
+    local settings = for p in props collect (
+        if isProperty r p then (getProperty r p) as string else ""
+    )
+    local geometry_hash = 0
+    for o in geometry where o.renderable do (
+        local key = ((classOf o) as string) + ":" + ((getPolygonCount o) as string)
+        for md in o.modifiers do key += ":" + ((classOf md) as string) + md.name + (md.enabled as string)
+        key += "|" + (o.min as string) + (o.max as string) + (o.transform as string)
+        key += "|" + (o.material as string) + ":" + (o.isHidden as string)
+        geometry_hash = getHashValue key geometry_hash
+    )
+    local light_hash = 0
+    for l in lights where (superClassOf l) == light do (
+        light_hash = getHashValue (l.transform as string) light_hash
+        for p in #(#on, #enabled, #multiplier, #color) where isProperty l p do (
+            light_hash = getHashValue ((getProperty l p) as string) light_hash
+        )
+    )
+    local scene = #(
+        geometry_hash as string,
+        light_hash as string,
+        (if cam != undefined then cam.name else ""),
+        (if cam != undefined then cam.transform as string else ""),
+        animationRange as string,
+        renderWidth as string,
+        renderHeight as string,
+        objects.count as string
+    )
+    #(settings, scene)
+)
+"""
+
+# The names of the values in the scene array above
+_scene_keys = ("geometry", "lights", "camera", "camera_transform", "range", "width", "height", "objects")
+
+# Run before a merge job renders, merges the irradiance maps of the prepass chunks with V-Ray's imapviewer and
+# copies the light cache of the last chunk, which is the one a serial prepass would have left behind
+_merge_script_template = """-- Written by renderFarming
+(
+    local parts = #({parts})
+    local missing = for p in parts where not (doesFileExist p) collect p
+    if missing.count > 0 then (
+        format "renderFarming Merge Error: Missing %\\n" missing
+    ) else (
+        local temp_file = {temp_file}
+        deleteFile temp_file
+        DOSCommand {command}
+        if doesFileExist temp_file then (
+            deleteFile {ir_file}
+            renameFile temp_file {ir_file}
+            deleteFile {lc_file}
+            copyFile {lc_part} {lc_file}
+        ) else (
+            format "renderFarming Merge Error: % did not write %\\n" {tool} temp_file
+        )
+    )
+)
+"""
+
+# Throwing from the pre-render script stops the render, so a beauty job whose prepass left gaps fails on the farm
+# instead of rendering without GI.  Animation prepass frames are matched by the number after the prefix, however V-Ray
+# pads it, as in renderFarmingFrames.PrepassFrameIndex.
+_check_script_template = """-- Written by renderFarming
+(
+    local missing = for f in #({files}) where not (doesFileExist f) collect f
+    local first_frame = {first_frame}
+    local last_frame = {last_frame}
+    if last_frame >= first_frame do (
+        local found = #{{}}
+        for f in getFiles {pattern} do (
+            local n = (substring (getFilenameFile f) ({prefix_length} + 1) -1) as integer
+            if n != undefined and n >= first_frame and n <= last_frame do found[n - first_frame + 1] = true
+        )
+        for i = first_frame to last_frame where not found[i - first_frame + 1] do (
+            append missing ("frame " + i as string)
+        )
+    )
+    if missing.count > 0 do (
+        throw ("renderFarming Prepass Error: Missing " + missing as string)
+    )
+)
+"""
+
+
+# ---------------------------------------------------
+#                   Classes
+# ---------------------------------------------------
+
+
+class GIFingerprint(object):
+    """
+    A hash of everything that makes a GI cache valid for a prepass
+    """
+    def __init__(self, render_type, settings, scene, project):
+        self._render_type = render_type
+        self._settings = settings
+        self._scene = scene
+        self._project = project
+
+        data = json.dumps({"render_type": render_type, "settings": settings, "scene": scene}, sort_keys=True)
+        self._hash = hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def get_hash(self):
+        return self._hash
+
+    def get_render_type(self):
+        return self._render_type
+
+    def get_settings(self):
+        return self._settings
+
+    def get_scene(self):
+        return self._scene
+
+    def get_project(self):
+        return self._project
+
+    def __eq__(self, other):
+        return isinstance(other, GIFingerprint) and self._hash == other.get_hash()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __str__(self):
+        return self._hash
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class GICacheRecord(object):
+    """
+    The record kept next to a cache file
+    A cache is only trusted when it was written after its record, so an interrupted prepass doesn't count
+    """
+    def __init__(self, cache_file, fingerprint=str(), project=str(), prepared=0.0, last_used=0.0):
+        self._cache_file = cache_file
+        self._fingerprint = fingerprint
+        self._project = project
+        self._prepared = prepared
+        self._last_used = last_used
+
+    def get_cache_file(self):
+        return self._cache_file
+
+    def get_record_file(self):
+        return self._cache_file + record_extension
+
+    def get_fingerprint(self):
+        return self._fingerprint
+
+    def get_project(self):
+        return self._project
+
+    def get_prepared(self):
+        return self._prepared
+
+    def get_last_used(self):
+        return max(self._last_used, self._prepared)
+
+    def set_last_used(self, last_used):
+        self._last_used = last_used
+
+    def is_complete(self):
+        """
+        Checks that the cache file exists and was written after the prepass was prepared
+        :return: True if the cache is usable
+        """
+        try:
+            return os.path.getmtime(self._cache_file) >= self._prepared - mtime_tolerance
+        except os.error:
+            return False
+
+    def write(self):
+        data = {
+            "fingerprint": self._fingerprint,
+            "project": self._project,
+            "prepared": self._prepared,
+            "last_used": self._last_used
+        }
+        try:
+            with open(self.get_record_file(), 'w') as record_file:
+                json.dump(data, record_file, indent=4, sort_keys=True)
+            return True
+        except IOError as e:
+            mlg.error("IO Error, Failed to write GI cache record {0}: {1}".format(self.get_record_file(), e))
+            return False
+
+    @classmethod
+    def read(cls, cache_file):
+        """
+        Reads the record for a cache file
+        :param cache_file: The path to the cache file
+        :return: A GICacheRecord or None if there is no readable record
+        """
+        try:
+            with open(cache_file + record_extension, 'r') as record_file:
+                data = json.load(record_file)
+        except (IOError, ValueError):
+            return None
+
+        return cls(cache_file,
+                   data.get("fingerprint", str()),
+                   data.get("project", str()),
+                   float(data.get("prepared", 0.0)),
+                   float(data.get("last_used", 0.0)))
+
+    def __str__(self):
+        return "{0}: {1}".format(self._cache_file, self._fingerprint)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class GICacheManager(object):
+    """
+    Decides if a prepass can be skipped because its caches are already current, and cleans up old caches
+    """
+    def __init__(self, cfg):
+        self._clg = logging.getLogger("renderFarming.GICache.GICacheManager")
+        self._cfg = cfg
+
+    def _cache_directories(self):
+        directories = set()
+        for directory in (self._cfg.get_irradiance_cache_path(), self._cfg.get_light_cache_path()):
+            if os.path.isdir(directory):
+                directories.add(os.path.normcase(os.path.realpath(directory)))
+        return sorted(directories)
+
+    def _scan(self):
+        """
+        Finds every cache file in the GI cache directories, including animation prepass sub folders
+        :return: A list of (path, size, modified, record) tuples
+        """
+        caches = list()
+        for directory in self._cache_directories():
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() not in cache_extensions:
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except os.error:
+                        continue
+                    caches.append((path, stat.st_size, stat.st_mtime, GICacheRecord.read(path)))
+        return caches
+
+    def _remove(self, path):
+        for doomed in (path, path + record_extension):
+            try:
+                if os.path.isfile(doomed):
+                    os.remove(doomed)
+            except os.error as e:
+                self._clg.error("Unable to remove GI cache {0}: {1}".format(doomed, e))
+                return False
+        return True
+
+    # ---------------------------------------------------
+    #                       Public
+    # ---------------------------------------------------
+
+    def fingerprint(self, render_type, camera):
+        """
+        Reads the GI settings and scene state from Max in a single call
+        :param render_type: The Spinach render type of the prepass
+        :param camera: The camera the prepass is rendered from
+        :return: A GIFingerprint
+        """
+        func = rFT.define_mxs_function(rt, "rfGIFingerprintValues", _fingerprint_source)
+        settings, scene = func(list(gi_properties), camera)
+
+        settings = dict(zip(gi_properties, [str(v) for v in settings]))
+        scene = dict(zip(_scene_keys, [str(v) for v in scene]))
+
+        return GIFingerprint(render_type, settings, scene, self._cfg.get_project_code())
+
+    def is_current(self, cache_files, fingerprint):
+        """
+        Checks if every cache file of a prepass is complete and was made with the same fingerprint
+        :param cache_files: A list of cache file paths
+        :param fingerprint: A GIFingerprint
+        :return: True if the prepass can be skipped
+        """
+        if len(cache_files) == 0:
+            return False
+
+        for cache_file in cache_files:
+            record = GICacheRecord.read(cache_file)
+            if record is None:
+                self._clg.debug("No GI cache record for {}".format(cache_file))
+                return False
+            if record.get_fingerprint() != fingerprint.get_hash():
+                self._clg.debug("GI cache {} was made with different settings".format(cache_file))
+                return False
+            if not record.is_complete():
+                self._clg.debug("GI cache {} is missing or incomplete".format(cache_file))
+                return False
+        return True
+
+    def record(self, cache_files, fingerprint):
+        """
+        Writes a record next to each cache file before the prepass renders it
+        :param cache_files: A list of cache file paths
+        :param fingerprint: A GIFingerprint
+        :return: True for success, False for failure
+        """
+        prepared = time.time()
+        success = True
+        for cache_file in cache_files:
+            record = GICacheRecord(cache_file, fingerprint.get_hash(), fingerprint.get_project(), prepared)
+            success = record.write() and success
+        return success
+
+    def touch(self, cache_files):
+        """
+        Marks caches as used so the quota removes them last
+        :param cache_files: A list of cache file paths
+        :return: None
+        """
+        now = time.time()
+        for cache_file in cache_files:
+            record = GICacheRecord.read(cache_file)
+            if record is not None:
+                record.set_last_used(now)
+                record.write()
+
+    def evict(self, max_age_days=0.0, quota_gb=0.0, project=None):
+        """
+        Removes stale GI caches
+        Only caches with a record, the ones prepared through Spinach, are removed or counted towards the quota.  Hand
+        made caches which share the directories are left alone.
+        :param max_age_days: Caches not used for this many days are removed, 0 disables
+        :param quota_gb: The least recently used caches are removed until the total is under this size, 0 disables
+        :param project: Removes every cache recorded for this project code, None disables
+        :return: A list of the removed cache files
+        """
+        now = time.time()
+        removed = list()
+        kept = list()
+        unrecorded = 0
+
+        for path, size, modified, record in self._scan():
+            if record is None:
+                self._clg.debug("Leaving GI cache without a record: {}".format(path))
+                unrecorded += 1
+                continue
+
+            last_used = max(modified, record.get_last_used())
+
+            if project is not None and record.get_project() == project:
+                self._clg.debug("Removing GI cache for project {0}: {1}".format(project, path))
+            elif max_age_days > 0 and now - last_used > max_age_days * 86400.0:
+                self._clg.debug("Removing GI cache older than {0} days: {1}".format(max_age_days, path))
+            else:
+                kept.append((last_used, size, path))
+                continue
+
+            if self._remove(path):
+                removed.append(path)
+
+        if quota_gb > 0:
+            quota = quota_gb * 1024 ** 3
+            total = sum([size for last_used, size, path in kept])
+
+            # Least recently used first
+            for last_used, size, path in sorted(kept):
+                if total <= quota:
+                    break
+                self._clg.debug("Removing GI cache over quota: {}".format(path))
+                if self._remove(path):
+                    removed.append(path)
+                    total -= size
+
+        if unrecorded > 0:
+            self._clg.info("Left {} GI cache files without a record alone".format(unrecorded))
+        self._clg.info("Removed {} GI cache files".format(len(removed)))
+        return removed
+
+
+# ---------------------------------------------------
+#                   Merging
+# ---------------------------------------------------
+
+
+def part_file(cache_file, part):
+    """
+    :param cache_file: The path of a whole irradiance map or light cache
+    :param part: The chunk number, starting at 1
+    :return: The path the chunk of a split prepass writes instead
+    """
+    root, extension = os.path.splitext(cache_file)
+    return "{0}_part{1:02d}{2}".format(root, part, extension)
+
+
+def _mxs_string(text):
+    return "\"{}\"".format(text.replace("\\", "\\\\").replace("\"", "\\\""))
+
+
+def write_merge_script(script_file, tool, ir_file, lc_file, parts):
+    """
+    Writes the pre-render script of a merge job
+    :param script_file: Where to write the script, should end with merge_script_suffix
+    :param tool: The path to V-Ray's imapviewer
+    :param ir_file: The merged irradiance map
+    :param lc_file: The light cache the beauty pass reads
+    :param parts: The number of chunks the prepass was split into
+    :return: True for success, False for failure
+    """
+    ir_parts = [part_file(ir_file, p) for p in range(1, parts + 1)]
+    temp_file = ir_file + ".tmp"
+
+    command = "\"\"{0}\" {1} -save \"{2}\" -nodisplay\"".format(
+        tool, " ".join(["-load \"{}\"".format(p) for p in ir_parts]), temp_file
+    )
+
+    script = _merge_script_template.format(
+        parts=", ".join([_mxs_string(p) for p in ir_parts]),
+        temp_file=_mxs_string(temp_file),
+        command=_mxs_string(command),
+        ir_file=_mxs_string(ir_file),
+        lc_file=_mxs_string(lc_file),
+        lc_part=_mxs_string(part_file(lc_file, parts)),
+        tool=_mxs_string(tool)
+    )
+
+    try:
+        with open(script_file, 'w') as merge_file:
+            merge_file.write(script)
+        mlg.debug("Wrote merge script {}".format(script_file))
+        return True
+    except IOError as e:
+        mlg.error("IO Error, Failed to write merge script {0}: {1}".format(script_file, e))
+        return False
+
+
+def write_check_script(script_file, files, frames_folder=None, frames_prefix=None, first_frame=0, last_frame=-1):
+    """
+    Writes the pre-render script of a beauty job submitted ahead of its prepass, which stops the job if the prepass
+    didn't write what it reads
+    :param script_file: Where to write the script, should end with check_script_suffix
+    :param files: A list of the irradiance maps and light caches the beauty pass loads
+    :param frames_folder: The folder of an animation prepass, None if the beauty pass doesn't read one
+    :param frames_prefix: The file name the animation prepass frame numbers are appended to
+    :param first_frame: The first animation prepass frame the beauty pass reads
+    :param last_frame: The last animation prepass frame the beauty pass reads
+    :return: True for success, False for failure
+    """
+    if frames_folder is None:
+        frames_prefix = ""
+        pattern = ""
+        last_frame = first_frame - 1
+    else:
+        pattern = os.path.join(frames_folder, "{}*.vrmap".format(frames_prefix))
+
+    script = _check_script_template.format(
+        files=", ".join([_mxs_string(f) for f in files]),
+        first_frame=int(first_frame),
+        last_frame=int(last_frame),
+        pattern=_mxs_string(pattern),
+        prefix_length=len(frames_prefix)
+    )
+
+    try:
+        with open(script_file, 'w') as check_file:
+            check_file.write(script)
+        mlg.debug("Wrote prepass check script {}".format(script_file))
+        return True
+    except IOError as e:
+        mlg.error("IO Error, Failed to write prepass check script {0}: {1}".format(script_file, e))
+        return False
@@ -0,0 +1,436 @@
+import logging
+
+import pymxs
+
+import renderFarmingFrames as rFF
+import renderFarmingNetRender as rFNR
+import renderFarmingSpinach as rFS
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.JobGraph")
+
+# Node states
+pending = "pending"
+prepared = "prepared"
+submitted = "submitted"
+current = "current"
+failed = "failed"
+blocked = "blocked"
+
+# The beauty pass that reads each prepass's GI files
+beauty_for_prepass = {
+    0: 1,
+    2: 3,
+    4: 5,
+    6: 7
+}
+
+
+class JobNode(object):
+    """
+    A single prepass or beauty job in a JobGraph
+    """
+    def __init__(self, name, camera, start, end, pass_name, render_type, settings, dependencies=(), frames=None):
+        self._name = name
+        self._camera = camera
+        self._start = start
+        self._end = end
+        self._pass_name = pass_name
+        self._render_type = render_type
+        self._settings = dict(settings)
+        self._dependencies = list(dependencies)
+        self._frames = rFF.FrameSet(frames) if frames is not None else None
+
+        self._status = pending
+        self._messages = list()
+        self._gi_name = None
+        self._job_handle = None
+
+    def get_name(self):
+        return self._name
+
+    def get_camera(self):
+        return self._camera
+
+    def get_range(self):
+        return self._start, self._end
+
+    def get_pass_name(self):
+        return self._pass_name
+
+    def get_render_type(self):
+        return self._render_type
+
+    def get_settings(self):
+        return self._settings
+
+    def get_dependencies(self):
+        return self._dependencies
+
+    def get_frames(self):
+        """
+        :return: A FrameSet of the frames the job renders instead of its range, or None
+        """
+        return self._frames
+
+    def get_status(self):
+        return self._status
+
+    def get_messages(self):
+        return self._messages
+
+    def get_gi_name(self):
+        """
+        :return: The name of the GI files the prepass writes, known once it has been prepared
+        """
+        return self._gi_name
+
+    def get_job_handle(self):
+        """
+        :return: The Backburner handle of the job, known once it has been submitted
+        """
+        return self._job_handle
+
+    def is_prepass(self):
+        return self._pass_name == "prepass"
+
+    def is_merge(self):
+        return self._pass_name == "merge"
+
+    def is_success(self):
+        return self._status in (prepared, submitted, current)
+
+    def set_status(self, status):
+        self._status = status
+
+    def set_gi_name(self, gi_name):
+        self._gi_name = gi_name
+
+    def set_job_handle(self, job_handle):
+        self._job_handle = job_handle
+
+    def add_message(self, message):
+        self._messages.append(message)
+
+    def __str__(self):
+        return "{0}: {1} {2} type {3} - {4}".format(self._name, self._camera, self._pass_name, self._render_type,
+                                                   self._status)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class JobGraph(object):
+    """
+    Prepass and beauty jobs linked by the GI files they share
+    A beauty job depends on the prepass that writes its GI files, and one prepass can feed the beauty jobs of several
+    cameras.  Beauty jobs reading another camera's prepass are pointed at its GI files when they are prepared.
+    """
+    def __init__(self):
+        self._clg = logging.getLogger("renderFarming.JobGraph.JobGraph")
+        self._nodes = list()
+        self._names = set()
+
+    def _add(self, node):
+        if node.get_name() in self._names:
+            raise JobGraphError("The job name {} is used twice".format(node.get_name()))
+        self._names.add(node.get_name())
+        self._nodes.append(node)
+        self._clg.debug("Added {}".format(node))
+        return node
+
+    def add_prepass(self, name, camera, start, end, render_type, settings, frames=None):
+        """
+        :param name: The job name, must be unique in the graph
+        :param camera: The camera name
+        :param start: The first frame of the active segment
+        :param end: The last frame of the active segment
+        :param render_type: The Spinach render type of the prepass
+        :param settings: SpinachJob settings, see SpinachJob.get_settings()
+        :param frames: A FrameSet or list of frames to render instead of the whole range, for Animation and Multi Frame
+                       Incremental prepasses
+        :return: The new JobNode
+        """
+        if render_type not in beauty_for_prepass:
+            raise JobGraphError("Render type {0} of {1} is not a prepass".format(render_type, name))
+        if frames is not None and render_type not in (2, 4):
+            raise JobGraphError("Only Animation and Multi Frame Incremental prepasses can render a list of frames, "
+                                "{0} is type {1}".format(name, render_type))
+        return self._add(JobNode(name, camera, start, end, "prepass", render_type, settings, frames=frames))
+
+    def add_animation_prepass(self, name, camera, start, end, settings, chunks):
+        """
+        Splits an Animation Prepass, padded with the interpolation frames when pad_gi is set, into chunks which render
+        on separate nodes
+        Every frame writes its own irradiance map to the prepass folder, so the chunks need no merging and the beauty
+        pass only has to wait for all of them
+        :param name: The job name, the chunk number is appended when there is more than one chunk
+        :param camera: The camera name
+        :param start: The first frame of the active segment
+        :param end: The last frame of the active segment
+        :param settings: SpinachJob settings, see SpinachJob.get_settings()
+        :param chunks: The number of chunks
+        :return: A list of the new JobNodes, for add_beauty()
+        """
+        if chunks <= 1:
+            return [self.add_prepass(name, camera, start, end, 4, settings)]
+
+        if settings.get("pad_gi", False):
+            frames = rFF.FrameSet.from_range(*rFS.animation_prepass_range(start, end))
+        else:
+            frames = rFF.FrameSet.from_range(start, end)
+        return [self.add_prepass("{0}_{1:02d}".format(name, i + 1), camera, start, end, 4, settings, chunk)
+                for i, chunk in enumerate(frames.chunks(chunks))]
+
+    def add_multi_frame_incremental_prepass(self, name, camera, start, end, settings, chunks):
+        """
+        Splits the sampled frames of a Multi Frame Incremental prepass into chunks which render on separate nodes
+        Each chunk writes its own irradiance map and light cache, and a merge job combines them once every chunk has
+        finished, see SpinachJob.prepare_irradiance_merge()
+        :param name: The job name, the chunk number is appended when there is more than one chunk
+        :param camera: The camera name
+        :param start: The first frame of the active segment
+        :param end: The last frame of the active segment
+        :param settings: SpinachJob settings, see SpinachJob.get_settings()
+        :param chunks: The number of chunks
+        :return: A list of the new JobNodes, the merge job last, for add_beauty()
+        """
+        frames = rFS.multi_frame_incremental_frames(start, end, settings.get("multi_frame_increment", 50),
+                                                    settings.get("pad_gi", False))
+        if chunks <= 1 or len(frames) < 2:
+            return [self.add_prepass(name, camera, start, end, 2, settings)]
+
+        nodes = list()
+        for i, chunk in enumerate(frames.chunks(chunks)):
+            chunk_settings = dict(settings)
+            chunk_settings["gi_part"] = i + 1
+            nodes.append(self.add_prepass("{0}_{1:02d}".format(name, i + 1), camera, start, end, 2, chunk_settings,
+                                          chunk))
+
+        nodes.append(self._add(JobNode("{}_merge".format(name), camera, start, end, "merge", 2, settings, nodes)))
+        return nodes
+
+    def add_beauty(self, name, camera, start, end, render_type, settings, prepass=None):
+        """
+        :param name: The job name, must be unique in the graph
+        :param camera: The camera name
+        :param start: The first frame of the active segment
+        :param end: The last frame of the active segment
+        :param render_type: The Spinach render type of the beauty pass
+        :param settings: SpinachJob settings, see SpinachJob.get_settings()
+        :param prepass: The JobNode of the prepass this job reads its GI files from, a list of JobNodes for a
+                        prepass split into chunks, or None if they are already on disk
+        :return: The new JobNode
+        """
+        if render_type in beauty_for_prepass:
+            raise JobGraphError("Render type {0} of {1} is not a beauty pass".format(render_type, name))
+
+        if prepass is None:
+            dependencies = list()
+        elif isinstance(prepass, JobNode):
+            dependencies = [prepass]
+        else:
+            # Only waits on the last jobs of a split prepass, like the merge job, which wait on the rest themselves
+            dependencies = [n for n in prepass if not any([n in p.get_dependencies() for p in prepass])]
+
+        for dependency in dependencies:
+            if dependency not in self._nodes:
+                raise JobGraphError("The prepass of {} is not in the graph".format(name))
+            if beauty_for_prepass[dependency.get_render_type()] != render_type:
+                raise JobGraphError("Render type {0} of {1} can't read the GI files of a type {2} prepass".format(
+                    render_type, name, dependency.get_render_type()
+                ))
+
+        return self._add(JobNode(name, camera, start, end, "beauty", render_type, settings, dependencies))
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_dependents(self, node):
+        return [n for n in self._nodes if node in n.get_dependencies()]
+
+    def order(self):
+        """
+        Sorts the jobs so that every job comes after the jobs it depends on, keeping the order they were added in
+        otherwise
+        :return: A list of JobNode objects
+        """
+        ordered = list()
+        placed = set()
+        remaining = list(self._nodes)
+
+        while len(remaining) > 0:
+            ready = [n for n in remaining if all([id(d) in placed for d in n.get_dependencies()])]
+            if len(ready) == 0:
+                raise JobGraphError("The jobs depend on each other: {}".format(
+                    ", ".join([n.get_name() for n in remaining])
+                ))
+            for node in ready:
+                ordered.append(node)
+                placed.add(id(node))
+            remaining = [n for n in remaining if id(n) not in placed]
+
+        return ordered
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+
+class JobGraphSubmitter(rFS.SpinachObserver):
+    """
+    Prepares every job in a graph with Spinach and submits it to Backburner with its dependencies, so beauty jobs
+    start on the farm as soon as their prepass finishes
+    The active camera, animation range and pre-render script are changed for each job and restored afterwards
+    """
+    def __init__(self, cfg, graph, submit=True):
+        """
+        :param cfg: A Configuration object
+        :param graph: A JobGraph
+        :param submit: Submits each job after preparing it, otherwise the jobs are only prepared
+        """
+        self._clg = logging.getLogger("renderFarming.JobGraph.JobGraphSubmitter")
+
+        self._cfg = cfg
+        self._graph = graph
+        self._submit = submit
+        self._node = None
+        self._last_message = None
+
+    def on_status_update(self, message):
+        self._last_message = message
+        if self._node is not None:
+            self._node.add_message(message.raw_message())
+
+    def _prepare(self, node):
+        """
+        Sets the camera and range and prepares the job with a new SpinachJob
+        :return: True if the job is ready to be submitted
+        """
+        camera = rt.getNodeByName(node.get_camera())
+        if camera is None:
+            node.add_message("Camera {} is not in the scene".format(node.get_camera()))
+            node.set_status(failed)
+            return False
+
+        # Backburner renders the active view of the submitted scene, which batch mode may not have
+        if rt.viewport.numViews > 0:
+            rt.viewport.setCamera(camera)
+        elif self._submit:
+            node.add_message("No viewport to render {} from".format(node.get_camera()))
+            node.set_status(failed)
+            return False
+        rt.animationRange = rt.interval(node.get_range()[0], node.get_range()[1])
+
+        # Spinach is given the camera rather than reading it back from the viewport
+        job = rFS.SpinachJob(self._cfg)
+        job.set_camera(camera)
+        job.add_observer(self)
+        job.apply_settings(node.get_settings())
+
+        # Beauty jobs read the GI files their prepass wrote, even when it was rendered from another camera
+        for dependency in node.get_dependencies():
+            if dependency.get_gi_name() is not None:
+                job.set_gi_name(dependency.get_gi_name())
+
+        self._last_message = None
+        job.prepare_job()
+        if not job.get_ready_status():
+            node.set_status(failed)
+            return False
+
+        if node.is_merge():
+            node.set_gi_name(job.get_gi_name())
+            if job.prepare_irradiance_merge(len(node.get_dependencies())):
+                return True
+            node.set_status(failed)
+            return False
+
+        if node.is_prepass():
+            node.set_gi_name(job.get_gi_name())
+            if job.prepare_prepass(node.get_render_type(), node.get_frames()):
+                return True
+            # A prepass whose GI cache is already current is reported as ready but not prepared
+            if self._last_message is not None and self._last_message.get_message_type() == "Ready":
+                node.set_status(current)
+            else:
+                node.set_status(failed)
+            return False
+
+        # A prepass submitted ahead of this job can't have its files on disk yet, they are checked when the job starts
+        check_prepass = len(node.get_dependencies()) == 0
+        if job.prepare_beauty_pass(node.get_render_type(), check_prepass=check_prepass):
+            return True
+        node.set_status(failed)
+        return False
+
+    def _run_node(self, node):
+        self._node = node
+
+        for dependency in node.get_dependencies():
+            if not dependency.is_success():
+                node.add_message("{} did not submit".format(dependency.get_name()))
+                node.set_status(blocked)
+                return
+
+        if not self._prepare(node):
+            return
+
+        if not self._submit:
+            node.set_status(prepared)
+            return
+
+        # Prepasses with a current cache aren't on the farm, so there's nothing to wait for
+        dependencies = [d.get_job_handle() for d in node.get_dependencies() if d.get_status() == submitted]
+        job_handle = rFNR.submit_job(self._cfg.get_net_render_manager(), node.get_name(), dependencies=dependencies)
+        if job_handle is not None:
+            node.set_job_handle(job_handle)
+            node.set_status(submitted)
+        else:
+            node.add_message("Submission failed")
+            node.set_status(failed)
+
+    def run(self):
+        """
+        Prepares and submits every job in dependency order
+        :return: A list of the JobNode objects in the order they were submitted
+        """
+        ordered = self._graph.order()
+
+        original_camera = rt.getActiveCamera()
+        original_range = rt.animationRange
+        original_script = (rt.preRendScript, rt.usePreRendScript)
+
+        try:
+            for node in ordered:
+                self._run_node(node)
+                self._clg.info(node)
+        finally:
+            self._node = None
+            rt.animationRange = original_range
+            # Beauty jobs set their own prepass check script
+            rt.preRendScript, rt.usePreRendScript = original_script
+            if original_camera is not None:
+                rt.viewport.setCamera(original_camera)
+
+        return ordered
+
+# ---------------------------------------------------
+#                     Exceptions
+# ---------------------------------------------------
+
+
+class JobGraphError(Exception):
+    """
+    Exception raised for jobs which can't be linked.
+    :attribute message: explanation of the error
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return str(self.message)
@@ -0,0 +1,249 @@
+"""
+A snapshot of the scene's layer hierarchy, read in a single MaxScript call
+
+Tools working on the layers of a selection used to reach each layer through its nodes, so a layer holding thousands of
+selected objects was read and checked thousands of times.  The LayerHierarchy reads every layer once, with its
+parent, member count, wire color and flags, and maps the selection onto it so each layer is only visited once however
+many selected nodes sit on it.  Build one at the start of an operation, it does not follow later changes to the scene.
+"""
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+import renderFarmingBulk as rFBk
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Layers")
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Layer names are unique in 3ds Max, so nodes are matched to their layer by name.
+_layer_table_source = """
+fn rfLayerTable nodes = (
+    local layers = for i = 0 to layerManager.count - 1 collect (layerManager.getLayer i)
+    local parents = for lay in layers collect (
+        local p = lay.getParent()
+        if p == undefined then "" else p.name
+    )
+    local counts = for lay in layers collect (
+        local members
+        lay.nodes &members
+        members.count
+    )
+    #(
+        layers,
+        for lay in layers collect lay.name,
+        parents,
+        counts,
+        for lay in layers collect lay.wireColor.r,
+        for lay in layers collect lay.wireColor.g,
+        for lay in layers collect lay.wireColor.b,
+        for lay in layers collect lay.isHidden,
+        for lay in layers collect lay.renderable,
+        for n in nodes collect n.layer.name
+    )
+)
+"""
+
+# ---------------------------------------------------
+#                   Classes
+# ---------------------------------------------------
+
+
+class LayerInfo(object):
+    """
+    One layer as it was when the hierarchy was read
+    """
+    def __init__(self, layer, name, parent, member_count, color, hidden, renderable):
+        """
+        :param layer: The 3ds Max layer
+        :param name: The name of the layer
+        :param parent: The name of the parent layer, None for a top level layer
+        :param member_count: The number of nodes on the layer, not counting its children
+        :param color: The wire color as an r, g, b tuple
+        :param hidden: True if the layer is hidden
+        :param renderable: True if the layer is renderable
+        """
+        self._layer = layer
+        self._name = name
+        self._parent = parent
+        self._children = list()
+        self._member_count = member_count
+        self._color = color
+        self._hidden = hidden
+        self._renderable = renderable
+
+    def get_layer(self):
+        return self._layer
+
+    def get_name(self):
+        return self._name
+
+    def get_parent(self):
+        return self._parent
+
+    def get_children(self):
+        return self._children
+
+    def add_child(self, name):
+        self._children.append(name)
+
+    def get_member_count(self):
+        return self._member_count
+
+    def get_color(self):
+        return self._color
+
+    def set_color(self, color):
+        self._color = tuple(color)
+
+    def is_hidden(self):
+        return self._hidden
+
+    def set_hidden(self, hidden):
+        self._hidden = hidden
+
+    def is_renderable(self):
+        return self._renderable
+
+    def set_renderable(self, renderable):
+        self._renderable = renderable
+
+
+class LayerHierarchy(object):
+    """
+    Every layer in the scene, and which layer each of a set of nodes is on
+    """
+    def __init__(self, nodes=()):
+        """
+        :param nodes: The nodes the operation works on, usually the selection
+        """
+        self._clg = logging.getLogger("renderFarming.Layers.LayerHierarchy")
+
+        self._layers = list()
+        self._layers_by_name = dict()
+        self._node_layers = list()
+
+        self._read(nodes)
+
+    def _read(self, nodes):
+        table = rFT.define_mxs_function(rt, "rfLayerTable", _layer_table_source)
+        columns = [list(column) for column in table(rt.array(*nodes))]
+        layers, names, parents, counts, reds, greens, blues, hidden, renderable, node_layers = columns
+
+        for i, layer in enumerate(layers):
+            info = LayerInfo(layer, str(names[i]), str(parents[i]) or None, int(counts[i]),
+                             (reds[i], greens[i], blues[i]), bool(hidden[i]), bool(renderable[i]))
+            self._layers.append(info)
+            self._layers_by_name[info.get_name()] = info
+
+        for info in self._layers:
+            parent = self._layers_by_name.get(info.get_parent())
+            if parent is not None:
+                parent.add_child(info.get_name())
+
+        self._node_layers = [str(name) for name in node_layers]
+        self._clg.debug("Read {0} layers for {1} nodes".format(len(self._layers), len(self._node_layers)))
+
+    def get_layers(self):
+        """
+        :return: A list of every LayerInfo, in layer manager order
+        """
+        return list(self._layers)
+
+    def get_layer(self, name):
+        """
+        :param name: The name of a layer
+        :return: The LayerInfo, or None if there is no such layer
+        """
+        return self._layers_by_name.get(name)
+
+    def get_node_layer(self, index):
+        """
+        :param index: The position of a node in the list the hierarchy was built with
+        :return: The LayerInfo of the layer the node is on
+        """
+        return self._layers_by_name.get(self._node_layers[index])
+
+    def get_node_layers(self, mask=None):
+        """
+        The layers the nodes are on, each one listed once however many of the nodes are on it
+        :param mask: A list of booleans, one per node, only the nodes which are True count.  None counts every node
+        :return: A list of LayerInfos in the order the nodes first reach them
+        """
+        names = list()
+        seen = set()
+        for i, name in enumerate(self._node_layers):
+            if (mask is None or mask[i]) and name not in seen:
+                seen.add(name)
+                names.append(name)
+        return [self._layers_by_name[name] for name in names if name in self._layers_by_name]
+
+    def get_ancestors(self, info):
+        """
+        :return: A list of the LayerInfos above a layer, nearest first
+        """
+        ancestors = list()
+        parent = self._layers_by_name.get(info.get_parent())
+        while parent is not None and parent not in ancestors:
+            ancestors.append(parent)
+            parent = self._layers_by_name.get(parent.get_parent())
+        return ancestors
+
+    def get_descendants(self, info):
+        """
+        :return: A list of the LayerInfos below a layer, depth first
+        """
+        descendants = list()
+        pending = list(reversed(info.get_children()))
+        while len(pending) > 0:
+            child = self._layers_by_name.get(pending.pop())
+            if child is None or child in descendants:
+                continue
+            descendants.append(child)
+            pending.extend(reversed(child.get_children()))
+        return descendants
+
+    # ---------------------------------------------------
+    #                 Bulk Edits
+    # ---------------------------------------------------
+
+    def set_colors(self, infos, colors, undo_label=None, redraw=True):
+        """
+        Sets the wire color of each layer in one call and keeps the hierarchy up to date
+        :param infos: A list of LayerInfos
+        :param colors: A list of r, g, b tuples, one for each layer
+        :return: The number of layers set
+        """
+        count = rFBk.set_colors([i.get_layer() for i in infos], "wireColor", colors, undo_label, redraw)
+        for info, color in zip(infos, colors):
+            info.set_color(color)
+        return count
+
+    def set_renderable(self, infos, renderable, undo_label=None, redraw=True):
+        """
+        :param infos: A list of LayerInfos
+        :param renderable: True or False for every layer
+        :return: The number of layers set
+        """
+        count = rFBk.set_property([i.get_layer() for i in infos], "renderable", renderable, undo_label, redraw)
+        for info in infos:
+            info.set_renderable(renderable)
+        return count
+
+    def set_hidden(self, infos, hidden, undo_label=None, redraw=True):
+        """
+        :param infos: A list of LayerInfos
+        :param hidden: A single True or False for every layer, or a list with one for each layer
+        :return: The number of layers set
+        """
+        if isinstance(hidden, bool):
+            hidden = [hidden] * len(infos)
+        count = rFBk.set_properties([i.get_layer() for i in infos], "isHidden", hidden, undo_label, redraw)
+        for info, h in zip(infos, hidden):
+            info.set_hidden(h)
+        return count
@@ -1,11 +1,41 @@
 import pymxs
 import logging
 
+import renderFarmingTools as rFT
+
 mlg = logging.getLogger("renderFarming.NetRender")
 
 rt = pymxs.runtime
 vr = rt.renderers.current
 
+# Submits the current scene with its current render settings through the NetRender interface, without the dialog.
+# The job waits for every job in dependencies to finish before it starts.  Jobs are matched by their handle, since
+# names repeat when a job is submitted again.  Returns the handle of the new job, or undefined if it wasn't submitted.
+_submit_source = """
+fn rfSubmitNetRenderJob manager_name job_name suspended dependencies = (
+    local manager = netrender.getmanager()
+    if not (manager.connect #manual manager_name) then return undefined
+    local result = undefined
+    try (
+        local job = manager.newjob()
+        job.name = job_name
+        job.suspended = suspended
+        if dependencies.count > 0 do (
+            local depends_on = for j in (manager.getjobs()) where (findItem dependencies j.handle) > 0 collect j
+            if depends_on.count < dependencies.count do throw ("Missing dependencies for " + job_name)
+            job.dependent = true
+            job.dependencies = depends_on
+        )
+        if job.submit() do result = job.handle
+    ) catch (
+        format "renderFarming NetRender Error: %\\n" (getCurrentException())
+        result = undefined
+    )
+    manager.disconnect()
+    result
+)
+"""
+
 
 def submit_current_file():
     flg = logging.getLogger("renderFarming.NetRender.submit_current_file")
@@ -16,3 +46,27 @@ def submit_current_file():
 
     flg.debug("Render Submission Dialog ended")
     return
+
+
+def submit_job(manager, job_name, suspended=False, dependencies=()):
+    """
+    Submits the current file to Backburner without opening the submission dialog
+    :param manager: The name or address of the Backburner manager
+    :param job_name: The name of the job
+    :param suspended: Submits the job in a suspended state
+    :param dependencies: The handles of jobs already on the manager which have to finish before this one starts
+    :return: The handle of the submitted job, None for failure
+    """
+    flg = logging.getLogger("renderFarming.NetRender.submit_job")
+    flg.debug("Submitting job {0} to manager {1}".format(job_name, manager))
+    if len(dependencies) > 0:
+        flg.debug("Job {0} depends on: {1}".format(job_name, ", ".join([str(d) for d in dependencies])))
+
+    func = rFT.define_mxs_function(rt, "rfSubmitNetRenderJob", _submit_source)
+    handle = func(manager, job_name, suspended, list(dependencies))
+
+    if handle is not None:
+        flg.info("Job {0} submitted with handle {1}".format(job_name, handle))
+    else:
+        flg.error("Unable to submit job {0} to manager {1}".format(job_name, manager))
+    return handle
@@ -0,0 +1,195 @@
+"""
+Runs long Barn operations a slice at a time on a Qt timer, so 3ds Max stays responsive while they work
+
+An Operation is a list of items and a function which processes a chunk of them.  The OperationRunner processes chunks
+until its time slice is used up, then hands control back to the Qt event loop until the next tick.  Progress goes out
+through the Sheep status bar signals and the viewports are redrawn at most once every redraw_seconds rather than for
+every chunk.
+
+The user keeps working between ticks, so an undo record held open across them would take in their edits as well, and
+one record per tick would take as many Ctrl+Z presses to undo.  Operations are for work which doesn't need undoing,
+like exports.  Scene edits go through renderFarmingBulk instead, which sets a whole selection in one MaxScript call
+under a single undo record with its own progress bar.
+"""
+import time
+import logging
+
+import pymxs
+
+import PySide2.QtCore as QtC
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Operations")
+
+# How long one tick keeps the UI waiting, in seconds
+slice_seconds = 0.05
+
+# How often the viewports are redrawn while an operation runs, in seconds
+redraw_seconds = 1.0
+
+# ---------------------------------------------------
+#                   Classes
+# ---------------------------------------------------
+
+
+class Operation(object):
+    """
+    Work over a list of items, done a chunk at a time
+    """
+    def __init__(self, name, items, process, chunk_size=1, on_finish=None):
+        """
+        :param name: Shown in messages about the operation
+        :param items: A list of whatever process works on, nodes for example
+        :param process: A function called with a list of up to chunk_size items
+        :param chunk_size: How many items process is given at once
+        :param on_finish: A function called with the Operation once it is done, cancelled or has failed.  A cancelled
+        operation keeps what it has done
+        """
+        self._name = name
+        self._items = list(items)
+        self._process = process
+        self._chunk_size = max(1, int(chunk_size))
+        self._on_finish = on_finish
+
+        self._done = 0
+        self._cancelled = False
+        self._error = None
+
+    def get_name(self):
+        return self._name
+
+    def get_total(self):
+        return len(self._items)
+
+    def get_done(self):
+        return self._done
+
+    def is_done(self):
+        return self._done >= len(self._items)
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def set_cancelled(self, cancelled):
+        self._cancelled = cancelled
+
+    def get_error(self):
+        return self._error
+
+    def set_error(self, error):
+        self._error = error
+
+    def step(self, seconds):
+        """
+        Processes chunks until the time is used up, at least one chunk is always processed
+        :param seconds: The time the step may take
+        :return: The number of items processed
+        """
+        start = time.time()
+        before = self._done
+        while not self.is_done():
+            chunk = self._items[self._done:self._done + self._chunk_size]
+            self._process(chunk)
+            self._done += len(chunk)
+            if time.time() - start >= seconds:
+                break
+        return self._done - before
+
+    def finish(self):
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+
+class OperationRunner(object):
+    """
+    Runs one Operation at a time for a Sheep, from a Qt timer
+    """
+    def __init__(self, parent, init_progress, add_progress):
+        """
+        :param parent: The QObject owning the timer
+        :param init_progress: A function called with the total when an operation starts and with 0 when it stops
+        :param add_progress: A function called with the number of items processed in each tick
+        """
+        self._clg = logging.getLogger("renderFarming.Operations.OperationRunner")
+
+        self._init_progress = init_progress
+        self._add_progress = add_progress
+
+        self._operation = None
+        self._last_redraw = 0.0
+
+        self._timer = QtC.QTimer(parent)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._tick)
+
+    def is_running(self):
+        return self._operation is not None
+
+    def start(self, operation):
+        """
+        Runs the first slice straight away, operations which fit inside it finish before start returns
+        :param operation: An Operation
+        :return: False if an operation is already running
+        """
+        if self._operation is not None:
+            return False
+
+        self._clg.debug("Starting {0} on {1} items".format(operation.get_name(), operation.get_total()))
+        self._operation = operation
+        self._last_redraw = time.time()
+
+        self._init_progress(operation.get_total())
+
+        self._tick()
+        if self._operation is not None:
+            self._timer.start()
+        return True
+
+    def cancel(self):
+        """
+        Stops the running operation, what it has done so far is kept
+        """
+        if self._operation is None:
+            return
+        self._operation.set_cancelled(True)
+        self._stop()
+
+    def run_to_end(self):
+        """
+        Processes the rest of the running operation without returning to the event loop
+        """
+        while self._operation is not None:
+            self._tick()
+
+    def _tick(self):
+        operation = self._operation
+        if operation is None:
+            self._timer.stop()
+            return
+
+        try:
+            with pymxs.redraw(False):
+                processed = operation.step(slice_seconds)
+        except (RuntimeError, AttributeError) as e:
+            self._clg.error("{0} failed: {1}".format(operation.get_name(), e))
+            operation.set_error(e)
+            self._stop()
+            return
+
+        self._add_progress(processed)
+
+        if operation.is_done():
+            self._stop()
+        elif time.time() - self._last_redraw >= redraw_seconds:
+            rt.redrawViews()
+            self._last_redraw = time.time()
+
+    def _stop(self):
+        operation = self._operation
+        self._operation = None
+        self._timer.stop()
+
+        self._init_progress(0)
+        rt.redrawViews()
+        operation.finish()
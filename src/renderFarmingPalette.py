@@ -0,0 +1,214 @@
+"""
+Generates sets of wire colors that are easy to tell apart, from each other and from the colors already in the scene
+
+Colors are picked from a lattice in CIELAB, where the distance between two colors (Delta E, CIE76) follows how
+different they look.  Every pair of lattice points is at least one spacing apart, so the spacing is the minimum
+Delta E of the palette.  The widest spacing which still leaves enough free points is used, and points closer than a
+spacing to an existing color are left out.  Those are found from the existing colors, each can only be near the eight
+lattice points around it, so nothing is compared against every existing color.
+"""
+import math
+import random
+import colorsys
+import logging
+
+mlg = logging.getLogger("renderFarming.Palette")
+
+# The Barn wire color checks, on a 0-255 scale
+min_saturation = 50
+min_value = 20
+
+# The narrowest lattice, tighter than this and neighbouring colors stop being distinguishable in an ID mask
+min_spacing = 2.0
+
+# The lattice used to estimate how the number of free colors grows as the spacing shrinks
+_probe_spacing = 12.0
+
+# The D65 white point
+_white = (0.95047, 1.0, 1.08883)
+
+# ---------------------------------------------------
+#                 Color Conversion
+# ---------------------------------------------------
+
+
+def _to_linear(channel):
+    return channel / 12.92 if channel <= 0.04045 else ((channel + 0.055) / 1.055) ** 2.4
+
+
+def _to_gamma(channel):
+    return channel * 12.92 if channel <= 0.0031308 else 1.055 * channel ** (1 / 2.4) - 0.055
+
+
+def _lab_f(t):
+    return t ** (1.0 / 3.0) if t > 0.008856 else 7.787 * t + 16.0 / 116.0
+
+
+def _lab_f_inverse(t):
+    return t ** 3 if t > 0.206893 else (t - 16.0 / 116.0) / 7.787
+
+
+def rgb_to_lab(rgb):
+    """
+    :param rgb: An r, g, b tuple on a 0-255 scale
+    :return: An L, a, b tuple
+    """
+    r, g, b = [_to_linear(c / 255.0) for c in rgb]
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / _white[0]
+    y = (0.2126 * r + 0.7152 * g + 0.0722 * b) / _white[1]
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / _white[2]
+    fx, fy, fz = _lab_f(x), _lab_f(y), _lab_f(z)
+    return 116.0 * fy - 16.0, 500.0 * (fx - fy), 200.0 * (fy - fz)
+
+
+def lab_to_rgb(lab):
+    """
+    :param lab: An L, a, b tuple
+    :return: An r, g, b tuple of floats on a 0-1 scale, outside that range when the color is out of gamut
+    """
+    fy = (lab[0] + 16.0) / 116.0
+    x = _lab_f_inverse(fy + lab[1] / 500.0) * _white[0]
+    y = _lab_f_inverse(fy) * _white[1]
+    z = _lab_f_inverse(fy - lab[2] / 200.0) * _white[2]
+    r = 3.2406 * x - 1.5372 * y - 0.4986 * z
+    g = -0.9689 * x + 1.8758 * y + 0.0415 * z
+    b = 0.0557 * x - 0.2040 * y + 1.0570 * z
+    return tuple([_to_gamma(c) if c > 0.0 else c for c in (r, g, b)])
+
+
+def delta_e(lab_a, lab_b):
+    """
+    :return: The CIE76 color difference between two L, a, b tuples
+    """
+    return math.sqrt(sum([(p - q) ** 2 for p, q in zip(lab_a, lab_b)]))
+
+
+def passes_checks(rgb):
+    """
+    The Barn wire color checks: colors which are too grey or too dark are hard to see in the viewport
+    :param rgb: An r, g, b tuple on a 0-255 scale
+    :return: True if the color is saturated and bright enough
+    """
+    h, s, v = colorsys.rgb_to_hsv(*[c / 255.0 for c in rgb])
+    return s * 255.0 > min_saturation and v * 255.0 > min_value
+
+
+# ---------------------------------------------------
+#                   Lattice
+# ---------------------------------------------------
+
+# The extent of the lattice on each axis of CIELAB, enough to hold every displayable color
+_lab_ranges = ((0.0, 100.0), (-87.0, 99.0), (-108.0, 95.0))
+
+
+def _blocked_points(spacing, existing):
+    """
+    :param spacing: The distance between neighbouring lattice points
+    :param existing: A list of L, a, b tuples
+    :return: A set of the indices of the lattice points closer than a spacing to an existing color
+    """
+    limit = spacing * spacing
+    blocked = set()
+    for lab in existing:
+        # The lattice points are at the middle of each step, only the ones either side on every axis can be close
+        candidates = list()
+        for c, (low, high) in zip(lab, _lab_ranges):
+            nearest = int(math.floor((c - low) / spacing - 0.5))
+            candidates.append([(i, low + spacing * (i + 0.5)) for i in (nearest, nearest + 1)])
+        for li, lp in candidates[0]:
+            for ai, ap in candidates[1]:
+                for bi, bp in candidates[2]:
+                    if (lab[0] - lp) ** 2 + (lab[1] - ap) ** 2 + (lab[2] - bp) ** 2 < limit:
+                        blocked.add((li, ai, bi))
+    return blocked
+
+
+def _lattice(spacing, existing):
+    """
+    The lattice points which are displayable, pass the wire color checks and are clear of the existing colors
+    X only depends on L and a, and Z on L and b, so they are worked out once for each row rather than for every point
+    :param spacing: The distance between neighbouring points
+    :param existing: A list of L, a, b tuples
+    :return: A list of r, g, b tuples on a 0-255 scale
+    """
+    blocked = _blocked_points(spacing, existing)
+    points = list()
+
+    def steps(low, high):
+        return [(i, low + spacing * (i + 0.5)) for i in range(int((high - low) / spacing))]
+
+    l_steps, a_steps, b_steps = [steps(low, high) for low, high in _lab_ranges]
+
+    for li, lightness in l_steps:
+        fy = (lightness + 16.0) / 116.0
+        y = _lab_f_inverse(fy) * _white[1]
+        xs = [(ai, _lab_f_inverse(fy + a / 500.0) * _white[0]) for ai, a in a_steps]
+        zs = [(bi, _lab_f_inverse(fy - b / 200.0) * _white[2]) for bi, b in b_steps]
+
+        for ai, x in xs:
+            r_xy = 3.2406 * x - 1.5372 * y
+            g_xy = -0.9689 * x + 1.8758 * y
+            b_xy = 0.0557 * x - 0.2040 * y
+            for bi, z in zs:
+                r = r_xy - 0.4986 * z
+                g = g_xy + 0.0415 * z
+                bl = b_xy + 1.0570 * z
+                # gamma is monotonic, so the gamut can be checked on the linear values
+                if r < 0.0 or g < 0.0 or bl < 0.0 or r > 1.0 or g > 1.0 or bl > 1.0:
+                    continue
+                rgb = (int(round(_to_gamma(r) * 255.0)), int(round(_to_gamma(g) * 255.0)),
+                       int(round(_to_gamma(bl) * 255.0)))
+                if not passes_checks(rgb):
+                    continue
+                if blocked and (li, ai, bi) in blocked:
+                    continue
+                points.append(rgb)
+    return points
+
+
+def distinct_colors(count, existing=(), seed=None):
+    """
+    Picks colors which are as far apart as possible, from each other and from the existing colors
+    :param count: The number of colors needed
+    :param existing: A list of r, g, b tuples on a 0-255 scale which the new colors should stand apart from
+    :param seed: Shuffles the order the colors are returned in, the same seed gives the same order
+    :return: A list of count r, g, b tuples on a 0-255 scale, every one different
+    """
+    if count < 1:
+        return list()
+
+    existing_labs = [rgb_to_lab(c) for c in set([tuple(c) for c in existing])]
+
+    # The number of free points grows with the cube of 1 / spacing, which gives a first guess from a coarse lattice
+    probe = len(_lattice(_probe_spacing, existing_labs))
+    spacing = _probe_spacing * (float(max(probe, 1)) / count) ** (1.0 / 3.0)
+    spacing = max(min_spacing, min(spacing, 100.0))
+
+    points = _lattice(spacing, existing_labs)
+    while len(points) < count and spacing > min_spacing:
+        # Existing colors take up more of a narrower lattice than the guess allows for, so guess again from this one
+        shrink = (float(max(len(points), 1)) / count) ** (1.0 / 3.0)
+        spacing = max(min_spacing, spacing * min(0.9, shrink * 0.95))
+        points = _lattice(spacing, existing_labs)
+
+    # Rounding to whole numbers can't bring two points a spacing apart together, but leave nothing to chance
+    seen = set()
+    points = [p for p in points if not (p in seen or seen.add(p))]
+
+    mlg.debug("{0} colors at a minimum Delta E of {1:.1f}, {2} lattice points".format(count, spacing, len(points)))
+
+    rnd = random.Random(seed)
+    rnd.shuffle(points)
+    if len(points) >= count:
+        return points[:count]
+
+    # More colors than the narrowest lattice holds, the rest are only kept unique
+    mlg.warning("Only {0} of {1} colors could be kept {2:.1f} Delta E apart".format(len(points), count, spacing))
+    used = set(points)
+    used.update([tuple(c) for c in existing])
+    while len(points) < count:
+        rgb = (rnd.randrange(3, 256), rnd.randrange(3, 256), rnd.randrange(3, 256))
+        if rgb not in used and passes_checks(rgb):
+            used.add(rgb)
+            points.append(rgb)
+    return points
@@ -8,6 +8,8 @@ import PySide2.QtGui as QtG
 import pymxs
 rt = pymxs.runtime
 
+import renderFarmingFrames as rFF
+
 
 class QTimeSegDialogUI(QtW.QDialog):
 
@@ -26,6 +28,7 @@ class QTimeSegDialogUI(QtW.QDialog):
         self._start_frame = 0
         self._end_frame = 0
         self._nth_frame = 1
+        self._frames = rFF.FrameSet()
 
         self._status_message = str()
 
@@ -64,7 +67,9 @@ class QTimeSegDialogUI(QtW.QDialog):
         if self._end_frame < self._start_frame:
             self._status_message = "ERROR: Start Frame is greater than End Frame"
             self.reject()
+            return
 
+        self._frames = rFF.FrameSet.from_range(self._start_frame, self._end_frame, self._nth_frame)
         self._set_time_segment()
 
         self._status_message = "OK"
@@ -87,6 +92,12 @@ class QTimeSegDialogUI(QtW.QDialog):
     def get_nth_frame(self):
         return self._nth_frame
 
+    def get_frames(self):
+        """
+        :return: A FrameSet of the frames the accepted time segment renders
+        """
+        return self._frames
+
 
 class QTimeSegDialogDefinition(QtW.QWidget):
     """
@@ -0,0 +1,581 @@
+import os
+import json
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+import renderFarmingFrames as rFF
+import renderFarmingSpinach as rFS
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.Queue")
+
+# Item states
+pending = "pending"
+running = "running"
+done = "done"
+failed = "failed"
+blocked = "blocked"
+
+# Prepasses which build a single GI file over every frame have to start over after a crash, the rest write each
+# frame to its own file and can pick up where they left off
+restart_render_types = (0, 2, 6)
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Renders one frame with the current render settings.  The renderer saves its own GI files and V-Ray raw output,
+# the output file is only needed for the 3ds Max frame buffer.
+_render_frame_source = """
+fn rfRenderQueueFrame cam frame_number output_file = (
+    local cancelled = false
+    local bm = if output_file == "" then (
+        render camera:cam frame:frame_number vfb:false quiet:true cancelled:&cancelled
+    ) else (
+        render camera:cam frame:frame_number outputFile:output_file vfb:false quiet:true cancelled:&cancelled
+    )
+    if bm != undefined do close bm
+    not cancelled
+)
+"""
+
+# Renders a range as one sequence.  Multi Frame Incremental and animation prepasses build their GI file over every
+# frame of a single render, separate renders would each start a new map.
+_render_sequence_source = """
+fn rfRenderQueueSequence cam first_frame last_frame nth output_file = (
+    local cancelled = false
+    local bm = if output_file == "" then (
+        render camera:cam fromframe:first_frame toframe:last_frame nthframe:nth vfb:false quiet:true \
+            cancelled:&cancelled
+    ) else (
+        render camera:cam fromframe:first_frame toframe:last_frame nthframe:nth outputFile:output_file vfb:false \
+            quiet:true cancelled:&cancelled
+    )
+    if bm != undefined do close bm
+    not cancelled
+)
+"""
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def render_setting_frames():
+    """
+    Reads the frames 3ds Max will render from the Time Output render settings
+    :return: A sorted list of integer frame numbers
+    """
+    time_type = int(rt.rendTimeType)
+    nth = max(1, int(rt.rendNThFrame))
+
+    if time_type is 1:
+        return [int(rt.sliderTime)]
+    if time_type is 4:
+        return rFF.expand_frames(str(rt.rendPickupFrames))
+
+    if time_type is 3:
+        start, end = int(rt.rendStart), int(rt.rendEnd)
+    else:
+        start, end = int(rt.animationRange.start), int(rt.animationRange.end)
+    return range(start, end + 1, nth)
+
+
+class RenderQueueItem(object):
+    """
+    A single prepass or beauty pass waiting in the queue
+    The Spinach settings are stored rather than the render settings, so the pass is prepared again when it runs
+    """
+    def __init__(self, item_id, scene, camera, start, end, pass_name, render_type, settings, depends_on=None,
+                 status=pending, frames=None, finished=None, error=str()):
+        self._id = item_id
+        self._scene = scene
+        self._camera = camera
+        self._start = start
+        self._end = end
+        self._pass_name = pass_name
+        self._render_type = render_type
+        self._settings = settings
+        self._depends_on = depends_on
+        self._status = status
+        self._frames = frames if frames is not None else list()
+        self._finished = finished if finished is not None else list()
+        self._error = error
+
+    def get_id(self):
+        return self._id
+
+    def get_scene(self):
+        return self._scene
+
+    def get_camera(self):
+        return self._camera
+
+    def get_range(self):
+        return self._start, self._end
+
+    def get_pass_name(self):
+        return self._pass_name
+
+    def get_render_type(self):
+        return self._render_type
+
+    def get_settings(self):
+        return self._settings
+
+    def get_depends_on(self):
+        return self._depends_on
+
+    def get_status(self):
+        return self._status
+
+    def get_frames(self):
+        return self._frames
+
+    def get_finished(self):
+        return self._finished
+
+    def get_remaining(self):
+        finished = set(self._finished)
+        return [f for f in self._frames if f not in finished]
+
+    def get_error(self):
+        return self._error
+
+    def is_prepass(self):
+        return self._pass_name == "prepass"
+
+    def is_resumable(self):
+        return self._render_type not in restart_render_types
+
+    def set_status(self, status, error=str()):
+        self._status = status
+        self._error = error
+
+    def set_frames(self, frames):
+        self._frames = list(frames)
+
+    def add_finished(self, frame):
+        self._finished.append(frame)
+
+    def clear_finished(self):
+        self._finished = list()
+
+    def to_dict(self):
+        return {
+            "id": self._id,
+            "scene": self._scene,
+            "camera": self._camera,
+            "range": [self._start, self._end],
+            "pass": self._pass_name,
+            "render_type": self._render_type,
+            "settings": self._settings,
+            "depends_on": self._depends_on,
+            "status": self._status,
+            "frames": rFF.compact_frames(self._frames),
+            "finished": rFF.compact_frames(self._finished),
+            "error": self._error
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(int(data["id"]),
+                   data["scene"],
+                   data["camera"],
+                   int(data["range"][0]),
+                   int(data["range"][1]),
+                   data["pass"],
+                   int(data["render_type"]),
+                   data.get("settings", dict()),
+                   data.get("depends_on"),
+                   data.get("status", pending),
+                   rFF.expand_frames(data.get("frames", str())),
+                   rFF.expand_frames(data.get("finished", str())),
+                   data.get("error", str()))
+
+    def __str__(self):
+        return "{0}: {1} {2} {3} type {4} - {5}".format(self._id, os.path.basename(self._scene), self._camera,
+                                                       self._pass_name, self._render_type, self._status)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RenderQueue(object):
+    """
+    Passes waiting to be rendered on this workstation, kept in a json file
+    The file is rewritten after every change, including every finished frame, so the queue survives a crash
+    """
+    def __init__(self, file_path):
+        self._clg = logging.getLogger("renderFarming.Queue.RenderQueue")
+
+        self._file_path = file_path
+        self._items = list()
+        self._next_id = 1
+
+        self._read()
+
+    def _read(self):
+        # A crash during a save can leave only the temporary file behind
+        for path in (self._file_path, self._file_path + ".tmp"):
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r') as queue_file:
+                    data = json.load(queue_file)
+                self._items = [RenderQueueItem.from_dict(i) for i in data.get("items", list())]
+                self._next_id = int(data.get("next_id", len(self._items) + 1))
+                self._clg.debug("Read {0} render queue items from {1}".format(len(self._items), path))
+                return
+            except (IOError, ValueError, KeyError) as e:
+                self._clg.error("Unable to read the render queue {0}: {1}".format(path, e))
+
+    def save(self):
+        """
+        Writes the queue to a temporary file and swaps it in, so a crash never leaves a half written queue
+        :return: True for success, False for failure
+        """
+        data = {"next_id": self._next_id, "items": [i.to_dict() for i in self._items]}
+        temp_path = self._file_path + ".tmp"
+        try:
+            with open(temp_path, 'w') as queue_file:
+                json.dump(data, queue_file, indent=4, sort_keys=True)
+            if os.path.isfile(self._file_path):
+                os.remove(self._file_path)
+            os.rename(temp_path, self._file_path)
+            return True
+        except (IOError, OSError) as e:
+            self._clg.error("IO Error, Failed to write the render queue {0}: {1}".format(self._file_path, e))
+            return False
+
+    # ---------------------------------------------------
+    #                       Adding
+    # ---------------------------------------------------
+
+    def add_pass(self, scene, camera, start, end, pass_name, render_type, settings, depends_on=None):
+        """
+        Adds a single pass to the end of the queue
+        :return: The new RenderQueueItem
+        """
+        item = RenderQueueItem(self._next_id, scene, camera, start, end, pass_name, render_type, settings,
+                               depends_on)
+        self._next_id += 1
+        self._items.append(item)
+        self._clg.info("Queued {}".format(item))
+        return item
+
+    def add_job(self, scene, camera, start, end, settings, prepass_type, beauty_type):
+        """
+        Adds a prepass and the beauty pass that depends on it
+        :param scene: The full path of the max file
+        :param camera: The camera name
+        :param start: The first frame of the active segment
+        :param end: The last frame of the active segment
+        :param settings: SpinachJob settings, see SpinachJob.get_settings()
+        :param prepass_type: The Spinach render type of the prepass, -1 for none
+        :param beauty_type: The Spinach render type of the beauty pass, -1 for none
+        :return: A list of the new RenderQueueItem objects
+        """
+        items = list()
+        if prepass_type >= 0:
+            items.append(self.add_pass(scene, camera, start, end, "prepass", prepass_type, settings))
+        if beauty_type >= 0:
+            depends_on = items[0].get_id() if len(items) > 0 else None
+            items.append(self.add_pass(scene, camera, start, end, "beauty", beauty_type, settings, depends_on))
+        self.save()
+        return items
+
+    def add_shot(self, shot, scene):
+        """
+        Queues the passes of a shot from a shot list
+        :param shot: A renderFarmingShotList.Shot
+        :param scene: The full path of the max file
+        :return: A list of the new RenderQueueItem objects
+        """
+        start, end = shot.get_range()
+        return self.add_job(scene, shot.get_camera(), start, end, shot.get_settings(),
+                            shot.get_prepass_type(), shot.get_beauty_type())
+
+    # ---------------------------------------------------
+    #                      Managing
+    # ---------------------------------------------------
+
+    def get_items(self):
+        return self._items
+
+    def get_item(self, item_id):
+        for item in self._items:
+            if item.get_id() == item_id:
+                return item
+        return None
+
+    def get_file_path(self):
+        return self._file_path
+
+    def remove(self, item_id):
+        """
+        Removes an item and every item that depends on it
+        :return: The number of items removed
+        """
+        doomed = set([item_id])
+        for item in self._items:
+            if item.get_depends_on() in doomed:
+                doomed.add(item.get_id())
+
+        count = len(self._items)
+        self._items = [i for i in self._items if i.get_id() not in doomed]
+        self.save()
+        return count - len(self._items)
+
+    def clear_finished(self):
+        """
+        Removes every item which is done, failed or blocked
+        :return: The number of items removed
+        """
+        count = len(self._items)
+        self._items = [i for i in self._items if i.get_status() in (pending, running)]
+        self.save()
+        return count - len(self._items)
+
+    def next_item(self):
+        """
+        Finds the next item to render.  An item that was running when Max crashed is picked up first since it comes
+        before anything still pending.  Items whose prepass failed are marked as blocked.
+        :return: A RenderQueueItem or None if nothing is left
+        """
+        for item in self._items:
+            if item.get_status() not in (pending, running):
+                continue
+
+            depends_on = item.get_depends_on()
+            if depends_on is not None:
+                dependency = self.get_item(depends_on)
+                if dependency is not None and dependency.get_status() in (failed, blocked):
+                    item.set_status(blocked, "Pass {} did not finish".format(depends_on))
+                    self.save()
+                    continue
+                if dependency is not None and dependency.get_status() != done:
+                    continue
+
+            return item
+        return None
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class RenderQueueRunner(rFS.SpinachObserver):
+    """
+    Renders the queue back to back on this workstation
+    Each pass is prepared with Spinach when it starts, and the queue is saved after every frame
+    """
+    def __init__(self, cfg, queue):
+        """
+        :param cfg: A Configuration object
+        :param queue: A RenderQueue
+        """
+        self._clg = logging.getLogger("renderFarming.Queue.RenderQueueRunner")
+
+        self._cfg = cfg
+        self._queue = queue
+        self._stopped = False
+        self._stop_reason = str()
+        self._last_message = None
+
+    def get_stop_reason(self):
+        """
+        :return: Why the last run stopped before the queue was empty, an empty string if it didn't
+        """
+        return self._stop_reason
+
+    def on_status_update(self, message):
+        self._last_message = message
+
+    def _open_scene(self, item):
+        scene = item.get_scene()
+        if not scene:
+            # Queued from an unsaved scene, whatever is open now may not be it
+            item.set_status(failed, "Queued without a saved scene")
+            return False
+
+        current = os.path.join(str(rt.maxFilePath), str(rt.maxFileName))
+        if os.path.normcase(current) == os.path.normcase(scene):
+            return True
+
+        if rt.getSaveRequired():
+            # Loading would throw away the changes, the item waits until the scene has been saved
+            self._stop_reason = "Save or reset the open scene before the queue opens {}".format(scene)
+            self._clg.error(self._stop_reason)
+            self._stopped = True
+            return False
+
+        self._clg.info("Opening {}".format(scene))
+        if not os.path.isfile(scene) or not rt.loadMaxFile(scene, quiet=True):
+            item.set_status(failed, "Unable to open {}".format(scene))
+            return False
+        return True
+
+    def _prepare(self, item):
+        """
+        Sets the camera and range and prepares the pass with a new SpinachJob
+        :return: The camera node if the pass should be rendered, None otherwise
+        """
+        camera = rt.getNodeByName(item.get_camera())
+        if camera is None:
+            item.set_status(failed, "Camera {} is not in the scene".format(item.get_camera()))
+            return None
+
+        rt.animationRange = rt.interval(item.get_range()[0], item.get_range()[1])
+
+        # The camera is handed over rather than set in a viewport, render() is given it too
+        job = rFS.SpinachJob(self._cfg)
+        job.set_camera(camera)
+        job.add_observer(self)
+        job.apply_settings(item.get_settings())
+
+        self._last_message = None
+        job.prepare_job()
+        if not job.get_ready_status():
+            item.set_status(failed, self._message_text())
+            return None
+
+        if item.is_prepass():
+            prepared = job.prepare_prepass(item.get_render_type())
+        else:
+            prepared = job.prepare_beauty_pass(item.get_render_type())
+
+        if not prepared:
+            # A prepass whose GI cache is already current is reported as ready but not prepared
+            if self._last_message is not None and self._last_message.get_message_type() == "Ready":
+                item.set_status(done, self._message_text())
+            else:
+                item.set_status(failed, self._message_text())
+            return None
+
+        return camera
+
+    def _message_text(self):
+        return self._last_message.get_message() if self._last_message is not None else str()
+
+    # noinspection PyMethodMayBeStatic
+    def _output_file(self, frame):
+        """
+        :return: The numbered file the 3ds Max frame buffer is saved to, or an empty string if it isn't saved
+        """
+        output = str(rt.rendOutputFilename)
+        if not rt.rendSaveFile or output == "":
+            return str()
+        base, ext = os.path.splitext(output)
+        return "{0}{1:04d}{2}".format(base, frame, ext)
+
+    def _render(self, item, camera):
+        """
+        Renders the item's remaining frames
+        :return: False if the render was cancelled
+        """
+        if len(item.get_frames()) == 0:
+            item.set_frames(render_setting_frames())
+        if not item.is_resumable():
+            item.clear_finished()
+
+        item.set_status(running)
+        self._queue.save()
+
+        if not item.is_resumable():
+            return self._render_sequence(item, camera)
+
+        render_frame = rFT.define_mxs_function(rt, "rfRenderQueueFrame", _render_frame_source)
+        for frame in item.get_remaining():
+            if self._stopped:
+                return False
+            self._clg.debug("Rendering {0} frame {1}".format(item, frame))
+            if not render_frame(camera, frame, self._output_file(frame)):
+                self._clg.info("Render cancelled on frame {}".format(frame))
+                return False
+            item.add_finished(frame)
+            self._queue.save()
+
+        item.set_status(done)
+        return True
+
+    def _render_sequence(self, item, camera):
+        """
+        Renders every frame of the item in a single render, for prepasses that build one GI file over the sequence
+        Picked up frames which aren't evenly spaced are covered by the widest step that reaches all of them
+        :return: False if the render was cancelled
+        """
+        frames = sorted(item.get_frames())
+        if len(frames) == 0:
+            item.set_status(done)
+            return True
+
+        steps = [b - a for a, b in zip(frames, frames[1:])]
+        nth = reduce(_gcd, steps) if len(steps) > 0 else 1
+
+        output = str(rt.rendOutputFilename) if rt.rendSaveFile else str()
+
+        render_sequence = rFT.define_mxs_function(rt, "rfRenderQueueSequence", _render_sequence_source)
+        self._clg.debug("Rendering {0} frames {1} to {2} every {3}".format(item, frames[0], frames[-1], nth))
+        if not render_sequence(camera, frames[0], frames[-1], max(1, nth), output):
+            self._clg.info("Render cancelled on {}".format(item))
+            return False
+
+        for frame in frames:
+            item.add_finished(frame)
+        item.set_status(done)
+        return True
+
+    def stop(self):
+        """
+        Stops the queue after the frame being rendered
+        :return: None
+        """
+        self._stopped = True
+
+    def run(self):
+        """
+        Renders every pass in the queue until it is empty, cancelled or stopped
+        :return: A list of the RenderQueueItem objects that were run
+        """
+        self._stopped = False
+        self._stop_reason = str()
+        ran = list()
+
+        original_scene = os.path.join(str(rt.maxFilePath), str(rt.maxFileName))
+        original_range = rt.animationRange
+
+        try:
+            while not self._stopped:
+                item = self._queue.next_item()
+                if item is None:
+                    break
+
+                opened = self._open_scene(item)
+                if self._stopped:
+                    # The item is left as it was for the next run
+                    break
+                ran.append(item)
+                self._clg.info("Starting {}".format(item))
+
+                if opened:
+                    camera = self._prepare(item)
+                    if camera is not None and not self._render(item, camera):
+                        # Cancelled, the item is left running so it resumes next time
+                        self._stopped = True
+
+                self._queue.save()
+                self._clg.info("Finished {}".format(item))
+        finally:
+            # Nothing is restored if the queue opened another scene
+            if os.path.join(str(rt.maxFilePath), str(rt.maxFileName)) == original_scene:
+                rt.animationRange = original_range
+
+        return ran
@@ -0,0 +1,494 @@
+import os
+import re
+import json
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.RenderElements")
+
+# The default file name for every render element, tokens are expanded per element
+default_template = "$(dir)\\frame_$(name).$(ext)"
+
+# ---------------------------------------------------
+#                 MaxScript Functions
+# ---------------------------------------------------
+
+# Max's render element manager uses indexes instead of returning actual objects, so walking it from python costs
+# several round trips per element.  These functions do the walking on the MaxScript side in a single call.
+
+_collect_source = """
+fn rfCollectRenderElements = (
+    local rem = maxOps.GetCurRenderElementMgr()
+    local result = #()
+    for i = 0 to (rem.NumRenderElements() - 1) do (
+        local el = rem.GetRenderElement i
+        append result #(el, (classOf el) as string, el.elementName, el.enabled)
+    )
+    result
+)
+"""
+
+_set_filenames_source = """
+fn rfSetRenderElementFilenames file_names = (
+    local rem = maxOps.GetCurRenderElementMgr()
+    for i = 1 to file_names.count do (
+        rem.SetRenderElementFilename (i - 1) file_names[i]
+    )
+    file_names.count
+)
+"""
+
+# ---------------------------------------------------
+#                   Classes
+# ---------------------------------------------------
+
+
+class RenderElementInfo(object):
+    """
+    A render element along with the information read about it in the snapshot
+    """
+    def __init__(self, index, element, class_name, name, enabled=True):
+        self._index = index
+        self._element = element
+        self._class_name = class_name
+        self._name = name
+        self._enabled = enabled
+
+    def get_index(self):
+        return self._index
+
+    def get_element(self):
+        return self._element
+
+    def get_class_name(self):
+        return self._class_name
+
+    def get_name(self):
+        return self._name
+
+    def is_enabled(self):
+        return self._enabled
+
+    def __str__(self):
+        return "{0}: {1} ({2})".format(self._index, self._name, self._class_name)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RenderElementSnapshot(object):
+    """
+    Every render element in the scene, read in a single round trip
+    """
+    def __init__(self):
+        self._elements = list()
+        self._by_class = dict()
+
+        self._read()
+
+    def _read(self):
+        collected = rFT.define_mxs_function(rt, "rfCollectRenderElements", _collect_source)()
+
+        for index, item in enumerate(collected):
+            info = RenderElementInfo(index, item[0], str(item[1]), str(item[2]), bool(item[3]))
+            self._elements.append(info)
+            self._by_class.setdefault(info.get_class_name(), list()).append(info)
+
+        mlg.debug("Render element snapshot taken, {} elements".format(len(self._elements)))
+
+    def get_elements(self):
+        return self._elements
+
+    def of_class(self, class_name):
+        return self._by_class.get(class_name, list())
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __iter__(self):
+        return iter(self._elements)
+
+
+class NamingTemplate(object):
+    """
+    A file naming template using the same $(token) format as the frames sub folder field
+    The template is split into literals and tokens once, so expanding it per element is only a join
+        Tokens:
+            $(dir): The output directory
+            $(name): The element name
+            $(class): The element's class name
+            $(ext): The file extension
+    """
+    _token_pattern = re.compile(r"\$\((\w+)\)")
+    valid_tokens = ("dir", "name", "class", "ext")
+
+    def __init__(self, template):
+        self._template = template
+        self._parts = list()
+
+        self._compile()
+
+    def _compile(self):
+        position = 0
+        for match in self._token_pattern.finditer(self._template):
+            token = match.group(1)
+            if token not in self.valid_tokens:
+                raise RenderElementTemplateError(self._template, token)
+            if match.start() > position:
+                self._parts.append((False, self._template[position:match.start()]))
+            self._parts.append((True, token))
+            position = match.end()
+        if position < len(self._template):
+            self._parts.append((False, self._template[position:]))
+
+    def expand(self, values):
+        """
+        Expands the template
+        :param values: A dictionary with a value for each token
+        :return: The expanded string
+        """
+        return "".join([values[text] if is_token else text for is_token, text in self._parts])
+
+    def get_template(self):
+        return self._template
+
+    def __str__(self):
+        return self._template
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RoutingRule(object):
+    """
+    A single entry in the routing table
+    Matches on either an element class or a name pattern, * and ? are wildcards in name patterns
+    """
+    def __init__(self, index, class_name=None, name_pattern=None, folder=str(), extension=None, template=None):
+        self._index = index
+        self._class_name = class_name
+        self._name_pattern = name_pattern
+        self._folder = folder
+        self._extension = extension
+        self._template = NamingTemplate(template) if template else None
+
+    def get_index(self):
+        return self._index
+
+    def get_class_name(self):
+        return self._class_name
+
+    def get_name_pattern(self):
+        return self._name_pattern
+
+    def get_folder(self):
+        return self._folder
+
+    def get_extension(self):
+        return self._extension
+
+    def get_template(self):
+        return self._template
+
+    def __str__(self):
+        match = "class {}".format(self._class_name) if self._class_name else "name {}".format(self._name_pattern)
+        return "{0}: {1} -> {2}".format(self._index, match, self._folder)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class RoutingTable(object):
+    """
+    Sends render elements to sub folders with their own extension and naming template
+    The table is a json file formatted as follows:
+        {
+            "rules": [
+                {"class": "VRayCryptomatte", "folder": "crypto"},
+                {"name": "data_*", "folder": "data", "extension": "exr", "template": "$(dir)\\$(name).$(ext)"}
+            ]
+        }
+    Rules are checked in order and the first match wins.  Class rules are a dictionary lookup and the name
+    patterns are compiled into a few large alternations, so matching doesn't slow down with the number of rules.
+    """
+    # Python 2.7's re module can't compile more than 100 groups in one pattern
+    _patterns_per_block = 90
+
+    def __init__(self, rules=None):
+        self._rules = list()
+        self._class_rules = dict()
+        self._name_blocks = list()
+
+        for rule in rules if rules is not None else list():
+            self._add(rule)
+        self._compile()
+
+    # noinspection PyMethodMayBeStatic
+    def _glob_to_regex(self, pattern):
+        return re.escape(pattern).replace("\\*", ".*").replace("\\?", ".")
+
+    def _add(self, rule):
+        if not isinstance(rule, dict):
+            raise RoutingError("Rule {0} is not an object: {1}".format(len(self._rules), rule))
+        if ("class" in rule) == ("name" in rule):
+            raise RoutingError("Rule {0} needs either a \"class\" or a \"name\", but not both".format(len(self._rules)))
+
+        routing_rule = RoutingRule(len(self._rules),
+                                   class_name=rule.get("class"),
+                                   name_pattern=rule.get("name"),
+                                   folder=rule.get("folder", str()),
+                                   extension=rule.get("extension"),
+                                   template=rule.get("template"))
+        self._rules.append(routing_rule)
+
+        # Only the first rule for a class can ever match
+        if routing_rule.get_class_name() is not None:
+            self._class_rules.setdefault(routing_rule.get_class_name(), routing_rule)
+
+    def _compile(self):
+        """
+        Compiles the name patterns into blocks of alternations.  Each alternative is a group, so the group that
+        matched gives back the rule.  Alternatives are tried left to right which keeps rule order.
+        :return: None
+        """
+        name_rules = [r for r in self._rules if r.get_name_pattern() is not None]
+
+        for start in range(0, len(name_rules), self._patterns_per_block):
+            block = name_rules[start:start + self._patterns_per_block]
+            pattern = "|".join(["({})".format(self._glob_to_regex(r.get_name_pattern())) for r in block])
+            self._name_blocks.append((re.compile("^(?:{})$".format(pattern), re.IGNORECASE), block))
+
+    def match(self, class_name, name):
+        """
+        Finds the first rule that applies to a render element
+        :param class_name: The class name of the render element
+        :param name: The name of the render element
+        :return: A RoutingRule or None
+        """
+        class_rule = self._class_rules.get(class_name)
+        limit = class_rule.get_index() if class_rule is not None else len(self._rules)
+
+        for regex, block in self._name_blocks:
+            # Name rules after the class rule can't win
+            if block[0].get_index() > limit:
+                break
+            result = regex.match(name)
+            if result is not None:
+                name_rule = block[result.lastindex - 1]
+                if name_rule.get_index() < limit:
+                    return name_rule
+                break
+
+        return class_rule
+
+    def get_rules(self):
+        return self._rules
+
+    def __len__(self):
+        return len(self._rules)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Reads a routing table from a json file
+        :param file_path: The path to the json file
+        :return: A RoutingTable
+        """
+        try:
+            with open(file_path, 'r') as routing_file:
+                data = json.load(routing_file)
+        except IOError as e:
+            raise RoutingError("Unable to read routing table {0}: {1}".format(file_path, e))
+        except ValueError as e:
+            raise RoutingError("Routing table {0} is not valid json: {1}".format(file_path, e))
+
+        if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+            raise RoutingError("Routing table {} needs a \"rules\" list".format(file_path))
+
+        try:
+            return cls(data["rules"])
+        except RenderElementTemplateError as e:
+            raise RoutingError("Routing table {0} has a bad template. {1}".format(file_path, e))
+
+
+class RenderElementOutput(object):
+    """
+    Assigns output file names to every render element in the scene
+    The scene is read once into a snapshot which is reused until invalidate() is called
+    All file names are computed in python and written in one round trip
+    """
+    def __init__(self, template=default_template, extension="exr"):
+        self._clg = logging.getLogger("renderFarming.RenderElements.RenderElementOutput")
+
+        self._snapshot = None
+        self._template = NamingTemplate(template)
+        self._extension = extension
+        self._class_extensions = dict()
+        self._routing = RoutingTable()
+
+    def _write_filenames(self, file_names):
+        rFT.define_mxs_function(rt, "rfSetRenderElementFilenames", _set_filenames_source)(file_names)
+
+    # ---------------------------------------------------
+    #                       Public
+    # ---------------------------------------------------
+
+    def snapshot(self):
+        """
+        Gets the render element snapshot, reading it from the scene if there isn't a current one
+        :return: A RenderElementSnapshot
+        """
+        if self._snapshot is None:
+            self._snapshot = RenderElementSnapshot()
+        return self._snapshot
+
+    def invalidate(self):
+        """
+        Discards the snapshot so that the next operation reads the scene again
+        :return: None
+        """
+        self._snapshot = None
+
+    def file_names(self, directory):
+        """
+        Computes the output file name for every render element
+        :param directory: The folder the elements are written to
+        :return: A list of file names in render element order
+        """
+        values = dict()
+        file_names = list()
+
+        for info in self.snapshot():
+            class_name = info.get_class_name()
+            rule = self._routing.match(class_name, info.get_name())
+
+            values["dir"] = directory
+            values["name"] = info.get_name()
+            values["class"] = class_name
+            values["ext"] = self._class_extensions.get(class_name, self._extension)
+            template = self._template
+
+            if rule is not None:
+                if rule.get_folder():
+                    values["dir"] = os.path.join(directory, rule.get_folder())
+                if rule.get_extension():
+                    values["ext"] = rule.get_extension()
+                if rule.get_template() is not None:
+                    template = rule.get_template()
+
+            file_names.append(template.expand(values))
+
+        return file_names
+
+    def directories(self, directory):
+        """
+        Lists every folder that render elements will be written to
+        :param directory: The folder the elements are written to
+        :return: A sorted list of folders
+        """
+        folders = set()
+        for info in self.snapshot():
+            rule = self._routing.match(info.get_class_name(), info.get_name())
+            if rule is not None and rule.get_folder():
+                folders.add(os.path.join(directory, rule.get_folder()))
+            else:
+                folders.add(directory)
+        return sorted(folders)
+
+    def assign(self, directory):
+        """
+        Sets all of the scene's render elements to save to the directory
+        :param directory: The folder the elements are written to
+        :return: None
+        """
+        file_names = self.file_names(directory)
+        self._clg.info("Setting Output for {} Render Elements".format(len(file_names)))
+
+        # Only walks the elements again when someone will read the messages
+        if self._clg.isEnabledFor(logging.DEBUG):
+            for info, file_name in zip(self.snapshot(), file_names):
+                self._clg.debug("Assigning render element: {0} to file name: {1}".format(info.get_name(), file_name))
+
+        self._write_filenames(file_names)
+
+    def clear(self):
+        """
+        Sets all of the scene's render elements to have blank strings in their output path
+        :return: None
+        """
+        count = len(self.snapshot())
+        self._clg.info("Clearing Output for {} Render Elements".format(count))
+        self._write_filenames([str()] * count)
+
+    def set_denoiser(self, enabled):
+        """
+        Enables or disables any VRayDenoiser elements in the VFB
+        :param enabled: Boolean
+        :return: None
+        """
+        for info in self.snapshot().of_class("VRayDenoiser"):
+            self._clg.debug("Denoiser Found: {}".format("Enabling" if enabled else "Disabling"))
+            info.get_element().vrayVFB = enabled
+
+    # ---------------------------------------------------
+    #                       Setters
+    # ---------------------------------------------------
+
+    def set_template(self, template):
+        self._template = NamingTemplate(template)
+
+    def set_extension(self, extension):
+        self._extension = extension
+
+    def set_routing(self, routing):
+        """
+        :param routing: A RoutingTable, or None to send every element to the same folder
+        :return: None
+        """
+        self._routing = routing if routing is not None else RoutingTable()
+
+    def set_class_extension(self, class_name, extension):
+        """
+        Overrides the file extension for every render element of a class
+        :param class_name: The MaxScript class name of the element, ex: VRayZDepth
+        :param extension: The file extension without a dot
+        :return: None
+        """
+        self._class_extensions[class_name] = extension
+
+# ---------------------------------------------------
+#                     Exceptions
+# ---------------------------------------------------
+
+
+class RenderElementTemplateError(Exception):
+    """
+    Exception raised for an unknown token in a naming template.
+    :attribute message: explanation of the error
+    """
+
+    def __init__(self, template, token):
+        self.message = "The token \"$({0})\" in template \"{1}\" is invalid. Valid tokens are: {2}".format(
+            token, template, ", ".join(NamingTemplate.valid_tokens)
+        )
+
+    def __str__(self):
+        return str(self.message)
+
+
+class RoutingError(Exception):
+    """
+    Exception raised for errors in the render element routing table.
+    :attribute message: explanation of the error
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return str(self.message)
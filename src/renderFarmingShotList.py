@@ -0,0 +1,547 @@
+import os
+import re
+import json
+import logging
+
+import pymxs
+
+import renderFarmingTools as rFT
+import renderFarmingJobGraph as rFJG
+
+rt = pymxs.runtime
+
+mlg = logging.getLogger("renderFarming.ShotList")
+
+# GI modes by name, as (prepass render type, beauty render type).  -1 means the mode has no prepass.
+gi_modes = {
+    "single_frame": (0, 1),
+    "multi_frame_incremental": (2, 3),
+    "animation": (4, 5),
+    "brute_force_light_cache": (6, 7),
+    "brute_force_light_cache_per_frame": (-1, 8),
+    "brute_force": (-1, 9)
+}
+
+frame_buffers = {
+    "max": 0,
+    "vray": 1
+}
+
+file_formats = {
+    "exr": 0,
+    "multichannel_exr": 1,
+    "vrimg": 2
+}
+
+pass_names = ("prepass", "beauty")
+
+# Every option a shot can have, with its default
+shot_defaults = {
+    "name": None,
+    "camera": None,
+    "range": None,
+    "gi_mode": "brute_force_light_cache",
+    "frame_buffer": "max",
+    "file_format": "exr",
+    "sub_folder": "$(shot)",
+    "routing": None,
+    "passes": list(pass_names),
+    "nth_frame": 1,
+    "pad_gi": True,
+    "multi_frame_increment": 50,
+    "prepass_from": None,
+    "prepass_chunks": 1
+}
+
+_range_pattern = re.compile(r"^\s*(-?\d+)\s*-\s*(-?\d+)\s*$")
+
+# Collects the name of every camera in the scene in one call
+_camera_names_source = """
+fn rfCameraNames = (
+    for c in cameras where (superClassOf c == camera) collect c.name
+)
+"""
+
+
+class Shot(object):
+    """
+    A single validated entry of a shot list
+    """
+    def __init__(self, name, camera, start, end, gi_mode, frame_buffer, file_format, sub_folder, routing, passes,
+                 nth_frame, pad_gi, multi_frame_increment, prepass_from=None, prepass_chunks=1):
+        self._name = name
+        self._camera = camera
+        self._start = start
+        self._end = end
+        self._gi_mode = gi_mode
+        self._frame_buffer = frame_buffer
+        self._file_format = file_format
+        self._sub_folder = sub_folder
+        self._routing = routing
+        self._passes = passes
+        self._nth_frame = nth_frame
+        self._pad_gi = pad_gi
+        self._multi_frame_increment = multi_frame_increment
+        self._prepass_from = prepass_from
+        self._prepass_chunks = prepass_chunks
+
+    def get_name(self):
+        return self._name
+
+    def get_camera(self):
+        return self._camera
+
+    def get_range(self):
+        return self._start, self._end
+
+    def get_gi_mode(self):
+        return self._gi_mode
+
+    def get_prepass_type(self):
+        """
+        :return: The Spinach render type of the prepass, or -1 if the shot has no prepass of its own
+        """
+        if "prepass" not in self._passes or self._prepass_from is not None:
+            return -1
+        return gi_modes[self._gi_mode][0]
+
+    def get_beauty_type(self):
+        """
+        :return: The Spinach render type of the beauty pass, or -1 if the shot has no beauty pass
+        """
+        if "beauty" not in self._passes:
+            return -1
+        return gi_modes[self._gi_mode][1]
+
+    def get_frame_buffer(self):
+        return frame_buffers[self._frame_buffer]
+
+    def get_file_format(self):
+        return file_formats[self._file_format]
+
+    def get_sub_folder(self):
+        """
+        :return: The sub folder template with $(shot) expanded, $(cam) is left for Spinach
+        """
+        return self._sub_folder.replace("$(shot)", self._name)
+
+    def get_routing(self):
+        return self._routing
+
+    def get_nth_frame(self):
+        return self._nth_frame
+
+    def get_pad_gi(self):
+        return self._pad_gi
+
+    def get_multi_frame_increment(self):
+        return self._multi_frame_increment
+
+    def get_prepass_from(self):
+        """
+        :return: The name of the shot whose prepass this shot's beauty pass reads, or None for its own prepass
+        """
+        return self._prepass_from
+
+    def get_prepass_chunks(self):
+        """
+        :return: The number of nodes the Animation Prepass is split across
+        """
+        return self._prepass_chunks
+
+    def get_settings(self):
+        """
+        :return: The shot's options as SpinachJob settings, see SpinachJob.get_settings()
+        """
+        settings = {
+            "frame_buffer_type": self.get_frame_buffer(),
+            "file_format": self.get_file_format(),
+            "frames_sub_folder": self.get_sub_folder(),
+            "nth_frame": self._nth_frame,
+            "pad_gi": self._pad_gi,
+            "multi_frame_increment": self._multi_frame_increment,
+            "sub_folder_as_gi_name": True
+        }
+        if self._routing is not None:
+            settings["render_element_routing"] = self._routing
+        return settings
+
+    def __str__(self):
+        return "{0}: {1} {2}-{3} {4}".format(self._name, self._camera, self._start, self._end, self._gi_mode)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ShotList(object):
+    """
+    A batch of renders described in a json file
+    The file is formatted as follows, every option in "defaults" can be overridden per shot:
+        {
+            "defaults": {
+                "gi_mode": "animation",
+                "frame_buffer": "max",
+                "file_format": "exr",
+                "sub_folder": "$(shot)",
+                "routing": "C:\\\\routing.json",
+                "passes": ["prepass", "beauty"],
+                "nth_frame": 1,
+                "pad_gi": true,
+                "multi_frame_increment": 50,
+                "prepass_chunks": 4
+            },
+            "shots": [
+                {"name": "sh010", "camera": "cam_sh010", "range": "1-120"},
+                {"name": "sh010_alt", "camera": "cam_sh010_alt", "range": "1-120", "prepass_from": "sh010"},
+                {"name": "sh020", "camera": "cam_sh020", "range": [121, 200], "gi_mode": "brute_force"}
+            ]
+        }
+    Options:
+        name: The shot name, defaults to the camera name
+        camera: The name of a camera in the scene
+        range: The first and last frame as "start-end" or [start, end]
+        gi_mode: One of the keys of gi_modes
+        frame_buffer: "max" or "vray"
+        file_format: "exr", "multichannel_exr" or "vrimg"
+        sub_folder: The frames sub folder, $(shot) and $(cam) are expanded
+        routing: A render element routing table, or an empty string for no routing
+        passes: Which of "prepass" and "beauty" to render
+        prepass_from: The name of another shot whose prepass this shot's beauty pass reads instead of its own
+        prepass_chunks: The number of jobs an Animation or Multi Frame Incremental prepass is split into
+    The whole file is validated before any shot is expanded, and every problem is reported together
+    """
+    def __init__(self, data, source="<shot list>", camera_names=None):
+        """
+        :param data: The parsed json
+        :param source: Where the data came from, used in error messages
+        :param camera_names: The cameras in the scene, read from Max if None
+        """
+        self._clg = logging.getLogger("renderFarming.ShotList.ShotList")
+
+        self._source = source
+        self._shots = list()
+        self._errors = list()
+
+        if camera_names is None:
+            camera_names = [str(n) for n in rFT.define_mxs_function(rt, "rfCameraNames", _camera_names_source)()]
+        self._camera_names = set(camera_names)
+
+        self._expand(data)
+
+        if len(self._errors) > 0:
+            raise ShotListError(self._source, self._errors)
+
+        self._clg.info("Shot list {0} expanded to {1} shots".format(self._source, len(self._shots)))
+
+    def _error(self, index, message):
+        self._errors.append("Shot {0}: {1}".format(index, message))
+
+    def _parse_range(self, index, value):
+        if isinstance(value, (list, tuple)) and len(value) == 2:
+            try:
+                start, end = int(value[0]), int(value[1])
+            except (TypeError, ValueError):
+                self._error(index, "range {} is not two frame numbers".format(value))
+                return None
+        elif isinstance(value, basestring) and _range_pattern.match(value):
+            match = _range_pattern.match(value)
+            start, end = int(match.group(1)), int(match.group(2))
+        else:
+            self._error(index, "range {} should be \"start-end\" or [start, end]".format(value))
+            return None
+
+        if end < start:
+            self._error(index, "range {} ends before it starts".format(value))
+            return None
+        return start, end
+
+    def _expand_shot(self, index, defaults, entry):
+        if not isinstance(entry, dict):
+            self._error(index, "is not an object")
+            return None
+
+        unknown = set(entry.keys()).difference(shot_defaults.keys())
+        if len(unknown) > 0:
+            self._error(index, "unknown options {}".format(", ".join(sorted(unknown))))
+
+        options = dict(defaults)
+        options.update(entry)
+
+        camera = options["camera"]
+        if camera is None:
+            self._error(index, "has no camera")
+            return None
+        if camera not in self._camera_names:
+            self._error(index, "camera \"{}\" is not in the scene".format(camera))
+
+        frame_range = self._parse_range(index, options["range"]) if options["range"] is not None else None
+        if options["range"] is None:
+            self._error(index, "has no range")
+
+        for option, choices in (("gi_mode", gi_modes), ("frame_buffer", frame_buffers),
+                                ("file_format", file_formats)):
+            if options[option] not in choices:
+                self._error(index, "{0} \"{1}\" should be one of: {2}".format(
+                    option, options[option], ", ".join(sorted(choices.keys()))
+                ))
+
+        passes = options["passes"]
+        if not isinstance(passes, list) or len(passes) == 0 or not set(passes).issubset(pass_names):
+            self._error(index, "passes should be a list of: {}".format(", ".join(pass_names)))
+
+        for option in ("nth_frame", "multi_frame_increment", "prepass_chunks"):
+            if not isinstance(options[option], int) or options[option] < 1:
+                self._error(index, "{} should be a whole number above 0".format(option))
+
+        routing = options["routing"]
+        if routing not in (None, "") and not os.path.isfile(routing):
+            self._error(index, "routing table {} does not exist".format(routing))
+
+        if frame_range is None:
+            return None
+
+        return Shot(options["name"] if options["name"] is not None else camera,
+                    camera,
+                    frame_range[0],
+                    frame_range[1],
+                    options["gi_mode"],
+                    options["frame_buffer"],
+                    options["file_format"],
+                    options["sub_folder"],
+                    routing,
+                    passes,
+                    options["nth_frame"],
+                    bool(options["pad_gi"]),
+                    options["multi_frame_increment"],
+                    options["prepass_from"],
+                    options["prepass_chunks"])
+
+    def _expand(self, data):
+        if not isinstance(data, dict) or not isinstance(data.get("shots"), list):
+            self._errors.append("The shot list needs a \"shots\" list")
+            return
+
+        defaults = dict(shot_defaults)
+        file_defaults = data.get("defaults", dict())
+        if not isinstance(file_defaults, dict):
+            self._errors.append("\"defaults\" is not an object")
+        else:
+            unknown = set(file_defaults.keys()).difference(shot_defaults.keys())
+            if len(unknown) > 0:
+                self._errors.append("Defaults: unknown options {}".format(", ".join(sorted(unknown))))
+            defaults.update(file_defaults)
+
+        names = dict()
+        for index, entry in enumerate(data["shots"]):
+            shot = self._expand_shot(index, defaults, entry)
+            if shot is None:
+                continue
+            if shot.get_name() in names:
+                self._error(index, "the name \"{}\" is used by another shot".format(shot.get_name()))
+            names[shot.get_name()] = (index, shot)
+            self._shots.append(shot)
+
+        for index, shot in names.values():
+            self._check_prepass_from(index, shot, names)
+
+    def _check_prepass_from(self, index, shot, names):
+        """
+        Checks that a shot sharing another shot's prepass can read its GI files
+        """
+        prepass_from = shot.get_prepass_from()
+        if prepass_from is None:
+            return
+        if prepass_from not in names:
+            self._error(index, "prepass_from \"{}\" is not a shot in the list".format(prepass_from))
+            return
+
+        source = names[prepass_from][1]
+        if source.get_gi_mode() not in gi_modes or shot.get_gi_mode() not in gi_modes:
+            # Already reported
+            return
+        if source.get_prepass_type() < 0:
+            self._error(index, "prepass_from \"{}\" has no prepass of its own".format(prepass_from))
+        elif gi_modes[source.get_gi_mode()] != gi_modes[shot.get_gi_mode()]:
+            self._error(index, "prepass_from \"{}\" uses a different gi_mode".format(prepass_from))
+
+    def get_shots(self):
+        return self._shots
+
+    def get_source(self):
+        return self._source
+
+    def __len__(self):
+        return len(self._shots)
+
+    def __iter__(self):
+        return iter(self._shots)
+
+    @classmethod
+    def from_file(cls, file_path, camera_names=None):
+        """
+        Reads a shot list from a json file
+        :param file_path: The path to the json file
+        :param camera_names: The cameras in the scene, read from Max if None
+        :return: A ShotList
+        """
+        try:
+            with open(file_path, 'r') as shot_file:
+                data = json.load(shot_file)
+        except IOError as e:
+            raise ShotListError(file_path, ["Unable to read the file: {}".format(e)])
+        except ValueError as e:
+            raise ShotListError(file_path, ["The file is not valid json: {}".format(e)])
+
+        return cls(data, file_path, camera_names)
+
+
+class ShotResult(object):
+    """
+    What happened to one pass of one shot
+    """
+    # How each job graph state is reported, any other state is reported with the pass's messages
+    _outcomes = {
+        rFJG.submitted: "Submitted",
+        rFJG.prepared: "Prepared",
+        rFJG.current: "Skipped, the GI cache is current"
+    }
+
+    def __init__(self, shot, pass_name, status, messages):
+        """
+        :param shot: The Shot
+        :param pass_name: The name of the pass, such as prepass or beauty
+        :param status: The state its JobNode finished in
+        :param messages: The messages of its JobNode
+        """
+        self._shot = shot
+        self._pass_name = pass_name
+        self._status = status
+        self._messages = messages
+
+    def get_shot(self):
+        return self._shot
+
+    def get_pass_name(self):
+        return self._pass_name
+
+    def get_status(self):
+        return self._status
+
+    def is_success(self):
+        return self._status in self._outcomes
+
+    def get_messages(self):
+        return self._messages
+
+    def __str__(self):
+        return "{0} {1}: {2}".format(self._shot.get_name(), self._pass_name,
+                                     self._outcomes.get(self._status, "; ".join(self._messages)))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ShotListRunner(object):
+    """
+    Prepares each shot with Spinach and submits its passes to Backburner as a job graph, so each beauty job waits
+    on the farm for the prepass it reads
+    """
+    def __init__(self, cfg, shot_list, submit=True):
+        """
+        :param cfg: A Configuration object
+        :param shot_list: A ShotList
+        :param submit: Submits each pass after preparing it, otherwise the passes are only prepared
+        """
+        self._clg = logging.getLogger("renderFarming.ShotList.ShotListRunner")
+
+        self._cfg = cfg
+        self._shot_list = shot_list
+        self._submit = submit
+        self._results = list()
+
+    # noinspection PyMethodMayBeStatic
+    def _job_name(self, shot, pass_name):
+        scene = os.path.splitext(str(rt.maxFileName))[0] or "untitled"
+        return "{0}_{1}_{2}".format(scene, shot.get_name(), pass_name)
+
+    def build_graph(self):
+        """
+        Links every shot's beauty pass to its own prepass, or the prepass of the shot named in prepass_from
+        A split Animation Prepass becomes one job per chunk, and the beauty pass waits for all of them.  A split Multi
+        Frame Incremental prepass also gets a merge job, which the beauty pass waits for instead.
+        :return: A JobGraph and a list of (shot, pass name, JobNode) tuples in shot list order
+        """
+        graph = rFJG.JobGraph()
+        passes = list()
+        prepasses = dict()
+
+        for shot in self._shot_list:
+            start, end = shot.get_range()
+            prepass_type = shot.get_prepass_type()
+            if prepass_type in (2, 4):
+                if prepass_type == 4:
+                    add_prepass = graph.add_animation_prepass
+                else:
+                    add_prepass = graph.add_multi_frame_incremental_prepass
+                nodes = add_prepass(self._job_name(shot, "prepass"), shot.get_camera(), start, end,
+                                    shot.get_settings(), shot.get_prepass_chunks())
+                prepasses[shot.get_name()] = nodes
+                chunks = [n for n in nodes if n.is_prepass()]
+                for node in nodes:
+                    if node.is_merge():
+                        passes.append((shot, "merge", node))
+                    elif len(chunks) > 1:
+                        passes.append((shot, "prepass_{:02d}".format(chunks.index(node) + 1), node))
+                    else:
+                        passes.append((shot, "prepass", node))
+            elif prepass_type >= 0:
+                node = graph.add_prepass(self._job_name(shot, "prepass"), shot.get_camera(), start, end,
+                                         prepass_type, shot.get_settings())
+                prepasses[shot.get_name()] = node
+                passes.append((shot, "prepass", node))
+
+        for shot in self._shot_list:
+            start, end = shot.get_range()
+            beauty_type = shot.get_beauty_type()
+            if beauty_type >= 0:
+                prepass = prepasses.get(shot.get_prepass_from() or shot.get_name())
+                node = graph.add_beauty(self._job_name(shot, "beauty"), shot.get_camera(), start, end,
+                                        beauty_type, shot.get_settings(), prepass)
+                passes.append((shot, "beauty", node))
+
+        return graph, passes
+
+    def run(self):
+        """
+        Prepares and submits every shot
+        :return: A list of ShotResult objects
+        """
+        graph, passes = self.build_graph()
+        rFJG.JobGraphSubmitter(self._cfg, graph, self._submit).run()
+
+        self._results = [ShotResult(shot, pass_name, node.get_status(), node.get_messages())
+                         for shot, pass_name, node in passes]
+        for result in self._results:
+            self._clg.info(result)
+        return self._results
+
+    def get_results(self):
+        return self._results
+
+# ---------------------------------------------------
+#                     Exceptions
+# ---------------------------------------------------
+
+
+class ShotListError(Exception):
+    """
+    Exception raised for shot lists which can't be expanded.
+    :attribute message: explanation of the error
+    """
+
+    def __init__(self, source, errors):
+        self.errors = errors
+        self.message = "Shot list {0} has {1} problems:\n    {2}".format(source, len(errors), "\n    ".join(errors))
+
+    def __str__(self):
+        return str(self.message)
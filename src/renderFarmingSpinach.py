@@ -1,9 +1,12 @@
 import renderFarmingTools as rFT
 # import renderFarmingClasses as rFC
 import renderFarmingNetRender as rFNR
+import renderFarmingRenderElements as rFRE
+import renderFarmingGICache as rFGI
+import renderFarmingFrames as rFF
+import renderFarmingEXR as rFEXR
 import os
 import logging
-from PySide2.QtCore import QObject, Signal
 
 import pymxs
 
@@ -11,34 +14,48 @@ rt = pymxs.runtime
 vr = rFT.verify_vray(rt)
 
 
-class SpinachMessage(object):
+def animation_prepass_range(start, end):
+    """
+    The frames an Animation Interpolated beauty pass reads, which includes the interpolation frames on either side
+    :param start: The first frame of the beauty pass
+    :param end: The last frame of the beauty pass
+    :return: A tuple of the first and last frame
+    """
+    interp_frames = vr.gi_irradmap_interpFrames
+    return start - interp_frames, end + interp_frames
+
+
+def multi_frame_incremental_frames(start, end, increment, pad=False):
     """
-    Class for transmitting ui messages of different types to be interpreted by the UI
+    The frames a Multi Frame Incremental prepass samples
+    :param start: The first frame of the active segment
+    :param end: The last frame of the active segment
+    :param increment: The multi frame increment
+    :param pad: Extends the range to the next increment, like the Pad GI option
+    :return: A FrameSet
     """
-    message_colors = {
-        "Error": "Red",
-        "Ready": "Green",
-        "Not Ready": "Orange"
-    }
+    return rFF.FrameSet.from_range(start, end).sample(increment, pad)
+
 
+class SpinachMessage(object):
+    """
+    A status update from a Spinach job
+    The type is one of "Error", "Ready", "Not Ready" or None, and full_color asks the UI to color the whole message
+    rather than just its type.  Presentation is left to whoever observes the job.
+    """
     def __init__(self, message, message_type, full_color=False):
         self._message = message
         self._message_type = message_type
         self._full_color = full_color
 
-    def styled_message(self):
-        if self._message_type is None:
-            return self.raw_message()
-        else:
-            if self._full_color:
-                return "{}".format(
-                    rFT.html_color_text(self._message, self.message_colors.get(self._message_type, "Red"))
-                )
-            else:
-                return "{}: {}".format(
-                    rFT.html_color_text(self._message_type, self.message_colors.get(self._message_type, "Red")),
-                    self._message
-                )
+    def get_message(self):
+        return self._message
+
+    def get_message_type(self):
+        return self._message_type
+
+    def is_full_color(self):
+        return self._full_color
 
     def raw_message(self):
         return "{} - Type: {}".format(self._message, self._message_type)
@@ -47,22 +64,44 @@ class SpinachMessage(object):
         return self.raw_message()
 
     def __repr__(self):
-        return self.styled_message()
+        return self.raw_message()
+
 
+class SpinachObserver(object):
+    """
+    Receives the status updates of a SpinachJob
+    Subclasses override the methods they are interested in, and are attached with SpinachJob.add_observer()
+    Observers are called on whichever thread the job runs on
+    """
+    def on_status_update(self, message):
+        """
+        :param message: A SpinachMessage
+        :return: None
+        """
+        pass
 
-class SpinachJob(QObject):
-    status_update = Signal(SpinachMessage)
-    not_ready = Signal()
+    def on_not_ready(self):
+        """
+        Called when a pass is requested before the job has been prepared
+        :return: None
+        """
+        pass
 
+
+class SpinachJob(object):
+    """
+    Prepares the scene's render settings for each Spinach render type
+    The job has no UI of its own, progress is reported to SpinachObserver objects
+    """
     def __init__(self, cfg):
-        super(SpinachJob, self).__init__()
         # Logging
         self._clg = logging.getLogger("renderFarming.Spinach")
         self._clg.debug("Running Spinach")
 
         # Variables
-        self._rem = rt.maxOps.GetCurRenderElementMgr()
+        self._render_elements = rFRE.RenderElementOutput()
         self._cfg = cfg
+        self._gi_cache = rFGI.GICacheManager(cfg)
 
         # Paths
 
@@ -74,6 +113,8 @@ class SpinachJob(QObject):
 
         self._cam = None
         self._cam_name = str()
+        # Set for jobs prepared without the dialog, which may have no viewport to read the camera from
+        self._camera_node = None
 
         # Messaging system attributes
 
@@ -97,6 +138,15 @@ class SpinachJob(QObject):
         self._nth_frame = 1
         self._sp_sub_fold_name_gi = False
 
+        self._render_element_routing = None
+        self._gi_name_override = None
+        self._gi_name = str()
+        self._gi_part = 0
+
+        # Observers
+
+        self._observers = list()
+
         # Other Attributes
 
         # self._orig_settings = rFC.RenderSettings(rt,
@@ -104,6 +154,14 @@ class SpinachJob(QObject):
         #                                          self._cfg.get_project_code())
         # self._orig_settings.capture_rps()
 
+    def _status_update(self, message):
+        for observer in list(self._observers):
+            observer.on_status_update(message)
+
+    def _not_ready(self):
+        for observer in list(self._observers):
+            observer.on_not_ready()
+
     def _verify_paths(self, *args):
         """
         A wrapper for verify_dir() in the render Farming Tools
@@ -116,7 +174,7 @@ class SpinachJob(QObject):
             # If any of the paths can't be found or made, returns false
             if not rFT.verify_dir(p):
                 flg.error("Path Error: {} does not resolve and cannot be created".format(p))
-                self.status_update.emit(SpinachMessage("One or more paths are invalid", "Error"))
+                self._status_update(SpinachMessage("One or more paths are invalid", "Error"))
                 return False
         return True
 
@@ -124,7 +182,7 @@ class SpinachJob(QObject):
         formats = {
             0: "exr",
             1: "exr",
-            3: "vrimg"
+            2: "vrimg"
         }
         return formats.get(self._file_format, "exr")
 
@@ -163,27 +221,39 @@ class SpinachJob(QObject):
         vr.lightcache_loadFileName = self._lc_file
 
     def _set_animation_prepass_path(self):
-        # Checks if the containing folder should be named using the user specified sub folder field
-        if self._sp_sub_fold_name_gi:
-            sub_fold = self._expand_frames_sub_folder()
-        else:
-            sub_fold = self._cam_name
-
-        # Defines the folder in which the Prepass frames will be stored
-        folder = os.path.join(self._cfg.get_irradiance_cache_path(), sub_fold)
+        folder, prefix = self.get_animation_prepass_location()
 
         # checks this folder's existence or writability
         if rFT.verify_dir(folder):
             # sets the _ir_file string
-            self._ir_file = folder + "\\{0}_frame_.vrmap".format(sub_fold)
+            self._ir_file = folder + "\\{0}.vrmap".format(prefix)
         else:
             # Displays an error message and returns
-            self.status_update.emit(
+            self._status_update(
                 SpinachMessage("Unable to find or create path for animation prepass rendering", "Error")
             )
             self._ready = False
             return
 
+    # noinspection PyMethodMayBeStatic
+    def _animation_prepass_range(self):
+        """
+        The frames an Animation Interpolated beauty pass reads, which includes the interpolation frames on either
+        side of the active segment
+        :return: A tuple of the first and last frame
+        """
+        return animation_prepass_range(int(rt.animationRange.start), int(rt.animationRange.end))
+
+    def _expected_prepass_range(self):
+        """
+        The frames an Animation Prepass renders, as _set_frame_time_type sets them up.  Only padded with the
+        interpolation frames when the GI is padded, otherwise just the active segment
+        :return: A tuple of the first and last frame
+        """
+        if self._pad_gi:
+            return self._animation_prepass_range()
+        return int(rt.animationRange.start), int(rt.animationRange.end)
+
     # noinspection PyMethodMayBeStatic
     def _set_gi_engine(self, render_type=6):
         """
@@ -225,7 +295,7 @@ class SpinachJob(QObject):
             vr.gi_primary_type = 2
             vr.gi_secondary_type = 2
 
-    def _set_frame_time_type(self, render_type=6):
+    def _set_frame_time_type(self, render_type=6, frames=None):
         """
         Sets the frame settings based on type
         :param render_type: The combination of Gi settings used by the renderer
@@ -240,12 +310,21 @@ class SpinachJob(QObject):
             -7:   Brute Force, From File Light Cache
             -8:   Brute Force, Light Cache with a new Light Cache every frame
             -9:   Brute Force, Brute Force
+        :param frames: A FrameSet or list of frames to render instead of the range, used by Animation Prepass,
+                       Multi Frame Incremental chunks and beauty passes
         :return: None
         """
         flg = logging.getLogger("renderFarming.Spinach._set_frame_time_type")
         flg.debug("Using Render Type {}".format(render_type))
 
-        if render_type is 2:
+        if render_type is 2 and frames is not None:
+            pickup_frames = rFF.compact_frames(frames)
+            flg.debug("Setting time to the sampled frames: {}".format(pickup_frames))
+            rt.rendTimeType = 4
+            rt.rendPickupFrames = pickup_frames
+            rt.rendNThFrame = 1
+
+        elif render_type is 2:
             if not self._pad_gi:
                 flg.debug("Setting time to Active Segment frame")
                 rt.rendTimeType = 2
@@ -272,7 +351,13 @@ class SpinachJob(QObject):
         elif render_type is 4:
             rt.rendNThFrame = 1
 
-            if not self._pad_gi:
+            if frames is not None:
+                pickup_frames = rFF.compact_frames(frames)
+                flg.debug("Setting time to the frames: {}".format(pickup_frames))
+                rt.rendTimeType = 4
+                rt.rendPickupFrames = pickup_frames
+
+            elif not self._pad_gi:
                 flg.debug("Setting time to Active Segment frame")
                 rt.rendTimeType = 2
 
@@ -280,14 +365,19 @@ class SpinachJob(QObject):
                 flg.debug("Padding Animation Prepass GI Range")
                 rt.rendTimeType = 3
 
-                interp_frames = vr.gi_irradmap_interpFrames
-
-                flg.debug("Padding Frame Range by {} Frames on either side".format(interp_frames))
+                flg.debug("Padding Frame Range by {} Frames on either side".format(vr.gi_irradmap_interpFrames))
 
-                rt.rendStart = int(rt.animationRange.start) - interp_frames
-                rt.rendEnd = int(rt.animationRange.end) + interp_frames
+                rt.rendStart, rt.rendEnd = self._animation_prepass_range()
 
         elif render_type in (1, 3, 5, 7, 8, 9):
+            if frames is not None:
+                pickup_frames = rFF.compact_frames(frames)
+                flg.debug("Setting time to the frames: {}".format(pickup_frames))
+                rt.rendTimeType = 4
+                rt.rendPickupFrames = pickup_frames
+                rt.rendNThFrame = 1
+                return
+
             flg.debug("Setting time to Active Segment frame")
             rt.rendTimeType = 2
             rt.rendNThFrame = self._nth_frame
@@ -393,7 +483,7 @@ class SpinachJob(QObject):
 
         if not renderer:
             flg.error("Cannot reset VRay")
-            self.status_update.emit(SpinachMessage("Cannot reset VRay", "Error"))
+            self._status_update(SpinachMessage("Cannot reset VRay", "Error"))
             return False
         else:
             global vr 
@@ -403,7 +493,7 @@ class SpinachJob(QObject):
     def _set_output(self, fb_type, beauty=True):
         """
         Sets the output to the frames folder stored in the job
-        :return: None
+        :return: True for success, False if the render element folders cannot be made
         """
         flg = logging.getLogger("renderFarming.Spinach._set_output")
         path = "{0}\\frame_.{1}".format(self._frames_dir, self._file_format_extension())
@@ -421,7 +511,8 @@ class SpinachJob(QObject):
                 flg.debug(path)
 
                 rt.rendOutputFilename = path
-                self._set_render_element_output()
+                if not self._set_render_element_output():
+                    return False
 
                 vr.output_splitFileName = ""
                 vr.output_rawFileName = ""
@@ -486,6 +577,7 @@ class SpinachJob(QObject):
                 rt.rendOutputFilename = ""
                 vr.output_splitFileName = ""
                 vr.output_rawFileName = ""
+        return True
 
     def _override_image_filter(self):
         flg = logging.getLogger("renderFarming.Spinach._override_image_filter")
@@ -536,68 +628,202 @@ class SpinachJob(QObject):
             9: "BF Beauty"
         }
 
-        return msg.get(render_type, "{} Something has been goofed".format(rFT.html_color_text("Whoops: ", "Orange")))
+        return msg.get(render_type, "Whoops: Something has been goofed")
 
-    def _set_render_element_output(self):
+    def _output_sequences(self, width=None, height=None):
         """
-        Sets all of the scene's render elements to use the frames_dir path
-        :return: None
+        Describes every image sequence the beauty pass writes with the current frame buffer settings
+        :param width: The expected image width, EXR headers are only checked if this and height are given
+        :param height: The expected image height
+        :return: A list of FrameSequence objects
         """
-        flg = logging.getLogger("renderFarming.Spinach._set_render_element_output")
-        # Max's render element manger uses indexes instead of returning actual objects
-        num = self._rem.NumRenderElements()
-        flg.info("Setting Output for {} Render Elements".format(num))
+        sequences = list()
+        extension = ".{}".format(self._file_format_extension())
+        elements = [info for info in self._render_elements.snapshot() if info.is_enabled()]
+
+        validate = extension == ".exr" and width is not None and height is not None
+        beauty_validator = rFEXR.EXRValidator(width, height, ("R", "G", "B")) if validate else None
+        element_validator = rFEXR.EXRValidator(width, height) if validate else None
+
+        if self._frame_buffer_type is 0:
+            sequences.append(rFF.FrameSequence("Beauty", self._frames_dir, "frame_", extension, beauty_validator))
+
+            # Elements save next to their file name with the frame number added before the extension
+            file_names = dict(zip([info.get_index() for info in self._render_elements.snapshot()],
+                                  self._render_elements.file_names(self._frames_dir)))
+            for info in elements:
+                folder, base = os.path.split(file_names[info.get_index()])
+                prefix, suffix = os.path.splitext(base)
+                sequences.append(rFF.FrameSequence(info.get_name(), folder, prefix, suffix, element_validator))
+
+        elif self._file_format == 0:
+            # V-Ray splits channels into <file>.<channel>.####.<ext>
+            sequences.append(rFF.FrameSequence(
+                "Beauty", self._frames_dir, "frame_.RGB_color", extension, beauty_validator
+            ))
+            for info in elements:
+                sequences.append(rFF.FrameSequence(
+                    info.get_name(), self._frames_dir, "frame_.{}".format(info.get_name()), extension,
+                    element_validator
+                ))
 
-        for i in range(num):
-            # retrieves the element and gets its name
-            el = self._rem.GetRenderElement(i)
-            el_name = str(el.elementname)
+        else:
+            # Raw files hold every element as a layer named after it
+            validator = None
+            if validate:
+                validator = rFEXR.EXRValidator(width, height, ("R", "G", "B"),
+                                               [info.get_name() for info in elements])
+            sequences.append(rFF.FrameSequence("Beauty", self._frames_dir, "frame_", extension, validator))
 
-            # compiles a filename for the element in the correct path
-            file_name = "{0}\\frame_{1}.exr".format(self._frames_dir, el_name)
+        return sequences
 
-            flg.debug("Assigning render element: {0} to file name: {1}".format(el_name, file_name))
+    def _load_render_element_routing(self):
+        """
+        Reads the render element routing table specified in the config, if there is one
+        :return: True for success, False for failure
+        """
+        flg = logging.getLogger("renderFarming.Spinach._load_render_element_routing")
 
-            # Sets the filename for the element
-            self._rem.SetRenderElementFilename(i, file_name)
+        if self._render_element_routing is not None:
+            routing_path = self._render_element_routing
+        else:
+            routing_path = self._cfg.get_render_element_routing_path()
+        if routing_path == "":
+            self._render_elements.set_routing(None)
+            return True
 
-    def _clear_render_element_output(self):
+        try:
+            routing = rFRE.RoutingTable.from_file(routing_path)
+        except rFRE.RoutingError as e:
+            flg.error(e)
+            self._status_update(SpinachMessage("Render element routing table is invalid", "Error"))
+            return False
+
+        flg.info("Render Element Routing: {0} ({1} rules)".format(routing_path, len(routing)))
+        self._render_elements.set_routing(routing)
+        return True
+
+    def _gi_cache_files(self, render_type):
         """
-        Sets all of the scene's render elements to have blank strings in their output path
-        :return: None
+        Lists the cache files a prepass writes
+        :param render_type: The combination of Gi settings used by the renderer
+        :return: A list of file paths, empty for prepasses which can't be reused
+        """
+        # The chunks of a split prepass are only current together
+        if self._gi_part > 0:
+            return list()
+
+        cache_files = {
+            0: [self._ir_file, self._lc_file],
+            2: [self._ir_file, self._lc_file],
+            6: [self._lc_file]
+        }
+        return cache_files.get(render_type, list())
+
+    def _reuse_gi_cache(self, render_type):
+        """
+        Checks the GI cache for the prepass, and records the new fingerprint if the prepass has to run
+        :param render_type: The combination of Gi settings used by the renderer
+        :return: True if the existing cache is current and the prepass can be skipped
         """
-        flg = logging.getLogger("renderFarming.Spinach._clear_render_element_output")
-        # Max's render element manger uses indexes instead of returning actual objects
-        num = self._rem.NumRenderElements()
-        flg.info("Clearing Output for {} Render Elements".format(num))
+        flg = logging.getLogger("renderFarming.Spinach._reuse_gi_cache")
+
+        cache_files = self._gi_cache_files(render_type)
+        if len(cache_files) == 0:
+            return False
+
+        fingerprint = self._gi_cache.fingerprint(render_type, self._cam)
+        flg.debug("GI Fingerprint: {}".format(fingerprint))
 
-        for i in range(num):
-            # retrieves the element and gets its name
-            el = self._rem.GetRenderElement(i)
-            el_name = str(el.elementname)
+        if self._cfg.get_gi_cache_setting("reuse") and self._gi_cache.is_current(cache_files, fingerprint):
+            flg.info("GI cache is current, skipping the prepass")
+            self._gi_cache.touch(cache_files)
+            return True
 
-            flg.debug("Clearing render element: {0}".format(el_name))
+        self._gi_cache.record(cache_files, fingerprint)
 
-            # Sets the blank string for the element
-            self._rem.SetRenderElementFilename(i, str())
+        if self._cfg.get_gi_cache_setting("evict_on_prepass"):
+            # For clearing out a finished project, the caches of the project being rendered are kept
+            project = self._cfg.get_gi_cache_setting("evict_project") or None
+            if project is not None and project == self._cfg.get_project_code():
+                flg.warning("Not evicting the GI caches of {}, the current project".format(project))
+                project = None
+            self._gi_cache.evict(self._cfg.get_gi_cache_setting("max_age_days"),
+                                 self._cfg.get_gi_cache_setting("quota_gb"), project)
+        return False
+
+    def _set_render_element_output(self):
+        """
+        Sets all of the scene's render elements to use the frames_dir path, or the sub folders they are routed to
+        :return: True for success, False if any of the folders cannot be made
+        """
+        if not self._verify_paths(*self._render_elements.directories(self._frames_dir)):
+            return False
+        self._render_elements.assign(self._frames_dir)
+        return True
+
+    def _clear_render_element_output(self):
+        """
+        Sets all of the scene's render elements to have blank strings in their output path
+        :return: None
+        """
+        self._render_elements.clear()
 
     def _denoise(self, enabled):
         """
-        Sets all of the scene's render elements to use the frames_dir path
+        Enables or disables any VRayDenoiser render elements
         :return: None
         """
         flg = logging.getLogger("renderFarming.Spinach._denoise")
-        # Max's render element manger uses indexes instead of returning actual objects
-        num = self._rem.NumRenderElements()
         flg.debug("Checking for Denoiser")
 
-        for i in range(num):
-            # retrieves the element and gets its name
-            el = self._rem.GetRenderElement(i)
+        self._render_elements.set_denoiser(enabled)
+
+    # noinspection PyMethodMayBeStatic
+    def _clear_pre_render_script(self):
+        """
+        Turns off the pre-render script left by a merge job or a prepass check, any other pre-render script is left
+        alone
+        :return: None
+        """
+        if str(rt.preRendScript).endswith((rFGI.merge_script_suffix, rFGI.check_script_suffix)):
+            rt.usePreRendScript = False
+            rt.preRendScript = ""
 
-            if rt.classof(el) == rt.VRayDenoiser:
-                flg.debug("Denoiser Found: {}".format("Enabling" if enabled else "Disabling"))
-                el.vrayVFB = enabled
+    def _set_check_script(self, render_type):
+        """
+        Sets a pre-render script which stops the beauty pass if the GI files it reads are missing, for a pass which
+        is submitted before its prepass has rendered
+        :param render_type: The beauty pass render type
+        :return: True if the script was set or the pass reads no GI files, False otherwise
+        """
+        flg = logging.getLogger("renderFarming.Spinach._set_check_script")
+
+        files = list()
+        if render_type in (1, 3):
+            files = [self._ir_file, self._lc_file]
+        elif render_type is 7:
+            files = [self._lc_file]
+
+        frames = dict()
+        if render_type is 5:
+            folder, prefix = self.get_animation_prepass_location()
+            first_frame, last_frame = self._expected_prepass_range()
+            frames = {"frames_folder": folder, "frames_prefix": prefix, "first_frame": first_frame,
+                      "last_frame": last_frame}
+
+        if len(files) < 1 and len(frames) < 1:
+            return True
+
+        script_file = os.path.join(self._cfg.get_irradiance_cache_path(),
+                                   "{0}{1}".format(self._gi_name, rFGI.check_script_suffix))
+        if not rFGI.write_check_script(script_file, files, **frames):
+            return False
+
+        flg.debug("Using Prepass Check Script {}".format(script_file))
+        rt.preRendScript = script_file
+        rt.usePreRendScript = True
+        return True
 
     # ---------------------------------------------------
     #                       Public
@@ -610,6 +836,9 @@ class SpinachJob(QObject):
         """
         flg = logging.getLogger("renderFarming.Spinach.prepare_job")
 
+        # Render elements are read once per pass, a new job always reads the scene again
+        self._render_elements.invalidate()
+
         self._cam = self.get_cam()
 
         # Checks the validity of the camera
@@ -626,15 +855,23 @@ class SpinachJob(QObject):
             return
 
         # Checks if the containing folder should be named using the user specified sub folder field
-        if self._sp_sub_fold_name_gi:
+        if self._gi_name_override:
+            gi_name = self._gi_name_override
+        elif self._sp_sub_fold_name_gi:
             gi_name = self._expand_frames_sub_folder()
         else:
             gi_name = self._cam_name
+        self._gi_name = gi_name
 
         # Sets file paths for the GI files
         self._ir_file = self._cfg.get_irradiance_cache_path() + "\\{0}.vrmap".format(gi_name)
         self._lc_file = self._cfg.get_light_cache_path() + "\\{0}.vrlmap".format(gi_name)
 
+        # A chunk of a split prepass writes its own files, which the merge job combines
+        if self._gi_part > 0:
+            self._ir_file = rFGI.part_file(self._ir_file, self._gi_part)
+            self._lc_file = rFGI.part_file(self._lc_file, self._gi_part)
+
         # Sets file path for frames
         self._frames_dir = os.path.join(self._cfg.get_frames_path(), self._expand_frames_sub_folder())
 
@@ -649,8 +886,11 @@ class SpinachJob(QObject):
                                   self._frames_dir):
             return
 
+        if not self._load_render_element_routing():
+            return
+
         # Prints a message
-        self.status_update.emit(SpinachMessage("Ready!", "Ready", True))
+        self._status_update(SpinachMessage("Ready!", "Ready", True))
         self._ready = True
 
     def single_frame_prepass(self):
@@ -667,7 +907,7 @@ class SpinachJob(QObject):
         """
         self.prepare_beauty_pass(1)
 
-    def prepare_prepass(self, render_type):
+    def prepare_prepass(self, render_type, frames=None):
         """
         Sets up the render for a prepass
         :param render_type: The combination of Gi settings used by the renderer
@@ -676,22 +916,31 @@ class SpinachJob(QObject):
                 -2:   Multi Frame Incremental Irradiance Map, Single Frame Light Cache
                 -4:   Animation Prepass Irradiance Map, Light Cache
                 -6:   Brute Force, Light Cache
-        :return: None
+        :param frames: A list of frames to render for an Animation Prepass, or the sampled frames to render for a Multi
+                       Frame Incremental prepass, instead of the whole range
+        :return: True if the scene was set up for the pass, False otherwise
         """
         flg = logging.getLogger("renderFarming.Spinach.prepare_prepass")
 
         self.rsd_toggle()
+        self._render_elements.invalidate()
+        self._clear_pre_render_script()
 
         if render_type in (1, 3, 5, 7, 8, 9):
             flg.error("Attempting to render a beauty pass as a prepass")
-            self.status_update.emit(SpinachMessage("Attempting to render a beauty pass as a prepass", "Error"))
-            return
+            self._status_update(SpinachMessage("Attempting to render a beauty pass as a prepass", "Error"))
+            return False
 
         if not self._ready:
             flg.warning("Spinach reports not ready, job submission cannot continue")
-            self.status_update.emit(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
-            self.not_ready.emit()
-            return
+            self._status_update(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
+            self._not_ready()
+            return False
+
+        if self._reuse_gi_cache(render_type):
+            self._status_update(SpinachMessage("GI cache is current, the prepass can be skipped", "Ready", True))
+            self.rsd_toggle(True)
+            return False
 
         # if is an Animation Prepass Irradiance Map, Light Cache, the ir path must be changed
         if render_type is 4:
@@ -705,12 +954,12 @@ class SpinachJob(QObject):
         vr.options_dontRenderImage = True
 
         flg.debug("Setting render time output")
-        self._set_frame_time_type(render_type)
+        self._set_frame_time_type(render_type, frames)
 
         flg.debug("Overriding Image Filter")
         self._override_image_filter()
 
-        self.status_update.emit(SpinachMessage("Prepass - {}".format(self._gi_type_status_msg(render_type)), "Ready"))
+        self._status_update(SpinachMessage("Prepass - {}".format(self._gi_type_status_msg(render_type)), "Ready"))
 
         flg.debug("Setting Output")
         self._set_output(self._frame_buffer_type, False)
@@ -719,8 +968,9 @@ class SpinachJob(QObject):
         self._denoise(False)
 
         self.rsd_toggle(True)
+        return True
 
-    def prepare_beauty_pass(self, render_type):
+    def prepare_beauty_pass(self, render_type, frames=None, check_prepass=True):
         """
         Sets up the render for the beauty pass
         :param render_type: The combination of Gi settings used by the renderer
@@ -731,28 +981,42 @@ class SpinachJob(QObject):
                 -7:   Brute Force, From File Light Cache
                 -8:   Brute Force, Light Cache with a new Light Cache every frame
                 -9:   Brute Force, Brute Force
-        :return: None
+        :param frames: A list of frames to render instead of the active segment
+        :param check_prepass: Checks that the animation prepass is complete.  Turned off when the prepass is submitted
+                              to the farm ahead of this pass, a pre-render script checks the GI files instead when the
+                              job starts
+        :return: True if the scene was set up for the pass, False otherwise
         """
         flg = logging.getLogger("renderFarming.Spinach.prepare_beauty")
 
         self.rsd_toggle()
+        self._render_elements.invalidate()
+        self._clear_pre_render_script()
 
         if not self._ready:
             flg.warning("Spinach reports not ready, job submission cannot continue")
-            self.status_update.emit(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
-            self.not_ready.emit()
+            self._status_update(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
+            self._not_ready()
 
-            return
+            return False
 
         if render_type in (0, 2, 4, 6):
             flg.error("Attempting to render a prepass as a beauty pass")
-            self.status_update.emit(SpinachMessage("Attempting to render a prepass as a beauty pass", "Error"))
-            return
+            self._status_update(SpinachMessage("Attempting to render a prepass as a beauty pass", "Error"))
+            return False
 
             # if is an Animation Prepass Irradiance Map, Light Cache, the ir path must be changed
         if render_type is 5:
             self._set_animation_prepass_path()
 
+            missing = self.find_missing_prepass_frames() if check_prepass else list()
+            if len(missing) > 0:
+                msg = "Animation prepass is missing frames: {}".format(rFF.compact_frames(missing))
+                flg.error(msg)
+                self._status_update(SpinachMessage(msg, "Error"))
+                self.rsd_toggle(True)
+                return False
+
         self._set_gi_paths()
         self._set_gi_engine(render_type)
         self._set_gi_save_to_frame(render_type)
@@ -761,10 +1025,13 @@ class SpinachJob(QObject):
         vr.options_dontRenderImage = False
 
         flg.debug("Setting render time output")
-        self._set_frame_time_type(render_type)
+        self._set_frame_time_type(render_type, frames)
 
         flg.debug("Setting Output")
-        self._set_output(self._frame_buffer_type, True)
+        if not self._set_output(self._frame_buffer_type, True):
+            flg.error("Unable to set the render element output paths")
+            self.rsd_toggle(True)
+            return False
 
         flg.debug("Enabling VRayDenoiser")
         self._denoise(True)
@@ -772,10 +1039,150 @@ class SpinachJob(QObject):
         flg.debug("Overriding Image Filter")
         self._override_image_filter()
 
+        if not check_prepass and not self._set_check_script(render_type):
+            self._status_update(SpinachMessage("Unable to write the prepass check script", "Error"))
+            self.rsd_toggle(True)
+            return False
+
         flg.debug("File Ready for Final Render")
-        self.status_update.emit(SpinachMessage("Beauty - {}".format(self._gi_type_status_msg(render_type)), "Ready"))
+        self._status_update(SpinachMessage("Beauty - {}".format(self._gi_type_status_msg(render_type)), "Ready"))
+
+        self.rsd_toggle(True)
+        return True
+
+    def prepare_irradiance_merge(self, parts):
+        """
+        Sets up a merge job, which combines the irradiance maps of a Multi Frame Incremental prepass split into chunks
+        The merge runs as the pre-render script of a single frame which loads the merged files without rendering an
+        image, so it can be submitted to Backburner between the chunks and the beauty pass
+        :param parts: The number of chunks the prepass was split into
+        :return: True if the scene was set up for the merge, False otherwise
+        """
+        flg = logging.getLogger("renderFarming.Spinach.prepare_irradiance_merge")
+
+        self.rsd_toggle()
+        self._render_elements.invalidate()
+
+        if not self._ready:
+            flg.warning("Spinach reports not ready, job submission cannot continue")
+            self._status_update(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
+            self._not_ready()
+            return False
+
+        if self._gi_part > 0:
+            flg.error("Attempting to merge a chunk of a prepass")
+            self._status_update(SpinachMessage("Attempting to merge a chunk of a prepass", "Error"))
+            return False
+
+        script_file = os.path.join(self._cfg.get_irradiance_cache_path(),
+                                   "{0}{1}".format(self._gi_name, rFGI.merge_script_suffix))
+        if not rFGI.write_merge_script(script_file, self._cfg.get_gi_cache_setting("imap_viewer"),
+                                       self._ir_file, self._lc_file, parts):
+            self._status_update(SpinachMessage("Unable to write the irradiance map merge script", "Error"))
+            self.rsd_toggle(True)
+            return False
+
+        flg.debug("Using Merge Script {}".format(script_file))
+        rt.preRendScript = script_file
+        rt.usePreRendScript = True
+
+        # Reads the merged files back, as the beauty pass will
+        self._set_gi_paths()
+        self._set_gi_engine(3)
+        self._set_gi_save_to_frame(3)
+
+        flg.debug("Setting VRay to render only GI")
+        vr.options_dontRenderImage = True
+
+        flg.debug("Setting time to single frame")
+        rt.rendTimeType = 1
+
+        self._status_update(SpinachMessage("Merge - {} Irradiance Map chunks".format(parts), "Ready"))
+
+        flg.debug("Setting Output")
+        self._set_output(self._frame_buffer_type, False)
 
         self.rsd_toggle(True)
+        return True
+
+    def find_missing_prepass_frames(self):
+        """
+        Checks the animation prepass folder for the frames the Animation Prepass should have written
+        :return: A sorted list of missing frame numbers
+        """
+        start, end = self._expected_prepass_range()
+        return self.get_animation_prepass_index().missing(start, end)
+
+    def prepare_missing_prepass(self):
+        """
+        Sets up an Animation Prepass which only renders the frames missing from the prepass folder
+        :return: True if there are frames to render, False otherwise
+        """
+        flg = logging.getLogger("renderFarming.Spinach.prepare_missing_prepass")
+
+        if not self._ready:
+            flg.warning("Spinach reports not ready, job submission cannot continue")
+            self._status_update(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
+            self._not_ready()
+            return False
+
+        missing = self.find_missing_prepass_frames()
+        if len(missing) == 0:
+            flg.info("Animation prepass is complete")
+            self._status_update(SpinachMessage("Animation prepass is complete", "Ready", True))
+            return False
+
+        flg.info("Animation prepass is missing {} frames".format(len(missing)))
+        self.prepare_prepass(4, missing)
+        return True
+
+    def scan_rendered_frames(self):
+        """
+        Checks the frames folder for frames of the active segment which are missing, empty or truncated in the
+        beauty or any render element.  EXR headers are checked against the output size and render elements.
+        :return: A FrameScanner
+        """
+        start = int(rt.animationRange.start)
+        end = int(rt.animationRange.end)
+        frames = rFF.FrameSet.from_range(start, end, max(1, self._nth_frame))
+
+        self._render_elements.invalidate()
+        return rFF.FrameScanner(self._output_sequences(rt.renderWidth, rt.renderHeight), frames)
+
+    def prepare_rerender(self, render_type):
+        """
+        Sets up a beauty pass which only renders the frames that are missing or broken in the frames folder
+        :param render_type: The combination of Gi settings used by the renderer, see prepare_beauty_pass()
+        :return: True if there are frames to render and the pass was set up, False otherwise
+        """
+        flg = logging.getLogger("renderFarming.Spinach.prepare_rerender")
+
+        if not self._ready:
+            flg.warning("Spinach reports not ready, job submission cannot continue")
+            self._status_update(SpinachMessage("Spinach Reports Not Ready", "Not Ready"))
+            self._not_ready()
+            return False
+
+        scanner = self.scan_rendered_frames()
+        for result in scanner.get_results():
+            if not result.is_complete():
+                flg.info(result)
+            for frame, problems in sorted(result.get_invalid().items()):
+                flg.debug("{0} frame {1}: {2}".format(result.get_sequence().get_name(), frame, "; ".join(problems)))
+
+        broken = scanner.get_broken_frames()
+        if len(broken) == 0:
+            flg.info("All frames are complete")
+            self._status_update(SpinachMessage("All frames are complete", "Ready", True))
+            return False
+
+        flg.info("Re-rendering frames: {}".format(rFF.compact_frames(broken)))
+        if not self.prepare_beauty_pass(render_type, broken):
+            return False
+
+        # Frames that exist but are broken still need to be overwritten
+        rt.skipRenderedFrames = False
+        return True
 
     def check_camera(self):
         """
@@ -834,7 +1241,7 @@ class SpinachJob(QObject):
             return None
 
         self._reset_vray()
-        self.status_update.emit(SpinachMessage("VRay has been reset", None))
+        self._status_update(SpinachMessage("VRay has been reset", None))
         self.rsd_toggle(True)
 
     # noinspection PyMethodMayBeStatic
@@ -854,18 +1261,71 @@ class SpinachJob(QObject):
 
     def get_cam(self):
         """
-        Gets the active 3DS Max camera
+        Gets the camera the job renders, the one given to set_camera() or the active viewport's camera
         :return: a 3DS Max Camera object
         """
         flg = logging.getLogger("renderFarming.Spinach.get_cam")
+        if self._camera_node is not None:
+            return self._camera_node
         cam = rt.getActiveCamera()
         if cam is None:
             flg.warning("Active view is not a valid camera")
-            self.status_update.emit(SpinachMessage("Active view is not a valid camera", "Error"))
+            self._status_update(SpinachMessage("Active view is not a valid camera", "Error"))
         else:
             flg.debug("Active camera selected: {}".format(cam.name))
         return cam
 
+    def get_animation_prepass_location(self):
+        """
+        Gets where the Animation Prepass writes its frames
+        :return: A tuple of the folder and the file name prefix the frame numbers are appended to
+        """
+        # Checks if the containing folder should be named using the user specified sub folder field
+        if self._gi_name_override:
+            sub_fold = self._gi_name_override
+        elif self._sp_sub_fold_name_gi:
+            sub_fold = self._expand_frames_sub_folder()
+        else:
+            sub_fold = self._cam_name
+
+        # Defines the folder in which the Prepass frames will be stored
+        folder = os.path.join(self._cfg.get_irradiance_cache_path(), sub_fold)
+        return folder, "{0}_frame_".format(sub_fold)
+
+    def get_animation_prepass_index(self):
+        """
+        :return: A PrepassFrameIndex of the Animation Prepass folder
+        """
+        folder, prefix = self.get_animation_prepass_location()
+        return rFF.PrepassFrameIndex(folder, prefix)
+
+    def get_gi_name(self):
+        """
+        :return: The name of the irradiance map and light cache files, set by prepare_job()
+        """
+        return self._gi_name
+
+    def get_settings(self):
+        """
+        The options set through the setters, so a job can be recreated later with apply_settings()
+        :return: A dictionary of setter name, without "set_", to value
+        """
+        return {
+            "frame_buffer_type": self._frame_buffer_type,
+            "file_format": self._file_format,
+            "image_filter_override": self._image_filter_override,
+            "frames_sub_folder": self._frames_sub_folder,
+            "pad_gi": self._pad_gi,
+            "multi_frame_increment": self._multi_frame_increment,
+            "autosave_interval": self._autosave_interval,
+            "resumable_rendering": self._resumable_rendering,
+            "nth_frame": self._nth_frame,
+            "sub_folder_as_gi_name": self._sp_sub_fold_name_gi,
+            "render_element_routing": self._render_element_routing,
+            "gi_name": self._gi_name_override,
+            "gi_part": self._gi_part
+        }
+
     def get_ready_status(self):
         """
         Ascertains if the job has cleared and is ready to be rendered
@@ -877,6 +1337,13 @@ class SpinachJob(QObject):
     #                       Setters
     # ---------------------------------------------------
 
+    def set_camera(self, camera):
+        """
+        :param camera: The camera node to render, None uses the active viewport's camera
+        :return: None
+        """
+        self._camera_node = camera
+
     def set_frame_buffer_type(self, fb_type):
         flg = logging.getLogger("renderFarming.Spinach.set_frame_buffer_type")
         if fb_type > 1:
@@ -942,3 +1409,57 @@ class SpinachJob(QObject):
 
     def set_sub_folder_as_gi_name(self, ckbx_bool):
         self._sp_sub_fold_name_gi = ckbx_bool
+
+    def set_render_element_routing(self, routing_path):
+        """
+        Overrides the render element routing table from the config
+        :param routing_path: The path to a routing table, an empty string for no routing, or None to use the config
+        :return: None
+        """
+        self._render_element_routing = routing_path
+
+    def set_gi_name(self, gi_name):
+        """
+        Overrides the name of the GI files, so passes from other cameras can share a prepass
+        :param gi_name: The file name without an extension, or None to name them after the camera or sub folder
+        :return: None
+        """
+        self._gi_name_override = gi_name
+
+    def set_gi_part(self, gi_part):
+        """
+        Makes the job a chunk of a split prepass, which writes its own GI files for the merge job to combine
+        :param gi_part: The chunk number, starting at 1, or 0 for a whole prepass
+        :return: None
+        """
+        self._gi_part = gi_part
+
+    def apply_settings(self, settings):
+        """
+        Calls the setter for each option, unknown options are ignored
+        :param settings: A dictionary in the format returned by get_settings()
+        :return: None
+        """
+        flg = logging.getLogger("renderFarming.Spinach.apply_settings")
+        for option, value in settings.items():
+            setter = getattr(self, "set_{}".format(option), None)
+            if setter is None:
+                flg.warning("Unknown Spinach setting: {}".format(option))
+                continue
+            setter(value)
+
+    # ---------------------------------------------------
+    #                      Observers
+    # ---------------------------------------------------
+
+    def add_observer(self, observer):
+        """
+        :param observer: A SpinachObserver, or any object with on_status_update() and on_not_ready() methods
+        :return: None
+        """
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        if observer in self._observers:
+            self._observers.remove(observer)
@@ -1,11 +1,14 @@
 import os
 import logging
 
-import renderFarmingColors as rCL
-import PySide2.QtGui as QtG
+import renderFarmingFrames as rFF
 
 mlg = logging.getLogger("renderFarming.Tools")
 
+# Hex codes of the named label colors, renderFarmingColors builds its QColors from these so this module doesn't
+# need Qt
+label_colors = {"Orange": "#FFA500", "Red": "#ff3232", "Green": "#4ca64c"}
+
 # ---------------------------------------------------
 #                     Utilities
 # ---------------------------------------------------
@@ -29,14 +32,11 @@ def str_to_dir(path):
 
 
 def html_color_text(text, color):
-    presets = {"Orange": rCL.label_orange, "Red": rCL.label_red, "Green": rCL.label_green}
-    if type(color) is QtG.QColor:
+    if hasattr(color, "name"):
+        # A QColor
         hex_code = color.name()
     else:
-        if color in presets:
-            hex_code = presets[color].name()
-        else:
-            hex_code = color
+        hex_code = label_colors.get(color, color)
     return " <font color=\"{1}\">{0}</font>".format(text, hex_code)
 
 
@@ -100,15 +100,36 @@ def verify_vray(rt):
         return vray
 
 
+# MaxScript functions defined during this session, keyed by name
+_mxs_functions = dict()
+
+
+def define_mxs_function(rt, name, source):
+    """
+    Defines a MaxScript function once per session and returns it
+    Used for work that would otherwise take a round trip to the runtime per object
+    :param rt: An instance of the MaxScript Runtime Environment
+    :param name: The name of the function, used as a cache key
+    :param source: The MaxScript source defining the function
+    :return: The MaxScript function
+    """
+    func = _mxs_functions.get(name)
+    if func is None:
+        mlg.debug("Defining MaxScript function: {}".format(name))
+        func = rt.execute(source)
+        _mxs_functions[name] = func
+    return func
+
+
 def calculate_increment_padding(start, end, increment):
-    length = end - start
-    last_inc_length = length % increment
-    if last_inc_length is 0:
-        return end
-    else:
-        last_increment_start = end - last_inc_length
-        new_end = last_increment_start + increment
-        return new_end
+    """
+    Extends a range to the next increment, so a Multi Frame Incremental prepass samples past its last frame
+    :param start: The first frame
+    :param end: The last frame
+    :param increment: The multi frame increment
+    :return: The new last frame
+    """
+    return rFF.FrameSet.from_range(start, end).sample(increment, pad=True).last()
 
 
 def clean_title(title):
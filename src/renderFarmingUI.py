@@ -8,6 +8,7 @@ import os
 import renderFarmingConfig as rFCfg
 import renderFarmingSpinach as rFS
 import renderFarmingKale as rFK
+import renderFarmingQueue as rFQ
 import renderFarmingTools as rFT
 from renderFarmingQWidgets import QTimeSegDialog
 from renderFarmingQWidgets.QMaxRollout import QMaxRollout
@@ -525,6 +526,44 @@ class KaleTableModel(QtG.QStandardItemModel):
         self.setItem(row, 3, priority)
 
 
+spinach_message_colors = {
+    "Error": "Red",
+    "Ready": "Green",
+    "Not Ready": "Orange"
+}
+
+
+def styled_spinach_message(message):
+    """
+    Formats a SpinachMessage as html for the status label
+    :param message: A SpinachMessage
+    :return: A string
+    """
+    message_type = message.get_message_type()
+    if message_type is None:
+        return message.raw_message()
+
+    color = spinach_message_colors.get(message_type, "Red")
+    if message.is_full_color():
+        return rFT.html_color_text(message.get_message(), color)
+    return "{}: {}".format(rFT.html_color_text(message_type, color), message.get_message())
+
+
+class SpinachSignals(QtC.QObject):
+    """
+    Observes a SpinachJob and re-emits its updates as Qt signals
+    Signals emitted from a worker thread are queued to the slots on the UI thread
+    """
+    status_update = Signal(rFS.SpinachMessage)
+    not_ready = Signal()
+
+    def on_status_update(self, message):
+        self.status_update.emit(message)
+
+    def on_not_ready(self):
+        self.not_ready.emit()
+
+
 class SpinachTBDG(QtC.QObject):
     run_kale = Signal()
 
@@ -557,6 +596,10 @@ class SpinachTBDG(QtC.QObject):
         self._sp_man_beauty_btn = self._tab.findChild(QtW.QPushButton, 'sp_1f_man_beauty_btn')
         self._sp_backburner_submit_btn = self._tab.findChild(QtW.QPushButton, 'sp_backburner_submit_btn')
         self._sp_reset_btn = self._tab.findChild(QtW.QPushButton, 'sp_reset_btn')
+        self._sp_missing_prepass_btn = self._tab.findChild(QtW.QPushButton, 'sp_missing_prepass_btn')
+        self._sp_rerender_btn = self._tab.findChild(QtW.QPushButton, 'sp_rerender_btn')
+        self._sp_queue_add_btn = self._tab.findChild(QtW.QPushButton, 'sp_queue_add_btn')
+        self._sp_queue_run_btn = self._tab.findChild(QtW.QPushButton, 'sp_queue_run_btn')
 
         # ---------------------------------------------------
         #               Spin Box Definitions
@@ -642,11 +685,18 @@ class SpinachTBDG(QtC.QObject):
         )
 
         self._sp_reset_btn.clicked.connect(self._sp_reset_handler)
+        self._sp_missing_prepass_btn.clicked.connect(self._sp_missing_prepass_btn_handler)
+        self._sp_rerender_btn.clicked.connect(self._sp_rerender_btn_handler)
+        self._sp_queue_add_btn.clicked.connect(self._sp_queue_add_btn_handler)
+        self._sp_queue_run_btn.clicked.connect(self._sp_queue_run_btn_handler)
 
         # self._sp_run_kale_ckbx.stateChanged.connect(self._sp_settings_change_handler)
 
-        self._spinach.status_update.connect(self._spinach_status_handler)
-        self._spinach.not_ready.connect(self._spinach_not_ready_handler)
+        self._spinach_signals = SpinachSignals()
+        self._spinach.add_observer(self._spinach_signals)
+
+        self._spinach_signals.status_update.connect(self._spinach_status_handler)
+        self._spinach_signals.not_ready.connect(self._spinach_not_ready_handler)
 
         # ---------------------------------------------------
         #                       Setup
@@ -766,6 +816,80 @@ class SpinachTBDG(QtC.QObject):
         self._match_prefix()
         self._run_kale()
 
+    def _sp_missing_prepass_btn_handler(self):
+        """
+        Handler for submitting the frames missing from an animation prepass
+        :return:
+        """
+        flg = logging.getLogger("renderFarming.UI._sp_missing_prepass_btn_handler")
+        flg.debug("Checking for missing Animation Prepass frames")
+        self._spinach.check_camera()
+        if not self._spinach.get_ready_status():
+            flg.debug("Spinach reports not ready, attempting to prepare the Job")
+            self._spinach.prepare_job()
+
+        if self._spinach.get_ready_status():
+            if self._spinach.prepare_missing_prepass():
+                self._spinach.submit()
+
+    def _sp_rerender_btn_handler(self):
+        """
+        Handler for submitting the frames that are missing or broken in the frames folder
+        :return:
+        """
+        flg = logging.getLogger("renderFarming.UI._sp_rerender_btn_handler")
+        flg.debug("Checking for broken frames")
+        self._spinach.check_camera()
+        if not self._spinach.get_ready_status():
+            flg.debug("Spinach reports not ready, attempting to prepare the Job")
+            self._spinach.prepare_job()
+
+        if self._spinach.get_ready_status():
+            if self._spinach.prepare_rerender(self._sp_gi_mode_cmbx.get_beauty_mode()):
+                self._spinach.submit()
+
+    def _sp_queue_add_btn_handler(self):
+        """
+        Handler for adding the active camera's passes to the local render queue
+        :return:
+        """
+        flg = logging.getLogger("renderFarming.UI._sp_queue_add_btn_handler")
+        camera = rt.getActiveCamera()
+        if camera is None:
+            self.set_spinach_status(rFT.html_color_text("Active view is not a valid camera", "Red"))
+            return
+
+        # The queue reopens the scene from its file, an unsaved scene has nothing to reopen after a restart
+        if not str(rt.maxFileName):
+            self.set_spinach_status(rFT.html_color_text("Save the scene before adding it to the render queue", "Red"))
+            return
+
+        queue = rFQ.RenderQueue(self._cfg.get_render_queue_file())
+        items = queue.add_job(os.path.join(str(rt.maxFilePath), str(rt.maxFileName)),
+                              str(camera.name),
+                              int(rt.animationRange.start),
+                              int(rt.animationRange.end),
+                              self._spinach.get_settings(),
+                              self._sp_gi_mode_cmbx.get_prepass_mode(),
+                              self._sp_gi_mode_cmbx.get_beauty_mode())
+        flg.debug("Queued: {}".format(items))
+        self.set_spinach_status("Added {0} passes to the render queue, {1} in the queue".format(len(items), len(queue)))
+
+    def _sp_queue_run_btn_handler(self):
+        """
+        Handler for rendering the local render queue
+        :return:
+        """
+        queue = rFQ.RenderQueue(self._cfg.get_render_queue_file())
+        runner = rFQ.RenderQueueRunner(self._cfg, queue)
+        ran = runner.run()
+
+        remaining = len([i for i in queue if i.get_status() in (rFQ.pending, rFQ.running)])
+        status = "Rendered {0} queued passes, {1} remaining".format(len(ran), remaining)
+        if runner.get_stop_reason():
+            status += ".  {}".format(runner.get_stop_reason())
+        self.set_spinach_status(status)
+
     def _sp_gi_mode_cmbx_handler(self):
         """
         Handler for changing the GI combo box
@@ -866,7 +990,7 @@ class SpinachTBDG(QtC.QObject):
     @Slot(rFS.SpinachMessage)
     def _spinach_status_handler(self, message):
         self._clg.debug("Spinach status set to {}".format(message.raw_message()))
-        self.set_spinach_status(message.styled_message())
+        self.set_spinach_status(styled_spinach_message(message))
 
     def _spinach_not_ready_handler(self):
         nr = rFT.html_color_text("Not Ready:", "Orange")